@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Потоковая запись аудио в WAV/FLAC
+Каждая часть дописывается в итоговый файл сразу после генерации, заголовок
+обновляется при закрытии, поэтому память не растет с длиной документа
+"""
+
+import os
+
+# Формат файла по расширению (WAV с 16-битным PCM, как у tts_to_file)
+FORMATS = {
+    '.wav': ('WAV', 'PCM_16'),
+    '.flac': ('FLAC', 'PCM_16'),
+    '.rf64': ('RF64', 'PCM_16'),  # WAV без ограничения 4 ГБ
+}
+
+
+class StreamingAudioWriter:
+    """Дозапись аудио (массивов float32) в файл с постоянным расходом памяти"""
+
+    def __init__(self, path, sample_rate, channels=1):
+        import soundfile as sf
+
+        ext = os.path.splitext(path)[1].lower()
+        file_format, subtype = FORMATS.get(ext, FORMATS['.wav'])
+        self.path = path
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self._file = sf.SoundFile(path, mode='w', samplerate=sample_rate, channels=channels,
+                                  format=file_format, subtype=subtype)
+
+    def write(self, wav):
+        """Дописать часть аудио в конец файла"""
+        self._file.write(wav)
+        self.frames += len(wav)
+
+    def close(self):
+        """Закрыть файл (заголовок с итоговой длиной записывается здесь)"""
+        if not self._file.closed:
+            self._file.close()
+
+    @property
+    def duration(self):
+        """Длительность записанного аудио в секундах"""
+        return self.frames / self.sample_rate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Пакетная озвучка без интерфейса по манифесту JSONL/CSV
+Модель загружается один раз, строки группируются по голосу (латенты
+вычисляются один раз на голос), в конце печатается сводка скорости
+
+Поля строки манифеста:
+    id      - идентификатор строки
+    text    - текст для озвучки
+    voice   - путь к образцу голоса или имя сохраненного профиля
+    params  - параметры генерации (объект JSON; в CSV - строка с JSON)
+    output  - путь к итоговому файлу (по умолчанию <output-dir>/<id>.wav)
+
+Пример:
+    python batch_render.py manifest.jsonl --output-dir out --workers 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from audio_sink import StreamingAudioWriter
+from inference_profiles import PROFILES
+from runtime_profile import apply_runtime_profile
+from text_processing import process_text_with_stress, split_text_by_budget
+from voice_profiles import VoiceProfileStore
+from worker_pool import XTTSWorkerPool
+from xtts_engine import (
+    PrefixKVCache,
+    SpeakerLatentCache,
+    get_output_sample_rate,
+    iter_synthesize_batch,
+    load_xtts_model,
+    make_token_counter,
+    text_token_budget,
+)
+
+# Параметры генерации по умолчанию (как в десктопной версии)
+DEFAULT_PARAMS = {
+    'temperature': 0.7,
+    'length_penalty': 1.0,
+    'repetition_penalty': 2.0,
+    'top_k': 50,
+    'top_p': 0.85,
+}
+# Поля params строки манифеста: параметры генерации + язык и скорость
+ROW_PARAMS = set(DEFAULT_PARAMS) | {'language', 'speed'}
+
+
+def validate_params(params):
+    """Проверить params строки манифеста (ValueError при неизвестных или неверных значениях)"""
+    unknown = sorted(set(params) - ROW_PARAMS)
+    if unknown:
+        raise ValueError(f"неизвестные параметры {', '.join(unknown)} (допустимы: {', '.join(sorted(ROW_PARAMS))})")
+    for key, value in params.items():
+        if key == 'language':
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"параметр language должен быть строкой, получено {value!r}")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"параметр {key} должен быть числом, получено {value!r}")
+
+
+def load_manifest(path):
+    """Прочитать строки манифеста из JSONL или CSV"""
+    rows = []
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                params = row.get('params') or ''
+                row['params'] = json.loads(params) if params.strip() else {}
+                rows.append(row)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Строка {line_number} манифеста: неверный JSON ({e})")
+
+    for number, row in enumerate(rows, 1):
+        row['id'] = str(row.get('id') or number)
+        row['params'] = dict(row.get('params') or {})
+        if not (row.get('text') or '').strip():
+            raise ValueError(f"Строка {row['id']} манифеста: пустой текст")
+    return rows
+
+
+def group_by_voice(rows, default_voice=None):
+    """Сгруппировать строки по голосу, сохраняя порядок первого появления"""
+    groups = OrderedDict()
+    for row in rows:
+        voice = row.get('voice') or default_voice
+        if not voice:
+            raise ValueError(f"Строка {row['id']} манифеста: не указан голос")
+        groups.setdefault(voice, []).append(row)
+    return groups
+
+
+class BatchRenderer:
+    """Озвучка строк манифеста одной загруженной моделью"""
+
+    def __init__(self, model, output_dir="batch_output", workers=1, batch_size=4, language="ru",
+                 stress=True, profile_store=None):
+        self.model = model
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.language = language
+        self.stress = stress
+        self.profile_store = profile_store or VoiceProfileStore()
+        self.speaker_cache = SpeakerLatentCache()
+        self.prefix_cache = PrefixKVCache()
+        self.token_counters = {}
+        self.sample_rate = get_output_sample_rate(model)
+
+        self.pool = None
+        if workers > 1:
+            self.pool = XTTSWorkerPool(model, num_workers=workers)
+
+        self.total_chars = 0
+        self.total_audio = 0.0
+        self.rendered = 0
+        self.failed = []
+        self.wall_time = 0.0
+
+    def get_latents(self, voice):
+        """Латенты голоса: файл-образец или имя профиля"""
+        if os.path.isfile(voice):
+            return self.speaker_cache.get_latents(self.model, voice)
+        return self.profile_store.load(voice)
+
+    def prepare_chunks(self, text, language):
+        """Ударения и разбиение текста на части для XTTS v2 (по бюджету токенов)"""
+        if self.stress:
+            text = process_text_with_stress(text)
+        counter = self.token_counters.get(language)
+        if counter is None:
+            counter = self.token_counters[language] = make_token_counter(self.model, language)
+        return split_text_by_budget(text, text_token_budget(self.model, language), counter)
+
+    def output_path(self, row):
+        """Путь к итоговому файлу строки"""
+        return row.get('output') or os.path.join(self.output_dir, f"{row['id']}.wav")
+
+    def render_row(self, row, latents):
+        """Озвучить одну строку манифеста, возвращает длительность аудио"""
+        validate_params(row['params'])
+        params = dict(DEFAULT_PARAMS)
+        params.update(row['params'])
+        language = params.pop('language', self.language)
+        speed = params.pop('speed', 1.0)
+        chunks = self.prepare_chunks(row['text'], language)
+
+        path = self.output_path(row)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        if self.pool is not None:
+            wavs = self.pool.imap(chunks, latents, language=language, speed=speed, **params)
+        else:
+            wavs = iter_synthesize_batch(self.model, chunks, latents, language=language, speed=speed,
+                                         batch_size=self.batch_size, prefix_cache=self.prefix_cache, **params)
+
+        # Запись во временный файл: при ошибке на середине строки неполный файл не остается
+        base, ext = os.path.splitext(path)
+        tmp_path = f"{base}.part{ext}"
+        try:
+            with StreamingAudioWriter(tmp_path, self.sample_rate) as writer:
+                for wav in wavs:
+                    writer.write(wav)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Генератор пула отменяет оставшиеся части задания
+            if hasattr(wavs, 'close'):
+                wavs.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return writer.duration
+
+    def run(self, rows, default_voice=None):
+        """Озвучить все строки манифеста, сгруппировав их по голосу"""
+        groups = group_by_voice(rows, default_voice)
+        total = len(rows)
+        start = time.perf_counter()
+
+        for voice, voice_rows in groups.items():
+            print(f"🎤 Голос {voice}: {len(voice_rows)} строк")
+            try:
+                latents = self.get_latents(voice)
+            except Exception as e:
+                print(f"❌ Не удалось загрузить голос {voice}: {e}")
+                self.failed.extend(row['id'] for row in voice_rows)
+                continue
+
+            for row in voice_rows:
+                row_start = time.perf_counter()
+                try:
+                    duration = self.render_row(row, latents)
+                except Exception as e:
+                    print(f"❌ Строка {row['id']}: {e}")
+                    self.failed.append(row['id'])
+                    continue
+
+                elapsed = time.perf_counter() - row_start
+                self.rendered += 1
+                self.total_chars += len(row['text'])
+                self.total_audio += duration
+                print(f"✅ [{self.rendered + len(self.failed)}/{total}] {row['id']}: "
+                      f"{duration:.1f} сек аудио за {elapsed:.1f} сек -> {self.output_path(row)}")
+
+        self.wall_time = time.perf_counter() - start
+        print(self.summary())
+        return not self.failed
+
+    def summary(self):
+        """Сводка: объем, скорость в символах/сек и коэффициент реального времени"""
+        wall = self.wall_time or 1e-9
+        rtf = wall / self.total_audio if self.total_audio else 0.0
+        lines = [
+            f"📊 Готово строк: {self.rendered}, ошибок: {len(self.failed)}",
+            f"  • Символов: {self.total_chars}, аудио: {self.total_audio:.1f} сек, время: {self.wall_time:.1f} сек",
+            f"  • Скорость: {self.total_chars / wall:.1f} симв/сек, RTF: {rtf:.3f}",
+        ]
+        if self.failed:
+            lines.append(f"  ❌ Ошибки в строках: {', '.join(self.failed)}")
+        return "\n".join(lines)
+
+    def close(self):
+        """Остановить пул процессов"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+
+def main():
+    """Точка входа пакетной озвучки"""
+    parser = argparse.ArgumentParser(description="Пакетная озвучка XTTS v2 по манифесту JSONL/CSV")
+    parser.add_argument("manifest", help="Файл манифеста (.jsonl или .csv)")
+    parser.add_argument("--output-dir", default="batch_output", help="Папка для файлов без поля output")
+    parser.add_argument("--voice", help="Голос по умолчанию (файл или имя профиля)")
+    parser.add_argument("--language", default="ru", help="Язык по умолчанию")
+    parser.add_argument("--workers", type=int, help="Число процессов на CPU (по умолчанию из профиля CPU или 1)")
+    parser.add_argument("--batch-size", type=int, default=4, help="Размер пакета частей в одном процессе")
+    parser.add_argument("--device", help="Устройство модели (cpu, cuda)")
+    parser.add_argument("--profile", choices=PROFILES, help="Профиль ускорения на CPU (по умолчанию XTTS_INFERENCE_PROFILE)")
+    parser.add_argument("--no-stress", action="store_true", help="Не обрабатывать ударения")
+    args = parser.parse_args()
+
+    try:
+        rows = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"❌ Ошибка манифеста: {e}")
+        return 2
+
+    print(f"📋 Манифест: {len(rows)} строк")
+    print("🔄 Загрузка XTTS v2...")
+    runtime = apply_runtime_profile()
+    if args.workers is None:
+        args.workers = runtime['workers'] if runtime else 1
+    model = load_xtts_model(args.device, profile=args.profile)
+    print("✅ XTTS v2 загружена успешно!")
+
+    renderer = BatchRenderer(
+        model,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        language=args.language,
+        stress=not args.no_stress,
+    )
+    try:
+        ok = renderer.run(rows, default_voice=args.voice)
+    finally:
+        renderer.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
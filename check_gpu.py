@@ -2,12 +2,19 @@
 """
 Скрипт проверки поддержки GPU и CUDA для ускорения XTTS v2
 Проверяет возможность использования видеокарты вместо процессора
+
+С флагом --calibrate подбирает потоки torch, число процессов и привязку
+к ядрам по реальному синтезу XTTS на этом компьютере и сохраняет лучший
+вариант в профиль CPU (runtime_profile.json), который программы
+применяют при запуске
 """
 
+import argparse
 import sys
 import platform
 import subprocess
 import os
+import time
 
 def print_header():
     """Вывод заголовка"""
@@ -228,9 +235,179 @@ def provide_recommendations():
     
     print()
 
+CALIBRATION_TEXTS = [
+    "Калибровка процессора: проверяем скорость синтеза речи на этом компьютере.",
+    "Каждый вариант настроек озвучивает одинаковый текст с одинаковым зерном.",
+]
+
+def calibration_grid(num_cpus):
+    """Варианты настроек: (процессы, потоков на процесс, межоперационных потоков, привязка)"""
+    from runtime_profile import AFFINITY_LAYOUTS
+    
+    configs = []
+    workers = 1
+    while workers <= max(1, num_cpus // 2):
+        per_worker = max(1, num_cpus // workers)
+        for threads in sorted({per_worker, max(1, per_worker // 2)}, reverse=True):
+            interops = (1, 2) if workers == 1 else (1,)
+            layouts = AFFINITY_LAYOUTS if workers > 1 and hasattr(os, 'sched_setaffinity') else ("none",)
+            for interop in interops:
+                for layout in layouts:
+                    configs.append((workers, threads, interop, layout))
+        workers *= 2
+    return configs
+
+def _calibration_worker(snapshot_dir, profile, latents, texts, threads, interop, cpus, barrier, results):
+    """Процесс калибровки: загрузка модели, прогрев, общий старт, синтез тестовых текстов"""
+    from runtime_profile import apply_thread_settings
+    
+    try:
+        # Новый процесс (spawn): потоки torch задаются до первых вычислений,
+        # иначе число межоперационных потоков не меняется и вариант не проверяется
+        if not apply_thread_settings(threads, interop, cpus):
+            raise RuntimeError(f"межоперационные потоки ({interop}) не применены")
+        
+        from inference_profiles import apply_inference_profile
+        from model_snapshot import ModelSnapshot
+        from xtts_engine import synthesize
+        
+        model = ModelSnapshot(snapshot_dir).load(device="cpu")
+        apply_inference_profile(model, profile)
+        synthesize(model, texts[0], latents, seed=0)
+        barrier.wait()
+        samples = 0
+        for text in texts:
+            samples += len(synthesize(model, text, latents, seed=0))
+        results.put((samples, None))
+    except Exception as e:
+        barrier.abort()
+        results.put((0, str(e)))
+
+def run_calibration_config(snapshot_dir, profile, latents, sample_rate, workers, threads, interop, layout,
+                           timeout=600):
+    """Общий RTF варианта: время работы / суммарная длительность аудио всех процессов"""
+    import torch.multiprocessing as mp
+    from runtime_profile import worker_affinity
+    
+    # Каждый вариант - в новых процессах, как в пуле процессов: после fork пулы
+    # потоков torch уже созданы родителем, и настройки потоков не действуют
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    affinity = worker_affinity(workers, threads, layout)
+    processes = []
+    for i in range(workers):
+        cpus = affinity[i] if affinity else None
+        process = ctx.Process(target=_calibration_worker, daemon=True,
+                              args=(snapshot_dir, profile, latents, CALIBRATION_TEXTS, threads, interop, cpus,
+                                    barrier, results))
+        process.start()
+        processes.append(process)
+    
+    try:
+        barrier.wait(timeout)
+        start = time.perf_counter()
+        samples = 0
+        for _ in range(workers):
+            worker_samples, error = results.get(timeout=timeout)
+            if error:
+                raise RuntimeError(error)
+            samples += worker_samples
+        wall = time.perf_counter() - start
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    return wall / (samples / sample_rate)
+
+def calibrate_cpu(voice_path=None, profile_path=None):
+    """Калибровка потоков CPU на реальном синтезе XTTS и сохранение профиля"""
+    print("⚙️ КАЛИБРОВКА CPU ДЛЯ XTTS v2:")
+    
+    import tempfile
+    import torch
+    from runtime_profile import available_cpus, host_signature, save_runtime_profile
+    from worker_pool import ensure_snapshot
+    from xtts_engine import (get_inference_profile, get_output_sample_rate, get_xtts_core, load_xtts_model,
+                             make_warmup_reference)
+    
+    model = load_xtts_model(device="cpu")
+    sample_rate = get_output_sample_rate(model)
+    inference_profile = get_inference_profile(model)
+    # Процессы калибровки загружают веса из снимка через mmap
+    snapshot_dir = ensure_snapshot()
+    
+    tmp_path = None
+    if not voice_path:
+        fd, tmp_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        voice_path = make_warmup_reference(tmp_path)
+    try:
+        latents = get_xtts_core(model).get_conditioning_latents(audio_path=voice_path)
+        latents = tuple(latent.detach().cpu() for latent in latents)
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
+    
+    num_cpus = len(available_cpus())
+    configs = calibration_grid(num_cpus)
+    print(f"• Доступно ядер: {num_cpus}, вариантов: {len(configs)}")
+    results = []
+    for workers, threads, interop, layout in configs:
+        label = f"{workers} проц. x {threads} потоков, interop {interop}, привязка {layout}"
+        try:
+            rtf = run_calibration_config(snapshot_dir, inference_profile, latents, sample_rate,
+                                         workers, threads, interop, layout)
+        except Exception as e:
+            print(f"  ⚠️ {label}: ошибка {e}")
+            continue
+        print(f"  📊 {label}: RTF {rtf:.3f}")
+        results.append((rtf, workers, threads, interop, layout))
+    
+    if not results:
+        print("❌ Ни один вариант не выполнен")
+        return None
+    
+    # Задержка одного запроса - лучший вариант в одном процессе, пропускная способность - лучший вообще
+    single = [r for r in results if r[1] == 1]
+    throughput = min(results)
+    if single:
+        latency = min(single)
+    else:
+        # Все варианты с одним процессом завершились ошибкой: потоки одного
+        # процесса берутся из лучшего варианта пула, без interop
+        print("⚠️ Ни один вариант с одним процессом не выполнен, потоки взяты из варианта пула")
+        latency = (None, 1, throughput[2], 1, "none")
+    profile = {
+        'intra_threads': latency[2],
+        'interop_threads': latency[3],
+        'single_rtf': round(latency[0], 4) if latency[0] is not None else None,
+        'workers': throughput[1],
+        'threads_per_worker': throughput[2],
+        'affinity': throughput[4],
+        'pool_rtf': round(throughput[0], 4),
+        'inference_profile': inference_profile,
+        'torch': torch.__version__,
+        'calibrated': time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    save_runtime_profile(profile, profile_path)
+    print(f"✅ Профиль CPU сохранен для {host_signature()}:")
+    single_rtf = f"{profile['single_rtf']:.3f}" if profile['single_rtf'] is not None else "не измерен"
+    print(f"  • Один процесс: {profile['intra_threads']} потоков, interop {profile['interop_threads']} "
+          f"(RTF {single_rtf})")
+    print(f"  • Пул: {profile['workers']} процессов по {profile['threads_per_worker']} потоков, "
+          f"привязка {profile['affinity']} (RTF {profile['pool_rtf']:.3f})")
+    print()
+    return profile
+
 def main():
     """Главная функция"""
-    import os
+    parser = argparse.ArgumentParser(description="Проверка GPU и калибровка CPU для XTTS v2")
+    parser.add_argument("--calibrate", action="store_true", help="Подобрать потоки CPU по реальному синтезу")
+    parser.add_argument("--voice", help="Образец голоса для калибровки (по умолчанию синтетический)")
+    parser.add_argument("--profile-path", help="Файл профиля CPU (по умолчанию runtime_profile.json)")
+    args = parser.parse_args()
     
     print_header()
     check_system_info()
@@ -242,6 +419,8 @@ def main():
     check_other_gpu()
     check_xtts_gpu_compatibility()
     provide_recommendations()
+    if args.calibrate:
+        calibrate_cpu(args.voice, args.profile_path)
     
     print("=" * 60)
     print("✅ ПРОВЕРКА ЗАВЕРШЕНА")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Дисковый кэш синтезированных частей текста
+Ключ - обработанный текст части, голос, параметры генерации, зерно, способ
+сэмплирования, профиль ускорения и версия модели, поэтому при повторной озвучке отредактированного документа заново
+синтезируются только измененные части
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from xtts_engine import XTTS_MODEL_NAME
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'CHUNK_CACHE_DIR', str(Path(__file__).resolve().parent / "chunk_cache")
+)
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3  # 2 ГБ
+DEFAULT_SEED = 0  # Зерно генерации при включенном кэше
+CACHE_SUFFIX = ".flac"
+
+# Способ сэмплирования GPT: пакетный, пул процессов и обычный синтез с зерном
+# идут через SeededSampler, потоковый - через inference_stream с глобальным
+# генератором, поэтому его части звучат иначе и хранятся отдельно
+SAMPLER_SEEDED = "seeded"
+SAMPLER_STREAM = "stream"
+
+
+def model_version():
+    """Версия модели для ключа кэша (имя модели + версия пакета TTS)"""
+    version = XTTS_MODEL_NAME
+    try:
+        import TTS
+        version = f"{XTTS_MODEL_NAME}@{getattr(TTS, '__version__', 'unknown')}"
+    except ImportError:
+        pass
+    return version
+
+
+class ChunkAudioCache:
+    """Кэш аудио частей на диске с вытеснением давно не использованных (LRU)
+
+    Аудио хранится в FLAC 16 бит: итоговый файл тоже 16-битный, поэтому
+    сжатие без потерь не меняет результат. Время последнего использования -
+    время изменения файла, поэтому порядок LRU переживает перезапуск.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = model_version()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Индекс: путь -> размер, от давно использованных к недавним
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        files = []
+        for path in self.cache_dir.glob("*/*" + CACHE_SUFFIX):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, str(path), stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._total_bytes += size
+
+    def make_key(self, text, voice_hash, seed, profile="fp32", sampler=SAMPLER_SEEDED, **settings):
+        """Ключ части: текст, голос, параметры генерации, зерно и версия модели
+
+        profile - профиль ускорения, примененный к модели (get_inference_profile),
+        sampler - способ сэмплирования (SAMPLER_SEEDED или SAMPLER_STREAM).
+        """
+        key = json.dumps({
+            'text': text,
+            'voice': voice_hash,
+            'seed': seed,
+            'settings': settings,
+            'profile': profile,
+            'sampler': sampler,
+            'model': self.version,
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        """Путь к файлу части (подкаталоги по первым символам ключа)"""
+        return self.cache_dir / key[:2] / (key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """Аудио части из кэша или None"""
+        import soundfile as sf
+
+        path = self._path(key)
+        if not path.exists():
+            with self._lock:
+                self.misses += 1
+                self._total_bytes -= self._entries.pop(str(path), 0)
+            return None
+        try:
+            wav, _ = sf.read(path, dtype='float32')
+        except Exception as e:
+            with self._lock:
+                self.misses += 1
+                self._total_bytes -= self._entries.pop(str(path), 0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            print(f"⚠️ Поврежденная запись кэша удалена: {path} ({e})")
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if str(path) in self._entries:
+                self._entries.move_to_end(str(path))
+        return wav
+
+    def put(self, key, wav, sample_rate):
+        """Сохранить аудио части и вытеснить старые записи сверх лимита"""
+        import soundfile as sf
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        sf.write(tmp_path, wav, sample_rate, format='FLAC', subtype='PCM_16')
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(str(path), 0)
+            self._entries[str(path)] = size
+            self._total_bytes += size
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_path, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_path)
+
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """Статистика попаданий и размер кэша"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        """Удалить все записи кэша"""
+        with self._lock:
+            paths = list(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
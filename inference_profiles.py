@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Профили ускорения XTTS v2 на CPU
+    fp32      - исходная модель
+    int8      - динамическое int8-квантование линейных слоев GPT
+    bf16      - автоприведение к bfloat16 (процессоры с AVX512-BF16/AMX)
+    int8+bf16 - оба варианта
+
+Профиль выбирается переменной XTTS_INFERENCE_PROFILE (или --profile в
+batch_render.py). Сравнение профилей на своем голосе и сервере:
+    python inference_profiles.py benchmark --voice sample.wav
+Выводится RTF каждого профиля и похожесть голоса на результат fp32
+(косинус между эмбеддингами говорящего XTTS).
+
+Проверка кэша префикса GPT (PrefixKVCache): коды GPT с кэшем и без него
+при одинаковых зернах должны совпадать:
+    python inference_profiles.py verify-prefix-cache --voice sample.wav
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROFILES = ("fp32", "int8", "bf16", "int8+bf16")
+DEFAULT_PROFILE = os.environ.get('XTTS_INFERENCE_PROFILE', 'fp32')
+
+BENCHMARK_TEXTS = [
+    "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+    "Сегодня утром мы проверяем, насколько быстро модель озвучивает длинные предложения на процессоре.",
+]
+
+
+def bf16_supported():
+    """Поддерживает ли процессор быстрые вычисления в bfloat16"""
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def _conv1d_to_linear(module):
+    """Заменить Conv1D из transformers (слои GPT-2) на nn.Linear с теми же весами
+
+    quantize_dynamic квантует только nn.Linear, а в GPT-2 проекции внимания
+    и MLP сделаны через Conv1D (веса транспонированы).
+    """
+    import torch.nn as nn
+
+    replaced = 0
+    for name, child in module.named_children():
+        if type(child).__name__ == 'Conv1D' and hasattr(child, 'nf'):
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features, bias=child.bias is not None)
+            linear.weight = nn.Parameter(child.weight.detach().t().contiguous(), requires_grad=False)
+            if child.bias is not None:
+                linear.bias = nn.Parameter(child.bias.detach().clone(), requires_grad=False)
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
+
+
+def apply_inference_profile(model, profile=None):
+    """Применить профиль к загруженной модели, возвращает примененный профиль
+
+    Квантование меняет модель на месте, поэтому профиль задается один раз
+    сразу после загрузки. На GPU профиль не применяется.
+    """
+    import torch
+
+    from xtts_engine import get_xtts_core
+
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный профиль {profile}, доступны: {', '.join(PROFILES)}")
+
+    core = get_xtts_core(model)
+    if profile != "fp32" and core.device.type != "cpu":
+        print(f"⚠️ Профиль {profile} предназначен для CPU, модель на {core.device} - используется fp32")
+        profile = "fp32"
+
+    if "bf16" in profile and not bf16_supported():
+        print("⚠️ Процессор не поддерживает bfloat16 - автоприведение отключено")
+        profile = profile.replace("+bf16", "").replace("bf16", "fp32")
+
+    if "int8" in profile:
+        replaced = _conv1d_to_linear(core.gpt)
+        torch.ao.quantization.quantize_dynamic(core.gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        print(f"✅ GPT квантован в int8 ({replaced} слоев Conv1D переведены в Linear)")
+
+    core.inference_profile = profile
+    return profile
+
+
+def speaker_similarity(model, wav_a, wav_b, sample_rate):
+    """Похожесть голоса двух записей: косинус эмбеддингов говорящего XTTS"""
+    import tempfile
+
+    import soundfile as sf
+    import torch.nn.functional as F
+
+    from xtts_engine import get_xtts_core
+
+    core = get_xtts_core(model)
+    embeddings = []
+    for wav in (wav_a, wav_b):
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
+            path = tmp_file.name
+        try:
+            sf.write(path, wav, sample_rate)
+            _, speaker_embedding = core.get_conditioning_latents(audio_path=path)
+        finally:
+            os.remove(path)
+        embeddings.append(speaker_embedding.float().reshape(-1))
+    return float(F.cosine_similarity(embeddings[0], embeddings[1], dim=0))
+
+
+def benchmark_profile(model, latents, texts, seed=0):
+    """Синтез текстов в профиле модели: (аудио, время синтеза, длительность аудио)"""
+    from xtts_engine import get_output_sample_rate, synthesize, warm_up_model
+
+    warm_up_model(model, runs=1)
+    sample_rate = get_output_sample_rate(model)
+    wavs = []
+    start = time.perf_counter()
+    for text in texts:
+        wavs.append(synthesize(model, text, latents, seed=seed))
+    elapsed = time.perf_counter() - start
+    return wavs, elapsed, sum(len(wav) for wav in wavs) / sample_rate
+
+
+def compare_prefix_cache_codes(core, text_tokens, gpt_cond_latent, settings, seeds, prefix_cache=None):
+    """Коды GPT без кэша префикса и с ним для одних и тех же частей и зерен
+
+    Оба прогона идут через generate_codes_batch с одним и тем же SeededSampler,
+    поэтому отличаться может только вычисление префикса. Возвращает
+    (коды без кэша, коды с кэшем, кэш использован).
+    """
+    from xtts_engine import PrefixKVCache, generate_codes_batch
+
+    prefix_cache = prefix_cache or PrefixKVCache()
+    plain = generate_codes_batch(core, text_tokens, gpt_cond_latent, settings, None, seeds)
+    lookups = prefix_cache.hits + prefix_cache.misses
+    cached = generate_codes_batch(core, text_tokens, gpt_cond_latent, settings, prefix_cache, seeds)
+    # Без обращения к кэшу (он отключился из-за ошибки) совпадение ничего не доказывает
+    used = prefix_cache.enabled and prefix_cache.hits + prefix_cache.misses > lookups
+    return plain, cached, used
+
+
+def verify_prefix_cache(model, latents, texts=None, seed=0, language="ru"):
+    """Сравнить коды GPT с кэшем префикса и без него при одинаковых зернах
+
+    Возвращает список (текст, кэш использован, совпали ли коды, число
+    отличающихся кодов, время без кэша и с кэшем вместе).
+    """
+    from xtts_engine import (
+        PrefixKVCache,
+        chunk_seed,
+        default_inference_params,
+        encode_text,
+        get_xtts_core,
+        inference_context,
+    )
+
+    core = get_xtts_core(model)
+    gpt_cond_latent = latents[0].to(core.device)
+    settings = default_inference_params(model)
+    prefix_cache = PrefixKVCache()
+    results = []
+    for text in texts or BENCHMARK_TEXTS:
+        start = time.perf_counter()
+        with inference_context(model):
+            tokens = encode_text(model, text, language)
+            plain, cached, used = compare_prefix_cache_codes(
+                core, [tokens], gpt_cond_latent, settings, [chunk_seed(seed, text)], prefix_cache
+            )
+        elapsed = time.perf_counter() - start
+        plain, cached = plain[0].reshape(-1), cached[0].reshape(-1)
+        length = min(len(plain), len(cached))
+        differences = int((plain[:length] != cached[:length]).sum()) + abs(len(plain) - len(cached))
+        results.append((text, used, differences == 0, differences, elapsed))
+    return results
+
+
+def main():
+    """Сравнение профилей (RTF, похожесть голоса) и проверка кэша префикса"""
+    parser = argparse.ArgumentParser(description="Профили ускорения XTTS v2 на CPU")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="Сравнить профили на этом сервере")
+    bench.add_argument("--voice", required=True, help="Файл с образцом голоса")
+    bench.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=PROFILES)
+    bench.add_argument("--threads", type=int, help="Число потоков torch")
+    verify = commands.add_parser("verify-prefix-cache", help="Сравнить синтез с кэшем префикса GPT и без него")
+    verify.add_argument("--voice", required=True, help="Файл с образцом голоса")
+    verify.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import torch
+
+    from xtts_engine import get_output_sample_rate, get_xtts_core, load_xtts_model
+
+    if args.command == "verify-prefix-cache":
+        model = load_xtts_model()
+        latents = get_xtts_core(model).get_conditioning_latents(audio_path=args.voice)
+        failures = 0
+        for text, used, same, differences, elapsed in verify_prefix_cache(model, latents, seed=args.seed):
+            if not used:
+                failures += 1
+                status = "❌ кэш префикса не использован"
+            elif same:
+                status = "✅ коды GPT совпадают"
+            else:
+                failures += 1
+                status = f"❌ отличается кодов: {differences}"
+            print(f"{status} ({elapsed:.2f} сек): {text[:50]}")
+        return 1 if failures else 0
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # Эталон fp32 нужен и для похожести голоса, поэтому загружается первым
+    reference = load_xtts_model(profile="fp32")
+    sample_rate = get_output_sample_rate(reference)
+    latents = get_xtts_core(reference).get_conditioning_latents(audio_path=args.voice)
+    reference_wavs, elapsed, duration = benchmark_profile(reference, latents, BENCHMARK_TEXTS)
+    results = [("fp32", elapsed / duration, 1.0)]
+
+    for profile in args.profiles:
+        if profile == "fp32":
+            continue
+        model = load_xtts_model(profile=profile)
+        applied = get_xtts_core(model).inference_profile
+        if applied != profile:
+            print(f"⚠️ Профиль {profile} недоступен на этом сервере, пропущен")
+            continue
+        wavs, elapsed, duration = benchmark_profile(model, latents, BENCHMARK_TEXTS)
+        similarity = min(speaker_similarity(reference, ref_wav, wav, sample_rate)
+                         for ref_wav, wav in zip(reference_wavs, wavs))
+        results.append((profile, elapsed / duration, similarity))
+        del model
+
+    print("\n📊 Профили XTTS v2 на CPU (RTF < 1 - быстрее реального времени):")
+    print(f"  {'профиль':<10} {'RTF':>7} {'ускорение':>10} {'похожесть':>10}")
+    base_rtf = results[0][1]
+    for profile, rtf, similarity in results:
+        print(f"  {profile:<10} {rtf:>7.3f} {base_rtf / rtf:>9.2f}x {similarity:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
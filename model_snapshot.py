@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Снимок весов XTTS v2 для быстрой загрузки без сети
+Снимок - готовый state_dict модели, который открывается через mmap: веса не
+распаковываются из pickle в анонимную память, а читаются из страничного кэша,
+общего для всех процессов (GUI, веб-версия, пакетный рендер)
+
+Создание снимка (один раз, нужна скачанная модель XTTS v2):
+    python model_snapshot.py build
+
+Состав каталога снимка:
+    config.json    - конфиг модели
+    vocab.json     - словарь токенизатора
+    weights.pt     - веса (формат torch zip, пригоден для mmap)
+    manifest.json  - версии, размер и sha256 весов
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from xtts_engine import XTTS_MODEL_NAME
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get(
+    'XTTS_SNAPSHOT_DIR', str(Path(__file__).resolve().parent / "xtts_snapshot")
+)
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_WEIGHTS = "weights.pt"
+VERIFIED_STAMP = "verified.json"
+# Ключи GPT2InferenceModel - ссылки на те же модули, создаются после загрузки
+INFERENCE_PREFIX = "gpt.gpt_inference."
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """sha256 файла (чтение блоками)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _package_versions():
+    """Версии torch и TTS, с которыми создан снимок"""
+    import torch
+    import TTS
+    return {'torch': torch.__version__, 'TTS': getattr(TTS, '__version__', 'unknown')}
+
+
+def find_model_dir():
+    """Каталог скачанной модели XTTS v2 (скачивается, если его еще нет)"""
+    from TTS.utils.manage import ModelManager
+
+    model_path, _, _ = ModelManager().download_model(XTTS_MODEL_NAME)
+    model_path = Path(model_path)
+    return model_path if model_path.is_dir() else model_path.parent
+
+
+def build_snapshot(model_dir=None, dest=None):
+    """Создать снимок весов из скачанной модели XTTS v2"""
+    import torch
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import Xtts
+
+    model_dir = Path(model_dir) if model_dir else find_model_dir()
+    dest = Path(dest or DEFAULT_SNAPSHOT_DIR)
+    print(f"🔄 Загрузка XTTS v2 из {model_dir}...")
+
+    config = XttsConfig()
+    config.load_json(str(model_dir / "config.json"))
+    model = Xtts.init_from_config(config)
+    model.load_checkpoint(config, checkpoint_dir=str(model_dir), eval=True)
+    state = {key: value for key, value in model.state_dict().items()
+             if not key.startswith(INFERENCE_PREFIX)}
+
+    # Собираем во временном каталоге и подменяем целиком
+    tmp_dir = dest.with_name(dest.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    shutil.copyfile(model_dir / "config.json", tmp_dir / "config.json")
+    shutil.copyfile(model_dir / "vocab.json", tmp_dir / "vocab.json")
+    torch.save(state, tmp_dir / SNAPSHOT_WEIGHTS)
+
+    weights_path = tmp_dir / SNAPSHOT_WEIGHTS
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'model': XTTS_MODEL_NAME,
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'versions': _package_versions(),
+        'weights_size': weights_path.stat().st_size,
+        'weights_sha256': file_sha256(weights_path),
+    }
+    with open(tmp_dir / SNAPSHOT_MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(dest, ignore_errors=True)
+    os.replace(tmp_dir, dest)
+    print(f"✅ Снимок XTTS v2 создан: {dest} ({manifest['weights_size'] / 1024 ** 2:.0f} МБ)")
+    return dest
+
+
+class ModelSnapshot:
+    """Каталог снимка весов с проверкой целостности
+
+    Полная проверка sha256 выполняется один раз; результат запоминается по
+    размеру и времени изменения файла весов, поэтому последующие запуски не
+    читают весь файл заново.
+    """
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = Path(snapshot_dir or DEFAULT_SNAPSHOT_DIR)
+        with open(self.snapshot_dir / SNAPSHOT_MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version', 0) > SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Снимок создан более новой версией программы: {self.snapshot_dir}")
+        if self.manifest.get('model') != XTTS_MODEL_NAME:
+            raise ValueError(f"Снимок другой модели: {self.manifest.get('model')}")
+        self.weights_path = self.snapshot_dir / SNAPSHOT_WEIGHTS
+
+    @classmethod
+    def find(cls, snapshot_dir=None):
+        """Снимок, если он создан, иначе None"""
+        snapshot_dir = Path(snapshot_dir or DEFAULT_SNAPSHOT_DIR)
+        if not (snapshot_dir / SNAPSHOT_MANIFEST).exists():
+            return None
+        return cls(snapshot_dir)
+
+    def _file_signature(self):
+        stat = self.weights_path.stat()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def verify(self, force=False):
+        """Проверить размер и sha256 весов (ValueError при несовпадении)"""
+        signature = self._file_signature()
+        if signature['size'] != self.manifest['weights_size']:
+            raise ValueError(f"Размер весов снимка не совпадает: {self.weights_path}")
+
+        stamp_path = self.snapshot_dir / VERIFIED_STAMP
+        if not force:
+            try:
+                with open(stamp_path, 'r', encoding='utf-8') as f:
+                    if json.load(f) == signature:
+                        return
+            except (OSError, ValueError):
+                pass
+
+        print("🔍 Проверка контрольной суммы снимка XTTS v2...")
+        if file_sha256(self.weights_path) != self.manifest['weights_sha256']:
+            raise ValueError(f"Контрольная сумма весов снимка не совпадает: {self.weights_path}")
+        try:
+            with open(stamp_path, 'w', encoding='utf-8') as f:
+                json.dump(signature, f)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить отметку проверки снимка: {e}")
+
+    def load(self, device=None):
+        """Создать модель Xtts и отобразить веса снимка в память"""
+        import torch
+        from TTS.tts.configs.xtts_config import XttsConfig
+        from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer
+        from TTS.tts.models.xtts import Xtts
+
+        start = time.perf_counter()
+        self.verify()
+
+        versions = self.manifest.get('versions', {})
+        current = _package_versions()
+        if versions != current:
+            print(f"⚠️ Снимок создан с {versions}, установлено {current}")
+
+        config = XttsConfig()
+        config.load_json(str(self.snapshot_dir / "config.json"))
+        model = Xtts.init_from_config(config)
+        model.tokenizer = VoiceBpeTokenizer(vocab_file=str(self.snapshot_dir / "vocab.json"))
+        model.init_models()
+
+        # mmap + assign: параметры ссылаются на страницы файла без копирования
+        try:
+            state = torch.load(self.weights_path, map_location="cpu", mmap=True, weights_only=True)
+            model.load_state_dict(state, strict=True, assign=True)
+        except TypeError:
+            # torch < 2.1: без mmap, но все равно без разбора конфига TTS.api
+            state = torch.load(self.weights_path, map_location="cpu")
+            model.load_state_dict(state, strict=True)
+
+        model.hifigan_decoder.eval()
+        model.gpt.init_gpt_for_inference(kv_cache=model.args.kv_cache, use_deepspeed=False)
+        model.gpt.eval()
+        model.eval()
+        if device is not None:
+            model = model.to(device)
+        model.snapshot_path = str(self.snapshot_dir)
+
+        print(f"⚡ XTTS v2 загружена из снимка за {time.perf_counter() - start:.1f} сек")
+        return model
+
+
+def main():
+    """Создание и проверка снимка из командной строки"""
+    parser = argparse.ArgumentParser(description="Снимок весов XTTS v2 для быстрой загрузки")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Создать снимок из скачанной модели")
+    build.add_argument("--model-dir", help="Каталог модели XTTS v2 (по умолчанию - кэш TTS)")
+    build.add_argument("--dest", default=DEFAULT_SNAPSHOT_DIR, help="Каталог снимка")
+    verify = commands.add_parser("verify", help="Проверить контрольную сумму снимка")
+    verify.add_argument("--dest", default=DEFAULT_SNAPSHOT_DIR, help="Каталог снимка")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_snapshot(args.model_dir, args.dest)
+        return 0
+
+    snapshot = ModelSnapshot.find(args.dest)
+    if snapshot is None:
+        print(f"❌ Снимок не найден: {args.dest}")
+        return 1
+    try:
+        snapshot.verify(force=True)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ Снимок в порядке: {args.dest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Возобновляемые задания рендера длинного текста
+Каждая готовая часть сохраняется на диск рядом с манифестом задания, поэтому
+после ошибки или перезапуска генерация продолжается с первой недостающей части
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from xtts_engine import XTTS_MODEL_NAME, latents_hash
+
+JOB_FORMAT_VERSION = 1
+JOB_MANIFEST = "job.json"
+DEFAULT_JOBS_DIR = os.environ.get(
+    'RENDER_JOBS_DIR', str(Path(__file__).resolve().parent / "render_jobs")
+)
+
+
+def make_job_id(chunks, voice_hash, settings):
+    """Идентификатор задания по частям текста, голосу и параметрам"""
+    key = json.dumps({
+        'model': XTTS_MODEL_NAME,
+        'chunks': list(chunks),
+        'voice': voice_hash,
+        'settings': settings,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+class RenderJob:
+    """Задание рендера: манифест + по одному файлу на готовую часть
+
+    Часть считается готовой, если ее файл существует: файлы пишутся через
+    временный файл и os.replace, поэтому оборванная запись не оставляет
+    поврежденных частей.
+    """
+
+    def __init__(self, job_dir):
+        self.job_dir = Path(job_dir)
+        with open(self.job_dir / JOB_MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version', 0) > JOB_FORMAT_VERSION:
+            raise ValueError(f"Задание создано более новой версией программы: {job_dir}")
+        self.chunks = self.manifest['chunks']
+        self.sample_rate = self.manifest['sample_rate']
+
+    @classmethod
+    def open(cls, chunks, latents, sample_rate, jobs_dir=None, **settings):
+        """Открыть задание для этих частей и голоса (существующее или новое)"""
+        chunks = list(chunks)
+        voice_hash = latents_hash(latents)
+        job_id = make_job_id(chunks, voice_hash, settings)
+        job_dir = Path(jobs_dir or DEFAULT_JOBS_DIR) / job_id
+
+        if not (job_dir / JOB_MANIFEST).exists():
+            job_dir.mkdir(parents=True, exist_ok=True)
+            manifest = {
+                'format_version': JOB_FORMAT_VERSION,
+                'job_id': job_id,
+                'model': XTTS_MODEL_NAME,
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'voice_hash': voice_hash,
+                'sample_rate': sample_rate,
+                'settings': settings,
+                'chunks': chunks,
+            }
+            tmp_path = job_dir / (JOB_MANIFEST + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, job_dir / JOB_MANIFEST)
+
+        return cls(job_dir)
+
+    @property
+    def job_id(self):
+        return self.manifest['job_id']
+
+    def chunk_path(self, index):
+        """Путь к файлу готовой части"""
+        return self.job_dir / f"chunk_{index:05d}.wav"
+
+    def is_done(self, index):
+        return self.chunk_path(index).exists()
+
+    def missing_indices(self):
+        """Номера частей, которые еще не сгенерированы"""
+        return [i for i in range(len(self.chunks)) if not self.is_done(i)]
+
+    @property
+    def completed_count(self):
+        return len(self.chunks) - len(self.missing_indices())
+
+    def save_chunk(self, index, wav):
+        """Сохранить готовую часть (float32 без потерь, атомарно)"""
+        import soundfile as sf
+
+        path = self.chunk_path(index)
+        tmp_path = path.with_name(path.name + ".tmp")
+        sf.write(tmp_path, wav, self.sample_rate, subtype='FLOAT', format='WAV')
+        os.replace(tmp_path, path)
+
+    def load_chunk(self, index):
+        """Загрузить аудио готовой части"""
+        import soundfile as sf
+
+        wav, _ = sf.read(self.chunk_path(index), dtype='float32')
+        return wav
+
+    def reuse_from(self, other):
+        """Перенести готовые части из предыдущего задания, возвращает их число
+
+        Списки частей сравниваются как последовательности (difflib), поэтому
+        после правки текста заново генерируются только вставленные и
+        измененные части. Части переносятся, только если совпадают голос,
+        параметры генерации и частота дискретизации.
+        """
+        if other is None or other.job_dir == self.job_dir:
+            return 0
+        for field in ('voice_hash', 'settings', 'sample_rate'):
+            if other.manifest.get(field) != self.manifest.get(field):
+                return 0
+
+        reused = 0
+        matcher = difflib.SequenceMatcher(None, other.chunks, self.chunks, autojunk=False)
+        for tag, old_start, old_end, new_start, _ in matcher.get_opcodes():
+            if tag != 'equal':
+                continue
+            for offset in range(old_end - old_start):
+                old_index, new_index = old_start + offset, new_start + offset
+                if self.is_done(new_index) or not other.is_done(old_index):
+                    continue
+                path = self.chunk_path(new_index)
+                tmp_path = path.with_name(path.name + ".tmp")
+                shutil.copyfile(other.chunk_path(old_index), tmp_path)
+                os.replace(tmp_path, path)
+                reused += 1
+        return reused
+
+    def iter_audio(self):
+        """Аудио всех частей по порядку (по одной части в памяти)"""
+        missing = self.missing_indices()
+        if missing:
+            raise RuntimeError(f"Задание {self.job_id}: не сгенерированы части {[i + 1 for i in missing]}")
+        for index in range(len(self.chunks)):
+            yield self.load_chunk(index)
+
+    def remove(self):
+        """Удалить задание и сохраненные части"""
+        shutil.rmtree(self.job_dir, ignore_errors=True)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Конвейерный рендер длинного текста XTTS v2
+GPT -> вокодер -> запись работают в отдельных потоках,
+связанных ограниченными очередями: вокодер части N работает одновременно
+с GPT части N+1, а запись на диск не задерживает модель
+"""
+
+import queue
+import threading
+import time
+
+from xtts_engine import (
+    chunk_seed,
+    codes_to_latents,
+    decode_latents_batch,
+    default_inference_params,
+    encode_text,
+    generate_codes_batch,
+    get_output_sample_rate,
+    get_xtts_core,
+    inference_context,
+)
+
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Другая стадия конвейера завершилась с ошибкой"""
+
+
+class StageStats:
+    """Статистика одной стадии конвейера"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0         # время полезной работы
+        self.wait_input = 0.0   # ожидание данных от предыдущей стадии
+        self.wait_output = 0.0  # ожидание места в очереди следующей стадии
+
+    def occupancy(self, wall_time):
+        """Доля времени, когда стадия была занята работой"""
+        return self.busy / wall_time if wall_time > 0 else 0.0
+
+
+class RenderPipeline:
+    """Конвейер рендера: части -> коды GPT -> аудио -> приемник
+
+    Части текста подготавливаются заранее и передаются через run_chunks.
+    sink(номер части, аудио) вызывается в исходном порядке частей; если он не
+    задан, аудио частей собирается в self.results.
+    progress_callback(готово, всего) получает число уже записанных частей.
+    """
+
+    def __init__(self, model, latents, language="ru", speed=1.0,
+                 queue_size=4, sink=None, progress_callback=None, seed=None, prefix_cache=None, **params):
+        self.model = model
+        self.core = get_xtts_core(model)
+        self.language = language
+        self.speed = speed
+        self.sink = sink
+        self.progress_callback = progress_callback
+        self.seed = seed
+        self.prefix_cache = prefix_cache
+        self.sample_rate = get_output_sample_rate(model)
+
+        gpt_cond_latent, speaker_embedding = latents
+        self.gpt_cond_latent = gpt_cond_latent.to(self.core.device)
+        self.speaker_embedding = speaker_embedding.to(self.core.device)
+
+        self.settings = default_inference_params(model)
+        self.settings.update(params)
+
+        self.stats = [
+            StageStats("GPT"),
+            StageStats("Вокодер"),
+            StageStats("Запись"),
+        ]
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(3)]
+        self._error = None
+        self.results = []
+        self.total_chunks = None
+        self.completed = 0
+        self.wall_time = 0.0
+
+    def _put(self, q, item):
+        """Положить элемент в очередь, прерываясь при ошибке другой стадии"""
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._error is not None:
+                    raise PipelineAborted()
+
+    def _finish(self, q):
+        """Сообщить следующей стадии, что данных больше не будет"""
+        try:
+            self._put(q, _DONE)
+        except PipelineAborted:
+            pass
+
+    def _feed(self, items):
+        """Подача частей текста (с номерами) в GPT"""
+        outbox = self._queues[0]
+        try:
+            for item in items:
+                self._put(outbox, item)
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            self._finish(outbox)
+
+    def _run_stage(self, stats, inbox, outbox, work):
+        """Общий цикл стадии: взять из очереди, обработать, передать дальше"""
+        try:
+            with inference_context(self.model):
+                while True:
+                    start = time.perf_counter()
+                    item = inbox.get()
+                    stats.wait_input += time.perf_counter() - start
+                    if item is _DONE or self._error is not None:
+                        break
+
+                    index, payload = item
+                    start = time.perf_counter()
+                    result = work(index, payload)
+                    stats.busy += time.perf_counter() - start
+                    stats.items += 1
+
+                    if outbox is not None:
+                        start = time.perf_counter()
+                        self._put(outbox, (index, result))
+                        stats.wait_output += time.perf_counter() - start
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            if outbox is not None:
+                self._finish(outbox)
+
+    def _generate(self, index, chunk):
+        """Стадия 1: авторегрессионная генерация GPT и латенты для вокодера"""
+        tokens = encode_text(self.model, chunk, self.language)
+        # Зерно части зависит только от ее текста, поэтому часть воспроизводима
+        seed = chunk_seed(self.seed, chunk)
+        seeds = None if seed is None else [seed]
+        try:
+            codes = generate_codes_batch(self.core, [tokens], self.gpt_cond_latent, self.settings,
+                                         self.prefix_cache, seeds)[0]
+        except Exception as e:
+            # Ошибка не скрывается повтором с другими параметрами: конвейер останавливается
+            raise RuntimeError(f"Ошибка с частью {index+1}: {e}") from e
+        return codes_to_latents(self.core, tokens, codes, self.gpt_cond_latent, self.speed)
+
+    def _vocode(self, index, gpt_latents):
+        """Стадия 2: вокодер HiFiGAN"""
+        return decode_latents_batch(self.core, [gpt_latents], self.speaker_embedding)[0]
+
+    def _write(self, index, wav):
+        """Стадия 3: передача аудио приемнику"""
+        if self.sink is not None:
+            self.sink(index, wav)
+        else:
+            self.results.append(wav)
+        self.completed += 1
+        print(f"✅ Часть {index+1} сгенерирована и добавлена в общий файл")
+        if self.progress_callback is not None:
+            self.progress_callback(self.completed, self.total_chunks)
+
+    def run_chunks(self, chunks, indices=None):
+        """Рендер частей (например, только недостающих); возвращает аудио частей"""
+        if indices is None:
+            indices = range(len(chunks))
+        indices = list(indices)
+        self.total_chunks = len(indices)
+        self.completed = 0
+        return self._run((index, chunks[index]) for index in indices)
+
+    def _run(self, items):
+        """Запуск потоков стадий для последовательности (номер, часть)"""
+        threads = [
+            threading.Thread(target=self._feed, args=(items,), daemon=True),
+            threading.Thread(target=self._run_stage, daemon=True,
+                             args=(self.stats[0], self._queues[0], self._queues[1], self._generate)),
+            threading.Thread(target=self._run_stage, daemon=True,
+                             args=(self.stats[1], self._queues[1], self._queues[2], self._vocode)),
+            threading.Thread(target=self._run_stage, daemon=True,
+                             args=(self.stats[2], self._queues[2], None, self._write)),
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+
+        print(self.stage_report())
+        return self.results
+
+    def stage_report(self):
+        """Загрузка стадий конвейера: какая стадия - узкое место"""
+        lines = [f"📊 Конвейер: {self.total_chunks or 0} частей за {self.wall_time:.1f} сек"]
+        for stats in self.stats:
+            wall = self.wall_time or 1.0
+            lines.append(
+                f"  • {stats.name}: {stats.items} шт., занятость {stats.occupancy(self.wall_time) * 100:.0f}%, "
+                f"ожидание входа {stats.wait_input / wall * 100:.0f}%, "
+                f"ожидание выхода {stats.wait_output / wall * 100:.0f}%"
+            )
+        bottleneck = max(self.stats, key=lambda stats: stats.busy)
+        lines.append(f"  ⏳ Узкое место: {bottleneck.name}")
+        return "\n".join(lines)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Очередь запросов синтеза для веб-версии
+Запросы ждут в очереди, одновременно обслуживается не больше max_active
+запросов. Модель вызывает один поток планировщика, поэтому вызовы не
+конкурируют за общее состояние модели, а части разных запросов с одним
+голосом и параметрами объединяются в пакетные вызовы. Другие вызовы модели
+(вычисление латентов голоса) тоже выполняются в этом потоке через call()
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from xtts_engine import latents_hash, synthesize_batch
+
+DEFAULT_MAX_ACTIVE = int(os.environ.get('WEB_MAX_ACTIVE_REQUESTS', '2'))
+DEFAULT_BATCH_SIZE = int(os.environ.get('WEB_BATCH_SIZE', '4'))
+
+
+class SynthesisRequest:
+    """Запрос синтеза: части текста одного голоса и результат по каждой части"""
+
+    def __init__(self, chunks, latents, language, speed, params, stream=False):
+        self.chunks = list(chunks)
+        self.stream = stream  # Потоковый запрос: первая часть синтезируется отдельно
+        self.latents = latents
+        self.language = language
+        self.speed = speed
+        self.params = params
+        self.group_key = (latents_hash(latents), language, speed, tuple(sorted(params.items())))
+        self.results = [None] * len(self.chunks)
+        self.next_index = 0  # Первая часть, еще не отданная модели
+        self.completed = 0
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    @property
+    def wait_time(self):
+        """Время в очереди до начала обслуживания"""
+        end = self.started if self.started is not None else time.perf_counter()
+        return end - self.submitted
+
+
+class ModelCall:
+    """Вызов модели вне синтеза (например, латенты голоса), выполняемый планировщиком"""
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+
+class SynthesisScheduler:
+    """Планировщик: очередь запросов, ограничение одновременных, пакеты из разных запросов"""
+
+    def __init__(self, model, max_active=None, batch_size=None, seed=None, prefix_cache=None):
+        self.model = model
+        self.max_active = max(1, max_active or DEFAULT_MAX_ACTIVE)
+        self.batch_size = max(1, batch_size or DEFAULT_BATCH_SIZE)
+        self.seed = seed
+        self.prefix_cache = prefix_cache
+        self.batches = 0
+        self.merged_batches = 0  # Пакеты с частями нескольких запросов
+        self._last_group = None  # Группа последнего пакета: группы обслуживаются по очереди
+        self._waiting = deque()
+        self._active = []
+        self._calls = deque()  # Вызовы модели вне синтеза, выполняются перед следующим пакетом
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, chunks, latents, language="ru", speed=1.0, stream=False, **params):
+        """Поставить запрос в очередь"""
+        request = SynthesisRequest(chunks, latents, language, speed, params, stream)
+        with self._cond:
+            if request.chunks:
+                self._waiting.append(request)
+                self._cond.notify_all()
+            else:
+                request.done.set()
+        return request
+
+    def call(self, func, *args, **kwargs):
+        """Выполнить func(*args, **kwargs) в потоке модели и вернуть результат
+
+        Так вызовы модели из обработчиков веб-интерфейса (латенты голоса) не
+        выполняются одновременно с пакетом синтеза. Вызов ждет окончания
+        текущего пакета и идет раньше следующего.
+        """
+        if threading.current_thread() is self._thread:
+            return func(*args, **kwargs)
+        call = ModelCall(func, args, kwargs)
+        with self._cond:
+            self._calls.append(call)
+            self._cond.notify_all()
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def position(self, request):
+        """Позиция в очереди (0 - запрос уже обслуживается или готов)"""
+        with self._cond:
+            return self._position(request)
+
+    def _position(self, request):
+        for index, waiting in enumerate(self._waiting):
+            if waiting is request:
+                return index + 1
+        return 0
+
+    def cancel(self, request):
+        """Отменить запрос: убрать из очереди или прекратить выдачу его частей модели
+
+        Части, уже отданные модели, досчитываются в текущем пакете, но
+        новых пакетов для запроса не будет.
+        """
+        with self._cond:
+            if request.done.is_set():
+                return
+            if request in self._waiting:
+                self._waiting.remove(request)
+            if request in self._active:
+                self._active.remove(request)
+            request.next_index = len(request.chunks)
+            request.error = "запрос отменен"
+            request.finished = time.perf_counter()
+            request.done.set()
+            self._cond.notify_all()
+
+    def wait(self, request, poll_interval=0.5):
+        """Ожидание запроса: выдает (позиция в очереди, готово частей) до завершения
+
+        Выдает состояние после каждого пакета планировщика и не реже
+        poll_interval, поэтому готовые части видны сразу.
+        """
+        while True:
+            with self._cond:
+                if not request.done.is_set():
+                    self._cond.wait(poll_interval)
+                position = self._position(request)
+                completed = request.completed
+                done = request.done.is_set()
+            if done:
+                break
+            yield position, completed
+        if request.error:
+            raise RuntimeError(request.error)
+
+    def _next_batch(self):
+        """Следующий пакет: части активных запросов с тем же голосом и параметрами"""
+        while self._waiting and len(self._active) < self.max_active:
+            request = self._waiting.popleft()
+            request.started = time.perf_counter()
+            self._active.append(request)
+
+        pending = [request for request in self._active if request.next_index < len(request.chunks)]
+        if not pending:
+            return None
+
+        # Первая часть потокового запроса идет отдельно: время до первого звука не ждет пакет
+        for request in pending:
+            if request.stream and request.next_index == 0 and len(request.chunks) > 1:
+                request.next_index = 1
+                return [(request, 0)]
+
+        # Группы (голос и параметры) обслуживаются по кругу, чтобы длинный запрос
+        # не задерживал запросы с другим голосом; в группе - от старых запросов к новым
+        groups = []
+        for request in pending:
+            if request.group_key not in groups:
+                groups.append(request.group_key)
+        group_key = groups[0]
+        if self._last_group in groups:
+            group_key = groups[(groups.index(self._last_group) + 1) % len(groups)]
+        self._last_group = group_key
+        batch = []
+        for request in pending:
+            if request.group_key != group_key:
+                continue
+            while request.next_index < len(request.chunks) and len(batch) < self.batch_size:
+                batch.append((request, request.next_index))
+                request.next_index += 1
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def _loop(self):
+        """Поток планировщика: единственный, кто вызывает модель"""
+        while True:
+            call = None
+            with self._cond:
+                while True:
+                    if self._calls:
+                        call = self._calls.popleft()
+                        break
+                    batch = self._next_batch()
+                    if batch is not None:
+                        break
+                    self._cond.wait()
+
+            if call is not None:
+                call.run()
+                continue
+
+            request = batch[0][0]
+            chunks = [r.chunks[index] for r, index in batch]
+            try:
+                wavs = synthesize_batch(self.model, chunks, request.latents, language=request.language,
+                                        speed=request.speed, batch_size=len(chunks), seed=self.seed,
+                                        prefix_cache=self.prefix_cache, **request.params)
+                error = None
+            except Exception as e:
+                wavs = [None] * len(chunks)
+                error = str(e)
+
+            with self._cond:
+                self.batches += 1
+                if len({id(r) for r, _ in batch}) > 1:
+                    self.merged_batches += 1
+                for (r, index), wav in zip(batch, wavs):
+                    r.results[index] = wav
+                    r.completed += 1
+                    if error and r.error is None:
+                        r.error = error
+                        r.next_index = len(r.chunks)
+                for r, _ in batch:
+                    finished = r.completed >= len(r.chunks) or r.error is not None
+                    if finished and not r.done.is_set():
+                        r.finished = time.perf_counter()
+                        self._active.remove(r)
+                        r.done.set()
+                self._cond.notify_all()
+
+    def stats(self):
+        """Состояние очереди и пакетов"""
+        with self._cond:
+            return {
+                'waiting': len(self._waiting),
+                'active': len(self._active),
+                'batches': self.batches,
+                'merged_batches': self.merged_batches,
+            }
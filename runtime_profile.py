@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Профиль потоков CPU для этого компьютера
+Лучшие число потоков torch, число процессов и привязка к ядрам подбираются
+калибровкой (python check_gpu.py --calibrate) и применяются при запуске
+десктопной, веб-версии и пакетной озвучки
+
+Файл хранит профили нескольких компьютеров (ключ - имя хоста, архитектура
+и число ядер), поэтому его можно держать в общем каталоге
+"""
+
+import json
+import os
+import platform
+from pathlib import Path
+
+DEFAULT_PROFILE_PATH = os.environ.get(
+    'XTTS_RUNTIME_PROFILE', str(Path(__file__).resolve().parent / "runtime_profile.json")
+)
+AFFINITY_LAYOUTS = ("none", "compact")
+
+
+def available_cpus():
+    """Ядра, доступные процессу (с учетом ограничений cgroup/taskset)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def host_signature():
+    """Ключ профиля: хост, архитектура и число доступных ядер"""
+    return f"{platform.node()}|{platform.machine()}|{len(available_cpus())}"
+
+
+def _read_profiles(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('hosts', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def load_runtime_profile(path=None):
+    """Профиль этого компьютера или None, если калибровка не проводилась"""
+    return _read_profiles(path or DEFAULT_PROFILE_PATH).get(host_signature())
+
+
+def save_runtime_profile(profile, path=None):
+    """Сохранить профиль этого компьютера (профили других хостов сохраняются)"""
+    path = path or DEFAULT_PROFILE_PATH
+    hosts = _read_profiles(path)
+    hosts[host_signature()] = profile
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'hosts': hosts}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def worker_affinity(num_workers, threads_per_worker, layout="compact"):
+    """Наборы ядер для рабочих процессов (None - без привязки)
+
+    compact - каждому процессу подряд идущие ядра: на Linux соседние номера
+    обычно разные физические ядра, поэтому процессы не делят ядро через SMT.
+    """
+    if layout == "none" or not hasattr(os, 'sched_setaffinity'):
+        return None
+    cpus = available_cpus()
+    if num_workers * threads_per_worker > len(cpus):
+        return None
+    return [cpus[i * threads_per_worker:(i + 1) * threads_per_worker] for i in range(num_workers)]
+
+
+def apply_thread_settings(intra_threads, interop_threads=None, cpus=None):
+    """Задать потоки torch (и привязку к ядрам) для текущего процесса
+
+    Возвращает False, если число межоперационных потоков задать не удалось:
+    torch позволяет это только до первой параллельной операции в процессе.
+    """
+    import torch
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(intra_threads)
+    if interop_threads and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"⚠️ Межоперационные потоки torch не изменены ({torch.get_num_interop_threads()}): {e}")
+            return False
+    return True
+
+
+def apply_runtime_profile(path=None):
+    """Применить профиль этого компьютера к текущему процессу, возвращает профиль или None"""
+    profile = load_runtime_profile(path)
+    if profile is None:
+        return None
+    try:
+        apply_thread_settings(profile['intra_threads'], profile.get('interop_threads'))
+        print(f"⚙️ Профиль CPU: {profile['intra_threads']} потоков torch, "
+              f"{profile['workers']} процессов по {profile['threads_per_worker']} потоков "
+              f"(калибровка {profile.get('calibrated', '?')})")
+    except Exception as e:
+        print(f"⚠️ Профиль CPU не применен: {e}")
+    return profile
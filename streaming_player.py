@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение аудио по мере генерации (для потокового синтеза XTTS v2)
+Фрагменты пишутся в звуковое устройство из отдельного потока,
+чтобы синтез никогда не ждал воспроизведения
+"""
+
+import queue
+import threading
+
+
+class StreamingPlayer:
+    """Проигрыватель потока float32-фрагментов через PyAudio"""
+
+    def __init__(self, audio, sample_rate, channels=1):
+        import pyaudio
+
+        self.stream = audio.open(
+            format=pyaudio.paFloat32,
+            channels=channels,
+            rate=sample_rate,
+            output=True
+        )
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._play_loop, daemon=True)
+        self._thread.start()
+
+    def _play_loop(self):
+        """Запись фрагментов в устройство вывода"""
+        try:
+            while True:
+                frames = self._queue.get()
+                if frames is None:
+                    break
+                self.stream.write(frames.tobytes())
+        except Exception as e:
+            print(f"⚠️ Ошибка потокового воспроизведения: {e}")
+        finally:
+            self.stream.stop_stream()
+            self.stream.close()
+
+    def play(self, frames):
+        """Поставить фрагмент в очередь воспроизведения"""
+        self._queue.put(frames)
+
+    def close(self, wait=True):
+        """Завершить воспроизведение (по умолчанию дождаться конца очереди)"""
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
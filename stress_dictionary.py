@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Компактный словарь ударений русских словоформ с доступом через mmap
+Файл - хэш-таблица с открытой адресацией: открывается мгновенно, страницы
+читаются с диска по мере обращения и общие для всех процессов, поиск слова -
+одно вычисление crc32 и одно-два сравнения ключей
+
+Сборка словаря из текстового списка форм (одна форма на строку, ударение
+отмечается + перед гласной, ' или знаком ударения после гласной):
+    python stress_dictionary.py build forms.txt stress_dictionary.sdict
+
+Формат файла:
+    заголовок: сигнатура, число записей, число ячеек
+    ячейки: uint32 (0 - пусто, иначе смещение записи + 1)
+    записи: длина ключа (1 байт), ключ UTF-8 в нижнем регистре,
+            номер ударной буквы (1 байт)
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+DEFAULT_DICTIONARY_PATH = os.environ.get(
+    'STRESS_DICTIONARY_PATH', str(Path(__file__).resolve().parent / "stress_dictionary.sdict")
+)
+
+MAGIC = b'XSTRESS1'
+HEADER = struct.Struct('<8sII')
+VOWELS = 'аеёиоуыэюя'
+STRESS_MARKS = ("́", "'")
+
+
+def parse_form(line):
+    """Словоформа с отметкой ударения -> (слово в нижнем регистре, номер ударной буквы)"""
+    line = line.strip().lower()
+    if not line or line.startswith('#'):
+        return None
+    word = []
+    stress = None
+    for char in line:
+        if char == '+':
+            stress = len(word)
+        elif char in STRESS_MARKS:
+            if word:
+                stress = len(word) - 1
+        else:
+            word.append(char)
+    word = ''.join(word)
+    if stress is None or stress >= len(word) or word[stress] not in VOWELS:
+        return None
+    return word, stress
+
+
+def build_dictionary(source_path, dest_path):
+    """Собрать файл словаря из текстового списка словоформ с ударениями"""
+    entries = {}
+    with open(source_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parsed = parse_form(line)
+            if parsed is None:
+                continue
+            word, stress = parsed
+            # Односложные слова и ударение на ё не нуждаются в словаре
+            if sum(char in VOWELS for char in word) < 2 or word[stress] == 'ё':
+                continue
+            key = word.encode('utf-8')
+            if len(key) > 255:
+                continue
+            # Омографы (замок/замок) с разными ударениями не размечаются автоматически
+            if entries.get(key, stress) != stress:
+                stress = None
+            entries[key] = stress
+
+    keys = [key for key, stress in entries.items() if stress is not None]
+    num_slots = 1
+    while num_slots < len(keys) * 2:
+        num_slots *= 2
+    mask = num_slots - 1
+
+    slots = array('I', bytes(4 * num_slots))
+    blob = bytearray()
+    for key in keys:
+        offset = len(blob) + 1
+        blob += bytes((len(key),)) + key + bytes((entries[key],))
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = offset
+    if sys.byteorder != 'little':
+        slots.byteswap()
+
+    tmp_path = str(dest_path) + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys), num_slots))
+        f.write(slots.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, dest_path)
+    print(f"✅ Словарь ударений собран: {len(keys)} форм, "
+          f"{len(entries) - len(keys)} омографов пропущено -> {dest_path}")
+    return len(keys)
+
+
+class StressDictionary:
+    """Словарь ударений только для чтения, отображенный в память"""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise RuntimeError("Словарь ударений поддерживается только на little-endian системах")
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.entries, num_slots = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Файл не является словарем ударений: {path}")
+        self._mask = num_slots - 1
+        self._blob = HEADER.size + 4 * num_slots
+        self._slots = memoryview(self._mm)[HEADER.size:self._blob].cast('I')
+
+    def stress_index(self, word):
+        """Номер ударной буквы слова или None, если слова нет в словаре"""
+        key = word.lower().encode('utf-8')
+        if len(key) > 255:
+            return None
+        mm = self._mm
+        slots = self._slots
+        mask = self._mask
+        slot = zlib.crc32(key) & mask
+        while True:
+            offset = slots[slot]
+            if not offset:
+                return None
+            pos = self._blob + offset - 1
+            length = mm[pos]
+            if length == len(key) and mm[pos + 1:pos + 1 + length] == key:
+                return mm[pos + 1 + length]
+            slot = (slot + 1) & mask
+
+    def __len__(self):
+        return self.entries
+
+    def close(self):
+        """Закрыть файл словаря"""
+        self._slots.release()
+        self._mm.close()
+        self._file.close()
+
+
+def main():
+    """Сборка словаря и проверка слов из командной строки"""
+    parser = argparse.ArgumentParser(description="Словарь ударений для автоматической расстановки")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Собрать словарь из списка словоформ")
+    build.add_argument("source", help="Текстовый файл: одна словоформа с ударением на строку")
+    build.add_argument("dest", nargs="?", default=DEFAULT_DICTIONARY_PATH, help="Итоговый файл словаря")
+    lookup = commands.add_parser("lookup", help="Показать ударения слов")
+    lookup.add_argument("words", nargs="+")
+    lookup.add_argument("--dictionary", default=DEFAULT_DICTIONARY_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_dictionary(args.source, args.dest)
+        return 0
+
+    dictionary = StressDictionary(args.dictionary)
+    for word in args.words:
+        index = dictionary.stress_index(word)
+        if index is None:
+            print(f"{word}: нет в словаре")
+        else:
+            print(f"{word}: {word[:index]}+{word[index:]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Словарь ударений и произношений для подготовки текста
+Слова текста ищутся в словаре по одному разу (хэш-таблица по слову в нижнем
+регистре), поэтому время обработки не зависит от размера словаря
+
+Формат файла (UTF-8), одна запись на строку:
+    замок   з+амок
+    Федотов Фед+отов
+    # комментарий
+Замена может использовать синтаксис ударений (+ и -).
+"""
+
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_LEXICON_PATH = os.environ.get(
+    'STRESS_LEXICON_PATH', str(Path(__file__).resolve().parent / "stress_lexicon.txt")
+)
+
+# Слово словаря - одна непрерывная последовательность букв/цифр (как \b...\b)
+_TOKEN_RE = re.compile(r'\w+')
+
+
+class StressLexicon:
+    """Словарь замен слов с поиском за один проход по тексту
+
+    Слово текста заменяется, если оно целиком (от границы до границы слова)
+    совпадает с записью без учета регистра. Файл словаря перечитывается
+    автоматически, если он изменился (проверка не чаще reload_interval сек).
+    """
+
+    def __init__(self, entries=None, path=None, prepare=None, reload_interval=1.0):
+        self.base_entries = dict(entries or {})
+        self.path = path
+        self.prepare = prepare
+        self.reload_interval = reload_interval
+        self._lookup = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._build(self._read_file() if path else {})
+
+    def _read_file(self):
+        """Прочитать записи из файла словаря (нет файла - пустой словарь)"""
+        entries = {}
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._mtime = None
+            return entries
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(None, 1)
+                if len(parts) != 2 or not _TOKEN_RE.fullmatch(parts[0]):
+                    print(f"⚠️ Словарь ударений {self.path}, строка {line_number}: пропущена запись '{line}'")
+                    continue
+                entries[parts[0]] = parts[1].strip()
+
+        self._mtime = stat.st_mtime_ns
+        print(f"📖 Словарь ударений загружен: {len(entries)} записей из {self.path}")
+        return entries
+
+    def _build(self, file_entries):
+        """Собрать таблицу поиска: встроенные записи + записи из файла"""
+        lookup = {}
+        for entries in (self.base_entries, file_entries):
+            for word, replacement in entries.items():
+                if self.prepare is not None:
+                    replacement = self.prepare(replacement)
+                lookup[word.lower()] = replacement
+        self._lookup = lookup
+
+    def maybe_reload(self):
+        """Перечитать файл словаря, если он изменился"""
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            try:
+                self._build(self._read_file())
+            except Exception as e:
+                print(f"⚠️ Не удалось перечитать словарь ударений {self.path}: {e}")
+
+    def __len__(self):
+        return len(self._lookup)
+
+    def apply(self, text):
+        """Заменить слова текста записями словаря"""
+        self.maybe_reload()
+        lookup = self._lookup
+        if not lookup:
+            return text
+        return _TOKEN_RE.sub(lambda match: lookup.get(match.group(0).lower(), match.group(0)), text)
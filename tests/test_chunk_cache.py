@@ -0,0 +1,81 @@
+"""Кэш частей: ключи, вытеснение давно не использованных и учет размера"""
+
+import os
+
+import pytest
+
+from chunk_cache import SAMPLER_SEEDED, SAMPLER_STREAM, ChunkAudioCache
+
+
+def test_key_depends_on_everything_that_changes_audio(tmp_path):
+    cache = ChunkAudioCache(tmp_path)
+    base = cache.make_key("текст", "голос", 0, temperature=0.7)
+    assert base == cache.make_key("текст", "голос", 0, profile="fp32", sampler=SAMPLER_SEEDED, temperature=0.7)
+    others = [
+        cache.make_key("текст.", "голос", 0, temperature=0.7),
+        cache.make_key("текст", "другой", 0, temperature=0.7),
+        cache.make_key("текст", "голос", 1, temperature=0.7),
+        cache.make_key("текст", "голос", 0, temperature=0.8),
+        cache.make_key("текст", "голос", 0, profile="int8", temperature=0.7),
+        cache.make_key("текст", "голос", 0, sampler=SAMPLER_STREAM, temperature=0.7),
+    ]
+    assert base not in others
+    assert len(set(others)) == len(others)
+
+
+@pytest.fixture
+def audio():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("soundfile")
+    rng = np.random.default_rng(0)
+    return [rng.uniform(-0.5, 0.5, 2400).astype(np.float32) for _ in range(3)]
+
+
+def entry_size(cache, key):
+    return os.path.getsize(cache._path(key))
+
+
+def test_lru_eviction_and_byte_accounting(tmp_path, audio):
+    cache = ChunkAudioCache(tmp_path, max_bytes=10 ** 9)
+    keys = [cache.make_key(f"часть {i}", "голос", 0) for i in range(3)]
+    for key, wav in zip(keys, audio):
+        cache.put(key, wav, 24000)
+    sizes = [entry_size(cache, key) for key in keys]
+    assert cache.stats()['bytes'] == sum(sizes)
+
+    # Перезапись не удваивает размер
+    cache.put(keys[0], audio[0], 24000)
+    assert cache.stats()['bytes'] == sum(sizes)
+
+    # Часть 0 использована недавно, поэтому вытесняется часть 1
+    assert cache.get(keys[0]) is not None
+    cache.max_bytes = sizes[0] + sizes[2]
+    cache.put(keys[2], audio[2], 24000)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert not os.path.exists(cache._path(keys[1]))
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['bytes'] == sizes[0] + sizes[2]
+
+    # Порядок LRU и размер восстанавливаются после перезапуска
+    reopened = ChunkAudioCache(tmp_path, max_bytes=cache.max_bytes)
+    assert reopened.stats()['bytes'] == sizes[0] + sizes[2]
+
+
+def test_corrupt_entry_is_removed_and_uncounted(tmp_path, audio):
+    cache = ChunkAudioCache(tmp_path)
+    good, bad = cache.make_key("хорошая", "голос", 0), cache.make_key("плохая", "голос", 0)
+    cache.put(good, audio[0], 24000)
+    cache.put(bad, audio[1], 24000)
+    cache._path(bad).write_bytes(b"not flac")
+
+    assert cache.get(bad) is None
+    assert not cache._path(bad).exists()
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['bytes'] == entry_size(cache, good)
+    assert stats['misses'] == 1
+
+    cache.clear()
+    assert cache.stats()['bytes'] == 0
+    assert not cache._path(good).exists()
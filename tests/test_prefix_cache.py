@@ -0,0 +1,66 @@
+"""Кэш префикса GPT: коды с кэшем совпадают с кодами без него при тех же зернах"""
+
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+gpt_module = pytest.importorskip("TTS.tts.layers.xtts.gpt")
+
+from inference_profiles import compare_prefix_cache_codes  # noqa: E402
+from xtts_engine import PrefixKVCache  # noqa: E402
+
+SETTINGS = {'temperature': 0.8, 'length_penalty': 1.0, 'repetition_penalty': 2.0, 'top_k': 20, 'top_p': 0.9}
+
+
+@pytest.fixture(scope="module")
+def core():
+    """Маленький GPT XTTS со случайными весами (та же архитектура, что в модели)"""
+    torch.manual_seed(0)
+    gpt = gpt_module.GPT(
+        start_text_token=261,
+        stop_text_token=0,
+        layers=2,
+        model_dim=32,
+        heads=2,
+        max_text_tokens=40,
+        max_mel_tokens=30,
+        max_prompt_tokens=16,
+        number_text_tokens=300,
+        number_audio_codes=64,
+        start_audio_token=62,
+        stop_audio_token=63,
+    )
+    gpt.init_gpt_for_inference(kv_cache=True, use_deepspeed=False)
+    gpt.eval()
+    return types.SimpleNamespace(gpt=gpt, device=torch.device("cpu"))
+
+
+def test_cached_prefix_gives_same_codes(core):
+    gpt_cond_latent = torch.randn(1, 32, 32)
+    text_tokens = [torch.randint(1, 200, (1, 7)), torch.randint(1, 200, (1, 12))]
+    prefix_cache = PrefixKVCache()
+
+    with torch.inference_mode():
+        plain, cached, used = compare_prefix_cache_codes(core, text_tokens, gpt_cond_latent, SETTINGS,
+                                                         [11, 12], prefix_cache)
+
+    assert used
+    assert prefix_cache.enabled
+    for plain_codes, cached_codes in zip(plain, cached):
+        assert torch.equal(plain_codes, cached_codes)
+
+
+def test_second_call_hits_cache(core):
+    gpt_cond_latent = torch.randn(1, 32, 32)
+    text_tokens = [torch.randint(1, 200, (1, 9))]
+    prefix_cache = PrefixKVCache()
+
+    with torch.inference_mode():
+        compare_prefix_cache_codes(core, text_tokens, gpt_cond_latent, SETTINGS, [5], prefix_cache)
+        _, cached, used = compare_prefix_cache_codes(core, text_tokens, gpt_cond_latent, SETTINGS, [5],
+                                                     prefix_cache)
+
+    assert used
+    assert prefix_cache.stats()['hits'] >= 1
+    assert cached[0].shape[0] == 1
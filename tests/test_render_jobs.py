@@ -0,0 +1,60 @@
+"""Задания рендера: перенос готовых частей из предыдущего задания после правки текста"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from render_jobs import RenderJob  # noqa: E402
+
+SAMPLE_RATE = 24000
+
+
+@pytest.fixture
+def latents():
+    torch.manual_seed(0)
+    return torch.randn(1, 32, 1024), torch.randn(1, 512, 1)
+
+
+def finish(job, indices=None):
+    """Отметить части готовыми (файл части - признак готовности)"""
+    for index in range(len(job.chunks)) if indices is None else indices:
+        job.chunk_path(index).write_bytes(f"{job.chunks[index]}".encode('utf-8'))
+
+
+def test_reuses_unchanged_chunks_after_edit(tmp_path, latents):
+    old = RenderJob.open(["один", "два", "три", "четыре"], latents, SAMPLE_RATE, jobs_dir=tmp_path, seed=0)
+    finish(old)
+    new = RenderJob.open(["один", "два с правкой", "три", "вставка", "четыре"], latents, SAMPLE_RATE,
+                         jobs_dir=tmp_path, seed=0)
+    assert new.job_dir != old.job_dir
+
+    assert new.reuse_from(old) == 3
+    assert new.missing_indices() == [1, 3]
+    assert new.chunk_path(2).read_bytes() == "три".encode('utf-8')
+    assert new.chunk_path(4).read_bytes() == "четыре".encode('utf-8')
+    # Повторный перенос не копирует уже готовые части
+    assert new.reuse_from(old) == 0
+
+
+def test_skips_missing_old_chunks_and_same_job(tmp_path, latents):
+    old = RenderJob.open(["один", "два"], latents, SAMPLE_RATE, jobs_dir=tmp_path, seed=0)
+    finish(old, [1])
+    new = RenderJob.open(["один", "два", "три"], latents, SAMPLE_RATE, jobs_dir=tmp_path, seed=0)
+    assert new.reuse_from(old) == 1
+    assert new.missing_indices() == [0, 2]
+    assert new.reuse_from(new) == 0
+    assert new.reuse_from(None) == 0
+
+
+def test_no_reuse_with_other_voice_settings_or_rate(tmp_path, latents):
+    chunks = ["один", "два"]
+    old = RenderJob.open(chunks, latents, SAMPLE_RATE, jobs_dir=tmp_path, seed=0)
+    finish(old)
+    other_voice = (latents[0] + 1, latents[1])
+    for job in (
+        RenderJob.open(chunks + ["три"], other_voice, SAMPLE_RATE, jobs_dir=tmp_path, seed=0),
+        RenderJob.open(chunks + ["три"], latents, SAMPLE_RATE, jobs_dir=tmp_path, seed=1),
+        RenderJob.open(chunks + ["три"], latents, 22050, jobs_dir=tmp_path, seed=0),
+    ):
+        assert job.reuse_from(old) == 0
+        assert job.missing_indices() == [0, 1, 2]
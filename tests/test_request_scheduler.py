@@ -0,0 +1,122 @@
+"""Планировщик веб-версии: состав пакетов, очередность групп и отмена запросов"""
+
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import request_scheduler  # noqa: E402
+from request_scheduler import SynthesisScheduler  # noqa: E402
+
+
+class RecordingModel:
+    """Вместо синтеза запоминает пакеты; первый пакет ждет разрешения gate"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def synthesize_batch(self, model, chunks, latents, **kwargs):
+        self.batches.append(list(chunks))
+        self.started.set()
+        assert self.gate.wait(10)
+        return [chunk.upper() for chunk in chunks]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = RecordingModel()
+    monkeypatch.setattr(request_scheduler, 'synthesize_batch', model.synthesize_batch)
+    return model
+
+
+def voice(seed):
+    torch.manual_seed(seed)
+    return torch.randn(1, 4, 8), torch.randn(1, 8, 1)
+
+
+def finish(scheduler, request):
+    for _ in scheduler.wait(request, poll_interval=0.05):
+        pass
+    return request.results
+
+
+def test_groups_are_served_round_robin(model):
+    scheduler = SynthesisScheduler(model, max_active=4, batch_size=4)
+    blocker = scheduler.submit(["x"], voice(0))
+    assert model.started.wait(10)
+    first = scheduler.submit([f"a{i}" for i in range(6)], voice(1))
+    second = scheduler.submit(["b0", "b1"], voice(2))
+    model.gate.set()
+
+    finish(scheduler, blocker)
+    assert finish(scheduler, first) == [f"A{i}" for i in range(6)]
+    assert finish(scheduler, second) == ["B0", "B1"]
+    # Длинный запрос не задерживает запрос с другим голосом
+    assert model.batches == [["x"], ["a0", "a1", "a2", "a3"], ["b0", "b1"], ["a4", "a5"]]
+
+
+def test_same_group_requests_share_a_batch(model):
+    scheduler = SynthesisScheduler(model, max_active=4, batch_size=4)
+    blocker = scheduler.submit(["x"], voice(0))
+    assert model.started.wait(10)
+    first = scheduler.submit(["a0", "a1"], voice(1))
+    second = scheduler.submit(["b0", "b1"], voice(1))
+    model.gate.set()
+
+    for request in (blocker, first, second):
+        finish(scheduler, request)
+    assert model.batches == [["x"], ["a0", "a1", "b0", "b1"]]
+    assert scheduler.stats()['merged_batches'] == 1
+
+
+def test_streaming_first_chunk_goes_alone(model):
+    model.gate.set()
+    scheduler = SynthesisScheduler(model, batch_size=4)
+    request = scheduler.submit(["s0", "s1", "s2"], voice(1), stream=True)
+    assert finish(scheduler, request) == ["S0", "S1", "S2"]
+    assert model.batches == [["s0"], ["s1", "s2"]]
+
+
+def test_cancel_active_request_stops_its_batches(model):
+    scheduler = SynthesisScheduler(model, max_active=1, batch_size=2)
+    active = scheduler.submit(["a0", "a1", "a2", "a3"], voice(1))
+    assert model.started.wait(10)
+    waiting = scheduler.submit(["b0"], voice(2))
+    assert scheduler.position(waiting) == 1
+
+    scheduler.cancel(active)
+    assert active.done.is_set()
+    with pytest.raises(RuntimeError):
+        finish(scheduler, active)
+    model.gate.set()
+
+    # Место отмененного запроса сразу занимает следующий
+    assert finish(scheduler, waiting) == ["B0"]
+    assert model.batches == [["a0", "a1"], ["b0"]]
+    assert scheduler.stats()['active'] == 0
+
+
+def test_cancel_waiting_request(model):
+    scheduler = SynthesisScheduler(model, max_active=1, batch_size=2)
+    active = scheduler.submit(["a0"], voice(1))
+    assert model.started.wait(10)
+    waiting = scheduler.submit(["b0"], voice(2))
+    scheduler.cancel(waiting)
+    assert scheduler.position(waiting) == 0
+    model.gate.set()
+
+    assert finish(scheduler, active) == ["A0"]
+    with pytest.raises(RuntimeError):
+        finish(scheduler, waiting)
+    assert model.batches == [["a0"]]
+
+
+def test_call_runs_on_scheduler_thread(model):
+    model.gate.set()
+    scheduler = SynthesisScheduler(model)
+    assert scheduler.call(threading.current_thread) is scheduler._thread
+    with pytest.raises(ZeroDivisionError):
+        scheduler.call(lambda: 1 / 0)
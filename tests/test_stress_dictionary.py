@@ -0,0 +1,46 @@
+"""Словарь ударений mmap: сборка из списка форм и поиск слов"""
+
+import pytest
+
+from stress_dictionary import StressDictionary, build_dictionary, parse_form
+
+
+def test_parse_form_marks():
+    assert parse_form("мол+око") == ("молоко", 3)
+    assert parse_form("МОЛО'КО") == ("молоко", 3)
+    assert parse_form("молоко\u0301") == ("молоко", 5)
+    assert parse_form("+молоко") is None  # Ударение не на гласной
+    assert parse_form("молоко") is None
+    assert parse_form("# комментарий") is None
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    source = tmp_path / "forms.txt"
+    forms = ["мол+око", "гор+ода", "город+а", "з+амок", "зам+ок", "дом", "ёлка", "вед+ёт"]
+    forms += [f"сл+ово{i}" for i in range(200)]
+    source.write_text("\n".join(forms) + "\n", encoding='utf-8')
+    dest = tmp_path / "stress.sdict"
+    count = build_dictionary(source, dest)
+    dictionary = StressDictionary(str(dest))
+    yield count, dictionary
+    dictionary.close()
+
+
+def test_build_lookup_round_trip(dictionary):
+    count, dictionary = dictionary
+    # Омографы, односложные слова и ударение на ё в словарь не попадают
+    assert count == len(dictionary) == 201
+    assert dictionary.stress_index("молоко") == 3
+    assert dictionary.stress_index("Молоко") == 3
+    for i in range(200):
+        assert dictionary.stress_index(f"слово{i}") == 2
+    for word in ("замок", "города", "дом", "ёлка", "ведёт", "нет", "x" * 300):
+        assert dictionary.stress_index(word) is None
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "bad.sdict"
+    path.write_bytes(b"NOTSTRSS" + bytes(8))
+    with pytest.raises(ValueError):
+        StressDictionary(str(path))
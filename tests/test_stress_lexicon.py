@@ -0,0 +1,43 @@
+"""Словарь ударений: замена целых слов без учета регистра и перечитывание файла"""
+
+import os
+
+from stress_lexicon import StressLexicon
+
+
+def test_replaces_whole_words_ignoring_case():
+    lexicon = StressLexicon({'замок': 'з+амок', 'Федотов': 'Фед+отов'})
+    assert len(lexicon) == 2
+    assert lexicon.apply("Замок и ФЕДОТОВ.") == "з+амок и Фед+отов."
+    # Часть слова не заменяется
+    assert lexicon.apply("замки замочек") == "замки замочек"
+
+
+def test_prepare_is_applied_to_replacements():
+    lexicon = StressLexicon({'замок': 'з+амок'}, prepare=str.upper)
+    assert lexicon.apply("замок") == "З+АМОК"
+
+
+def test_file_entries_override_builtin_and_skip_bad_lines(tmp_path):
+    path = tmp_path / "lexicon.txt"
+    path.write_text("# комментарий\nзамок   зам+ок\nбез_замены\nдва слова тоже\n", encoding='utf-8')
+    lexicon = StressLexicon({'замок': 'з+амок'}, path=str(path))
+    assert lexicon.apply("замок два") == "зам+ок слова тоже"
+    assert lexicon.apply("без_замены") == "без_замены"
+
+
+def test_missing_file_gives_builtin_entries(tmp_path):
+    lexicon = StressLexicon({'замок': 'з+амок'}, path=str(tmp_path / "нет.txt"))
+    assert lexicon.apply("замок") == "з+амок"
+
+
+def test_reloads_changed_file(tmp_path):
+    path = tmp_path / "lexicon.txt"
+    path.write_text("замок з+амок\n", encoding='utf-8')
+    lexicon = StressLexicon(path=str(path), reload_interval=0)
+    assert lexicon.apply("замок") == "з+амок"
+
+    path.write_text("замок зам+ок\n", encoding='utf-8')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert lexicon.apply("замок") == "зам+ок"
@@ -0,0 +1,56 @@
+"""Бюджет частей текста в токенах XTTS и разбиение текста по бюджету"""
+
+import types
+
+import xtts_engine
+from text_processing import split_text_by_budget
+from xtts_engine import text_token_budget
+
+
+def make_model(char_limits, max_text_tokens=402):
+    """Заготовка модели: только то, что нужно для расчета бюджета"""
+    return types.SimpleNamespace(
+        args=types.SimpleNamespace(gpt_max_text_tokens=max_text_tokens),
+        tokenizer=types.SimpleNamespace(char_limits=char_limits),
+    )
+
+
+def test_budget_follows_language_char_limit(monkeypatch):
+    monkeypatch.setattr(xtts_engine, 'XTTS_TOKEN_BUDGET', None)
+    model = make_model({'ru': 182, 'en': 250})
+    assert text_token_budget(model, "ru") == 79
+    assert text_token_budget(model, "en") > text_token_budget(model, "ru")
+    assert text_token_budget(model, "ru-RU") == text_token_budget(model, "ru")
+    assert text_token_budget(model, "xx") == int(xtts_engine.DEFAULT_CHAR_LIMIT / xtts_engine.XTTS_CHARS_PER_TOKEN)
+
+
+def test_budget_override_is_capped_by_model(monkeypatch):
+    monkeypatch.setattr(xtts_engine, 'XTTS_TOKEN_BUDGET', 120)
+    assert text_token_budget(make_model({'ru': 182}), "ru") == 120
+    assert text_token_budget(make_model({'ru': 182}, max_text_tokens=100), "ru") == 99
+
+
+def test_split_keeps_words_and_fits_budget():
+    text = "Первое предложение. Второе, довольно длинное предложение с запятой. Третье."
+    chunks = split_text_by_budget(text, 40)
+    assert ' '.join(chunks).split() == text.split()
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert len(chunks) == 2
+
+
+def test_split_prefers_sentence_end():
+    assert split_text_by_budget("Раз два. Три четыре пять", 15) == ["Раз два.", "Три четыре пять"]
+    assert split_text_by_budget("Раз, два три. Четыре", 14) == ["Раз, два три.", "Четыре"]
+
+
+def test_split_paragraphs_and_long_words():
+    assert split_text_by_budget("a b\n\nc d", 10) == ["a b", "c d"]
+    assert split_text_by_budget("Слово Сверхдлинноеслово конец", 10) == ["Слово", "Сверхдлинноеслово", "конец"]
+    assert split_text_by_budget("   \n", 10) == []
+
+
+def test_split_uses_measure():
+    # Бюджет в "токенах": каждое слово - один токен, пробел между словами тоже
+    words = "один два три четыре пять шесть"
+    chunks = split_text_by_budget(words, 5, measure=lambda text: 2 * len(text.split()) - 1)
+    assert chunks == ["один два три", "четыре пять шесть"]
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Подготовка текста для XTTS v2: обработка ударений и разбиение на части
+Используется десктопной и веб-версией, а также пулом процессов
+"""
+
+import os
+import re
+
+from stress_dictionary import DEFAULT_DICTIONARY_PATH, StressDictionary
+from stress_lexicon import DEFAULT_LEXICON_PATH, StressLexicon
+
+
+def split_text_by_limit(text, limit=180):
+    """Разбить текст на части по лимиту символов"""
+    words = text.split()
+    parts = []
+    current_part = ""
+
+    for word in words:
+        if len(current_part + " " + word) <= limit:
+            current_part += (" " + word) if current_part else word
+        else:
+            if current_part:
+                parts.append(current_part)
+            current_part = word
+
+    if current_part:
+        parts.append(current_part)
+
+    return parts if parts else [text[:limit]]
+
+
+# Отладочный вывод обработки ударений (по слову на строку - медленно на длинных текстах)
+STRESS_DEBUG = os.environ.get('STRESS_DEBUG') == '1'
+
+VOWELS = 'аеёиоуыэюя'
+# Символы, после которых + игнорируется (как и раньше, сравнение идет по символам строки)
+STRESSED_CHARS = 'áóéíúы́э́ю́я́ё́'
+
+# Гласные с ударением (а, о, е, и, у - один символ, остальные - буква + знак ударения)
+STRESSED_VOWELS = {
+    'а': 'á',
+    'о': 'ó',
+    'е': 'é',
+    'и': 'í',
+    'у': 'ú',
+    'ы': 'ы́',
+    'э': 'э́',
+    'ю': 'ю́',
+    'я': 'я́',
+    'ё': 'ё́',
+}
+
+# Ослабленные гласные для синтаксиса с -
+WEAK_VOWELS = {
+    'а': 'ə',  # schwa - нейтральная гласная
+    'о': 'ə',  # schwa
+    'е': 'ɪ',  # короткая i
+    'и': 'ɪ',  # короткая i
+    'у': 'ʊ',  # короткая u
+    'ы': 'ə',  # schwa
+    'э': 'ɛ',  # короткая e
+    'ю': 'ʊ',  # короткая u
+    'я': 'ə',  # schwa
+    'ё': 'ɪ',  # короткая i
+}
+
+# Встроенные записи словаря ударений (замена без учета регистра);
+# дополнительные записи загружаются из файла словаря (см. stress_lexicon.py)
+STRESS_DICT = {
+    "компьютер": "компьютер",
+    "интернет": "интернет",
+    "телефон": "телефон",
+    "одновременно": "одновременно",
+    "замок": "замок",  # крепость (з+амок) / дверной механизм (зам+ок)
+    "мука": "мука",    # страдание (м+ука) / продукт (мук+а)
+    "Федотов": "Федотов",  # Фед+отов
+    "века": "века",    # в+ека
+}
+
+# Шаблоны компилируются один раз при импорте
+_PLUS_WORD_RE = re.compile(r'\b[а-яёА-ЯЁ]*\+[а-яёА-ЯЁ]*\b')
+_MINUS_WORD_RE = re.compile(r'\b[а-яёА-ЯЁ]*-[а-яёА-ЯЁ]*\b')
+_EMPHASIS_RE = re.compile(r'<emphasis>(.*?)</emphasis>')
+_BREAK_RE = re.compile(r'<break time="(\d+)ms"/>')
+_DOUBLE_STAR_RE = re.compile(r'\*\*(.*?)\*\*')
+_UNDERSCORE_RE = re.compile(r'__(.*?)__')
+_MANY_DOTS_RE = re.compile(r'\.{3,}')
+# Непрерывные последовательности букв, знаков ударения, + и - (слова вместе с разметкой)
+_WORD_RUN_RE = re.compile(r'([\w\u0301+\-]+)')
+_CYRILLIC_WORD_RE = re.compile(r'[а-яёА-ЯЁ]+')
+
+
+def _nearest_vowel(word, pos):
+    """Ближайшая к позиции гласная: сначала влево (включая позицию), потом вправо; -1 если нет"""
+    for i in range(pos, -1, -1):
+        if word[i].lower() in VOWELS:
+            return i
+    for i in range(pos + 1, len(word)):
+        if word[i].lower() in VOWELS:
+            return i
+    return -1
+
+
+def _plus_stress_word(match):
+    """Слово с + : ударная гласная заменяется буквой со знаком ударения"""
+    word = match.group(0)
+    try:
+        # Обрабатываем каждый + в слове отдельно
+        while '+' in word:
+            if len(word) <= 1:
+                break
+            plus_pos = word.find('+')
+
+            # Ударная буква: после + (в начале и в середине слова) или перед + (в конце)
+            if 0 < plus_pos < len(word) - 1:
+                pos = plus_pos + 1
+            elif plus_pos > 0:
+                pos = plus_pos - 1
+            else:
+                pos = 1
+
+            # Если это не гласная - берем ближайшую гласную
+            if word[pos].lower() not in VOWELS:
+                pos = _nearest_vowel(word, pos)
+                if pos < 0:
+                    word = word.replace('+', '', 1)
+                    continue
+            letter = word[pos]
+
+            # Гласная уже ударена - просто убираем +
+            if letter in STRESSED_CHARS:
+                word = word.replace('+', '', 1)
+                continue
+
+            stressed = STRESSED_VOWELS.get(letter.lower(), letter)
+            if letter.isupper():
+                stressed = stressed.upper()
+            word = (word[:pos] + stressed + word[pos + 1:]).replace('+', '', 1)
+            if STRESS_DEBUG:
+                print(f"Обработка ударения: ударение на букву '{letter}' -> '{stressed}'")
+
+        return word
+    except Exception as e:
+        print(f"Ошибка при обработке ударений в слове '{word}': {e}")
+        return word.replace('+', '')
+
+
+def _weak_stress_word(match):
+    """Слово с - : гласная заменяется ослабленной"""
+    word = match.group(0)
+    try:
+        minus_pos = word.find('-')
+        clean_word = word.replace('-', '')
+        if not clean_word:
+            return word
+
+        # Ослабляемая буква: после - (в начале и в середине слова) или перед - (в конце)
+        if 0 < minus_pos < len(clean_word):
+            pos = minus_pos
+        elif minus_pos > 0:
+            pos = minus_pos - 1
+        else:
+            pos = 0
+
+        # Если это не гласная - берем ближайшую гласную
+        if clean_word[pos].lower() not in VOWELS:
+            pos = _nearest_vowel(clean_word, pos)
+            if pos < 0:
+                if STRESS_DEBUG:
+                    print(f"Не найдена гласная в слове '{word}'")
+                return clean_word
+        letter = clean_word[pos]
+
+        weak = WEAK_VOWELS.get(letter.lower(), letter)
+        if letter.isupper():
+            weak = weak.upper()
+        weak_word = clean_word[:pos] + weak + clean_word[pos + 1:]
+        if STRESS_DEBUG:
+            print(f"Ослабление ударения: '{word}' -> '{weak_word}' (ослаблена буква '{letter}' -> '{weak}')")
+        return weak_word
+    except Exception as e:
+        print(f"Ошибка при обработке ослабления ударений в слове '{word}': {e}")
+        return word.replace('-', '')
+
+
+def apply_stress_marks(text):
+    """Расставить ударения по синтаксису + (для замен из словаря)"""
+    if '+' in text:
+        text = _PLUS_WORD_RE.sub(_plus_stress_word, text)
+    if '-' in text:
+        text = _MINUS_WORD_RE.sub(_weak_stress_word, text)
+    return text
+
+
+_default_lexicon = None
+
+
+def get_default_lexicon():
+    """Словарь ударений по умолчанию: встроенные записи + файл STRESS_LEXICON_PATH"""
+    global _default_lexicon
+    if _default_lexicon is None:
+        _default_lexicon = StressLexicon(STRESS_DICT, path=DEFAULT_LEXICON_PATH, prepare=apply_stress_marks)
+    return _default_lexicon
+
+
+_default_dictionary = None
+_default_dictionary_checked = False
+
+
+def get_default_dictionary():
+    """Словарь автоматических ударений (файл STRESS_DICTIONARY_PATH) или None, если его нет"""
+    global _default_dictionary, _default_dictionary_checked
+    if not _default_dictionary_checked:
+        _default_dictionary_checked = True
+        if os.path.exists(DEFAULT_DICTIONARY_PATH):
+            try:
+                _default_dictionary = StressDictionary(DEFAULT_DICTIONARY_PATH)
+                print(f"📖 Словарь автоматических ударений: {len(_default_dictionary)} форм")
+            except Exception as e:
+                print(f"⚠️ Не удалось открыть словарь ударений {DEFAULT_DICTIONARY_PATH}: {e}")
+    return _default_dictionary
+
+
+_auto_stress_cache = {}
+_AUTO_STRESS_CACHE_SIZE = 65536
+
+
+def _auto_stress_word(word, dictionary):
+    """Слово с ударением по словарю (без ручной разметки) или слово без изменений"""
+    # Только слова целиком из кириллицы: слова с +, -, знаками ударения не трогаем
+    if not _CYRILLIC_WORD_RE.fullmatch(word):
+        return word
+    index = dictionary.stress_index(word)
+    if index is None or index >= len(word):
+        return word
+    letter = word[index]
+    stressed = STRESSED_VOWELS.get(letter.lower())
+    if stressed is None:
+        return word
+    if letter.isupper():
+        stressed = stressed.upper()
+    return word[:index] + stressed + word[index + 1:]
+
+
+def apply_auto_stress(text, dictionary):
+    """Расставить ударения по словарю в словах без ручной разметки"""
+    cache = _auto_stress_cache
+    if cache.get(None) is not dictionary:
+        cache.clear()
+        cache[None] = dictionary
+
+    # Нечетные элементы - слова; частые слова книги берутся из кэша, а не из файла словаря
+    parts = _WORD_RUN_RE.split(text)
+    words = parts[1::2]
+    results = list(map(cache.get, words))
+    for i, result in enumerate(results):
+        if result is None:
+            word = words[i]
+            result = _auto_stress_word(word, dictionary)
+            if len(cache) > _AUTO_STRESS_CACHE_SIZE:
+                cache.clear()
+                cache[None] = dictionary
+            cache[word] = results[i] = result
+    parts[1::2] = results
+    return ''.join(parts)
+
+
+def process_text_with_stress(text, lexicon=None, auto_stress=True):
+    """Обработка текста с учетом ударений и специальных символов
+
+    Синтаксис: + ударение, - ослабление, *слово* / **слово** / __слово__
+    эмфаза, ... пауза, <emphasis> и <break time="Nms"/>. Если установлен
+    словарь ударений, в словах без ручной разметки ударения расставляются
+    автоматически (auto_stress=False отключает). Каждая замена
+    выполняется только если в тексте есть ее служебный символ; порядок
+    замен важен (ослабление применяется к результату расстановки ударений,
+    SSML-теги превращаются в звездочки до обработки двойных звездочек).
+    """
+    # Ударения через символ + и ослабление через - (работают в обе стороны: +а и а+)
+    text = apply_stress_marks(text)
+
+    # Обработка SSML тегов
+    if '<emphasis>' in text:
+        text = _EMPHASIS_RE.sub(r'*\1*', text)
+    if '<break' in text:
+        text = _BREAK_RE.sub('...', text)
+
+    # Обработка эмфатических ударений
+    if '**' in text:
+        text = _DOUBLE_STAR_RE.sub(r'*\1*', text)  # Двойные звездочки
+    if '__' in text:
+        text = _UNDERSCORE_RE.sub(r'*\1*', text)   # Подчеркивание
+
+    # Обработка пауз (многоточие из 4 и более точек -> ...)
+    if '....' in text:
+        text = _MANY_DOTS_RE.sub('...', text)
+
+    # Замена слов по словарю ударений (один проход по словам текста)
+    if lexicon is None:
+        lexicon = get_default_lexicon()
+    text = lexicon.apply(text)
+
+    # Автоматические ударения - последними: слова с ручной разметкой и замены
+    # из словаря с ударениями уже содержат знаки ударения и пропускаются
+    if auto_stress:
+        dictionary = get_default_dictionary()
+        if dictionary is not None:
+            text = apply_auto_stress(text, dictionary)
+    return text
+
+
+def split_text_for_xtts(text, max_length=150):
+    """Разбивает текст на части подходящие для XTTS v2"""
+    # Разбиваем на предложения (по точкам, восклицательным, вопросительным знакам и переносам строк)
+    sentences = re.split(r'[.!?\n]+', text)
+    chunks = []
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        # Если предложение короткое, добавляем как есть
+        if len(sentence) <= max_length:
+            chunks.append(sentence)
+            continue
+
+        # Если предложение длинное, разбиваем по приоритету разделителей
+        chunks.extend(split_long_sentence(sentence, max_length))
+
+    return chunks
+
+
+def split_long_sentence(sentence, max_length):
+    """Разбивает длинное предложение по приоритету разделителей"""
+    # Приоритет разделителей: запятые и точки с запятой -> тире -> двоеточие -> пробелы
+    separators = [
+        r'[,;]',      # Запятые и точки с запятой
+        r'\s+-\s+',   # Тире с пробелами
+        r':',         # Двоеточие
+        r'\s+'        # Любые пробелы (последний случай)
+    ]
+
+    for i, separator in enumerate(separators):
+        parts = re.split(separator, sentence)
+
+        # Если разбиение дало больше одной части
+        if len(parts) > 1:
+            result_chunks = []
+            current_part = ""
+
+            for part in parts:
+                part = part.strip()
+                if not part:
+                    continue
+
+                # Если часть сама по себе слишком длинная
+                if len(part) > max_length:
+                    # Сначала добавляем накопленную часть
+                    if current_part:
+                        result_chunks.append(current_part.strip())
+                        current_part = ""
+
+                    # Если это последний разделитель (пробелы), разбиваем на слова
+                    if i == len(separators) - 1:
+                        words = part.split()
+                        temp_chunk = ""
+
+                        for word in words:
+                            if len(temp_chunk + " " + word) <= max_length:
+                                temp_chunk += (" " + word) if temp_chunk else word
+                            else:
+                                if temp_chunk:
+                                    result_chunks.append(temp_chunk.strip())
+                                temp_chunk = word
+
+                        if temp_chunk:
+                            current_part = temp_chunk
+                    else:
+                        # Пробуем следующий разделитель для этой части
+                        sub_chunks = split_long_sentence(part, max_length)
+                        if len(sub_chunks) > 1:
+                            # Если подразбиение удалось, добавляем все части
+                            if current_part:
+                                result_chunks.append(current_part.strip())
+                                current_part = ""
+                            result_chunks.extend(sub_chunks)
+                        else:
+                            # Если подразбиение не удалось, добавляем как есть
+                            if current_part:
+                                result_chunks.append(current_part.strip())
+                                current_part = ""
+                            result_chunks.append(part)
+                else:
+                    # Проверяем, поместится ли часть в текущий чанк
+                    if len(current_part + " " + part) <= max_length:
+                        current_part += (" " + part) if current_part else part
+                    else:
+                        if current_part:
+                            result_chunks.append(current_part.strip())
+                        current_part = part
+
+            # Добавляем последнюю часть
+            if current_part:
+                result_chunks.append(current_part.strip())
+
+            # Если получилось разбиение, возвращаем результат
+            if len(result_chunks) > 1:
+                return result_chunks
+
+    # Если ни один разделитель не помог, возвращаем предложение как есть
+    return [sentence]
+
+
+# Оптимальное разбиение по бюджету токенов: стоимость части и штрафы за место разреза.
+# Штраф за разрез между словами больше стоимости части, поэтому лишняя часть
+# предпочтительнее разреза посреди фразы.
+CHUNK_COST = 10
+SENTENCE_PENALTY = 0
+CLAUSE_PENALTY = 2
+COMMA_PENALTY = 4
+WORD_PENALTY = 12
+_SENTENCE_ENDS = '.!?…'
+_CLOSING_CHARS = '»"\')]'
+_DASHES = ('-', '–', '—')
+
+
+def _boundary_penalty(piece, next_piece):
+    """Штраф за разрез после слова (с его знаками препинания)"""
+    last = piece.rstrip(_CLOSING_CHARS)[-1:] or piece[-1:]
+    if last in _SENTENCE_ENDS:
+        return SENTENCE_PENALTY
+    if last in ';:':
+        return CLAUSE_PENALTY
+    if last == ',' or next_piece in _DASHES:
+        return COMMA_PENALTY
+    return WORD_PENALTY
+
+
+def _split_paragraph_by_budget(pieces, costs, budget):
+    """Разрезы абзаца с минимальной стоимостью (число частей + штрафы) за линейное время
+
+    Стоимость части, заканчивающейся после слова b, зависит только от b, поэтому
+    dp[b] = CHUNK_COST + штраф[b] + min(dp[a]) по допустимым началам a; допустимые
+    начала образуют скользящее окно, минимум по нему ведется монотонной очередью.
+    """
+    from collections import deque
+
+    count = len(pieces)
+    # prefix[k] - токены первых k слов с пробелом после каждого
+    prefix = [0] * (count + 1)
+    for k, cost in enumerate(costs):
+        prefix[k + 1] = prefix[k] + cost + 1
+
+    dp = [0] * (count + 1)
+    parent = [0] * (count + 1)
+    window = deque([0])
+    start = 0
+    for end in range(1, count + 1):
+        # Начала, с которых часть до end не помещается в бюджет, больше не понадобятся
+        while start < end - 1 and prefix[end] - prefix[start] - 1 > budget:
+            start += 1
+        while window and window[0] < start:
+            window.popleft()
+        if not window:
+            # Слово длиннее бюджета - отдельная часть
+            window.append(end - 1)
+
+        best = window[0]
+        next_piece = pieces[end] if end < count else ''
+        penalty = SENTENCE_PENALTY if end == count else _boundary_penalty(pieces[end - 1], next_piece)
+        dp[end] = dp[best] + CHUNK_COST + penalty
+        parent[end] = best
+
+        while window and dp[window[-1]] >= dp[end]:
+            window.pop()
+        window.append(end)
+
+    bounds = []
+    end = count
+    while end > 0:
+        bounds.append((parent[end], end))
+        end = parent[end]
+    return [' '.join(pieces[a:b]) for a, b in reversed(bounds)]
+
+
+def split_text_by_budget(text, budget=150, measure=len):
+    """Разбить текст на минимум частей, каждая не длиннее бюджета
+
+    measure(строка) - длина части: по умолчанию в символах, для XTTS -
+    число токенов токенизатора модели (см. xtts_engine.make_token_counter).
+    Разрезы выбираются по знакам препинания (конец предложения лучше
+    запятой, запятая лучше пробела); несколько коротких предложений
+    объединяются в одну часть. Абзацы разбиваются независимо, поэтому
+    правка текста меняет части только своего абзаца.
+    """
+    chunks = []
+    for paragraph in text.split('\n'):
+        pieces = paragraph.split()
+        if not pieces:
+            continue
+        costs = [measure(piece) for piece in pieces]
+        paragraph_budget = budget
+        for _ in range(3):
+            paragraph_chunks = _split_paragraph_by_budget(pieces, costs, paragraph_budget)
+            # Длина слов по отдельности - оценка; если часть все же длиннее бюджета, уменьшаем его
+            longest = max(measure(chunk) for chunk in paragraph_chunks)
+            if longest <= budget or len(paragraph_chunks) == len(pieces):
+                break
+            paragraph_budget = max(1, paragraph_budget * budget // longest)
+        chunks.extend(paragraph_chunks)
+    return chunks
+
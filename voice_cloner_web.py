@@ -7,90 +7,279 @@
 import gradio as gr
 import tempfile
 import os
+import threading
+import time
 import numpy as np
 import soundfile as sf
-import torch
 from pathlib import Path
 
-# Импорт TTS
-try:
-    from TTS.api import TTS
-    print("✅ TTS импортирован успешно")
-except ImportError as e:
-    print(f"❌ Ошибка импорта TTS: {e}")
-    print("💡 Установите: pip install TTS")
+from xtts_engine import (
+    PrefixKVCache,
+    SpeakerLatentCache,
+    get_inference_profile,
+    get_output_sample_rate,
+    latents_hash,
+    load_xtts_model,
+    make_token_counter,
+    text_token_budget,
+    warm_up_model,
+)
+from voice_profiles import VoiceProfileStore, VoiceRegistry
+from runtime_profile import apply_runtime_profile
+from request_scheduler import SynthesisScheduler
+from chunk_cache import ChunkAudioCache, DEFAULT_SEED
+from text_processing import split_text_by_budget
 
 class VoiceClonerWeb:
     def __init__(self):
         self.xtts_model = None
+        self.model_state = "loading"  # Готовность модели: loading / warming / ready / error
+        self.warmup_report = None  # Время синтеза до и после прогрева
+        self.speaker_cache = SpeakerLatentCache()
+        self.prefix_cache = PrefixKVCache()  # Ключи/значения GPT для голосов (общие для всех запросов)
+        self.scheduler = None  # Очередь запросов синтеза (создается после загрузки модели)
+        self.ttfb_count = 0  # Потоковые озвучки: число и суммарное время до первого звука
+        self.ttfb_total = 0.0
+        self.profile_store = VoiceProfileStore()
+        self.voice_registry = VoiceRegistry()  # Загруженные голоса по ID (образец передается один раз)
+        self.chunk_cache = ChunkAudioCache()
+        self.token_counters = {}  # Подсчет токенов XTTS по языкам
         self.init_model()
     
     def init_model(self):
-        """Инициализация модели XTTS v2"""
+        """Инициализация модели XTTS v2 в фоне (интерфейс запускается сразу)"""
+        thread = threading.Thread(target=self._load_model_thread, daemon=True)
+        thread.start()
+    
+    def _load_model_thread(self):
+        """Загрузка и прогрев модели; запросы принимаются после прогрева"""
         try:
             print("🔄 Загрузка XTTS v2...")
             
-            # Исправление для PyTorch 2.6
-            try:
-                from torch.serialization import add_safe_globals
-                from TTS.tts.configs.xtts_config import XttsConfig
-                from TTS.tts.models.xtts import XttsAudioConfig
-                from TTS.tts.models.xtts import XttsArgs
-                from TTS.config.shared_configs import BaseDatasetConfig
-                from TTS.tts.configs.shared_configs import CharactersConfig
-                from TTS.vocoder.configs.hifigan_config import HifiganConfig
-                
-                safe_classes = [
-                    XttsConfig, XttsAudioConfig, XttsArgs, 
-                    BaseDatasetConfig, CharactersConfig, HifiganConfig
-                ]
-                add_safe_globals(safe_classes)
-                print("✅ PyTorch safe globals добавлены")
-            except Exception as e:
-                print(f"⚠️ Предупреждение safe globals: {e}")
+            # Потоки torch из калибровки CPU задаются до первых вычислений
+            apply_runtime_profile()
             
-            # Загрузка модели
-            self.xtts_model = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
+            # Загрузка модели (с исправлением для PyTorch 2.6)
+            self.xtts_model = load_xtts_model()
             print("✅ XTTS v2 загружена успешно!")
             
         except Exception as e:
             print(f"❌ Ошибка загрузки модели: {e}")
             self.xtts_model = None
+            self.model_state = "error"
+            return
+        
+        self.model_state = "warming"
+        try:
+            self.warmup_report = warm_up_model(self.xtts_model)
+        except Exception as e:
+            print(f"⚠️ Прогрев XTTS v2 не выполнен: {e}")
+        
+        # Все вызовы модели для озвучки идут через один поток планировщика
+        self.scheduler = SynthesisScheduler(self.xtts_model, seed=DEFAULT_SEED, prefix_cache=self.prefix_cache)
+        print(f"✅ Очередь запросов: до {self.scheduler.max_active} одновременно, "
+              f"пакеты до {self.scheduler.batch_size} частей")
+        self.model_state = "ready"
     
-    def clone_voice(self, text, voice_file, language="ru", temperature=0.7, speed=1.0):
-        """Клонирование голоса"""
+    def not_ready_message(self):
+        """Сообщение, если модель еще не готова принимать запросы, иначе None"""
+        if self.model_state == "loading":
+            return "⏳ Модель XTTS v2 загружается, попробуйте через минуту"
+        if self.model_state == "warming":
+            return "🔥 Модель XTTS v2 прогревается, попробуйте через несколько секунд"
         if not self.xtts_model:
-            return None, "❌ Модель XTTS v2 не загружена!"
-        
+            return "❌ Модель XTTS v2 не загружена!"
+        return None
+    
+    def register_voice(self, voice_file):
+        """Сохранить загруженный образец в реестре, возвращает (ID голоса, статус)
+
+        Латенты вычисляются сразу, если модель готова, иначе при первой озвучке.
+        """
         if not voice_file:
-            return None, "❌ Загрузите файл с голосом!"
+            return "", "❌ Загрузите файл с голосом!"
+        
+        try:
+            # Латенты вычисляются в потоке планировщика: модель используется одним потоком
+            if self.model_state == "ready" and self.scheduler is not None:
+                voice_id = self.voice_registry.register(voice_file, model=self.xtts_model,
+                                                        model_call=self.scheduler.call)
+            else:
+                voice_id = self.voice_registry.register(voice_file)
+            return voice_id, f"✅ Голос сохранен, ID: {voice_id}"
+        except Exception as e:
+            return "", f"❌ Ошибка сохранения голоса: {str(e)}"
+    
+    def _iter_synthesis(self, text, voice_id, language, temperature, speed, profile_name, stream=False):
+        """Озвучка через очередь запросов: выдает события ('status', текст), ('audio', часть)
+        по порядку частей и в конце ('done', путь к файлу, текст)"""
+        message = self.not_ready_message()
+        if message:
+            yield 'done', None, message
+            return
+        
+        if not voice_id and not profile_name:
+            yield 'done', None, "❌ Загрузите файл с голосом, укажите ID голоса или выберите профиль!"
+            return
         
         if not text.strip():
-            return None, "❌ Введите текст для озвучки!"
+            yield 'done', None, "❌ Введите текст для озвучки!"
+            return
         
+        request = None
         try:
             print(f"🎯 Генерация голоса для текста: {text[:50]}...")
             
+            # Латенты голоса: из профиля или из реестра (образец обработан при загрузке)
+            if profile_name:
+                latents = self.profile_store.load(profile_name)
+            else:
+                latents = self.voice_registry.load(self.xtts_model, voice_id, model_call=self.scheduler.call)
+            
+            # Готовые части берутся из кэша, остальные ставятся в очередь одним запросом
+            sample_rate = get_output_sample_rate(self.xtts_model)
+            voice_hash = latents_hash(latents)
+            counter = self.token_counters.get(language)
+            if counter is None:
+                counter = self.token_counters[language] = make_token_counter(self.xtts_model, language)
+            chunks = split_text_by_budget(text, text_token_budget(self.xtts_model, language), counter)
+            if not chunks:
+                yield 'done', None, "❌ Нет текста для озвучки!"
+                return
+            # Планировщик синтезирует пакетами через SeededSampler
+            profile = get_inference_profile(self.xtts_model)
+            keys = [self.chunk_cache.make_key(chunk, voice_hash, DEFAULT_SEED, profile=profile,
+                                              language=language, speed=speed, temperature=temperature)
+                    for chunk in chunks]
+            wavs = [self.chunk_cache.get(key) for key in keys]
+            missing = [i for i, wav in enumerate(wavs) if wav is None]
+            
+            request = self.scheduler.submit([chunks[i] for i in missing], latents, language=language,
+                                            speed=speed, stream=stream, temperature=temperature)
+            emitted = 0
+            
+            def collect():
+                # Готовые части запроса по местам; выдаются подряд с первой невыданной
+                nonlocal emitted
+                for j, i in enumerate(missing):
+                    if wavs[i] is None and request.results[j] is not None:
+                        wavs[i] = request.results[j]
+                        self.chunk_cache.put(keys[i], wavs[i], sample_rate)
+                ready = []
+                while emitted < len(wavs) and wavs[emitted] is not None:
+                    ready.append(wavs[emitted])
+                    emitted += 1
+                return ready
+            
+            for position, completed in self.scheduler.wait(request):
+                for wav in collect():
+                    yield 'audio', wav
+                if position:
+                    yield 'status', f"⏳ В очереди: позиция {position}, ожидание {request.wait_time:.0f} сек"
+                else:
+                    yield 'status', f"🎯 Генерация: готово {completed} из {len(missing)} частей"
+            for wav in collect():
+                yield 'audio', wav
+            
             # Создаем временный файл для результата
             with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
                 output_path = tmp_file.name
+            sf.write(output_path, np.concatenate(wavs), sample_rate)
             
-            # Генерация с клонированием голоса
-            self.xtts_model.tts_to_file(
-                text=text,
-                speaker_wav=voice_file,
-                language=language,
-                file_path=output_path,
-                speed=speed
-            )
-            
+            stats = self.chunk_cache.stats()
             print(f"✅ Голос сгенерирован: {output_path}")
-            return output_path, f"✅ Голос успешно сгенерирован! Длина текста: {len(text)} символов"
+            yield 'done', output_path, (f"✅ Голос успешно сгенерирован! Длина текста: {len(text)} символов "
+                                        f"(ожидание в очереди: {request.wait_time:.1f} сек, "
+                                        f"кэш частей: {stats['hits']} попаданий, {stats['misses']} промахов)")
             
         except Exception as e:
             error_msg = f"❌ Ошибка генерации: {str(e)}"
             print(error_msg)
-            return None, error_msg
+            yield 'done', None, error_msg
+        finally:
+            # Пользователь ушел со страницы - запрос больше не нужен
+            if request is not None and not request.done.is_set():
+                self.scheduler.cancel(request)
+    
+    def clone_voice(self, text, voice_id, language="ru", temperature=0.7, speed=1.0, profile_name=""):
+        """Клонирование голоса по ID через очередь запросов (выдает промежуточный статус)"""
+        for event in self._iter_synthesis(text, voice_id, language, temperature, speed, profile_name):
+            if event[0] == 'status':
+                yield None, event[1]
+            elif event[0] == 'done':
+                yield event[1], event[2]
+    
+    def clone_voice_stream(self, text, voice_id, language="ru", temperature=0.7, speed=1.0, profile_name=""):
+        """Клонирование голоса с воспроизведением частей по мере генерации
+
+        Выдает (часть аудио для потокового плеера, итоговый файл, статус).
+        Время до первого звука считается от нажатия кнопки до выдачи первой части.
+        """
+        start = time.perf_counter()
+        first_audio = None
+        sample_rate = get_output_sample_rate(self.xtts_model) if self.xtts_model else 24000
+        for event in self._iter_synthesis(text, voice_id, language, temperature, speed, profile_name,
+                                          stream=True):
+            if event[0] == 'audio':
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                    self.ttfb_count += 1
+                    self.ttfb_total += first_audio
+                    print(f"⏱️ Первый звук через {first_audio:.2f} сек "
+                          f"(в среднем {self.ttfb_total / self.ttfb_count:.2f} сек)")
+                yield (sample_rate, event[1]), None, f"🔊 Воспроизведение... (первый звук через {first_audio:.1f} сек)"
+            elif event[0] == 'status':
+                yield None, None, event[1]
+            else:
+                message = event[2]
+                if first_audio is not None:
+                    message += f" Первый звук через {first_audio:.1f} сек."
+                yield None, event[1], message
+    
+    def profile_choices(self):
+        """Варианты для списка профилей ("" - использовать загруженный файл)"""
+        return [""] + self.profile_store.list_profiles()
+    
+    def enroll_profile(self, voice_file, name):
+        """Сохранить загруженный файл с голосом как профиль"""
+        message = self.not_ready_message()
+        if message:
+            return gr.update(), message
+        
+        if not voice_file:
+            return gr.update(), "❌ Загрузите файл с голосом!"
+        
+        try:
+            # Профиль вычисляется в потоке планировщика, не параллельно с синтезом
+            name = self.scheduler.call(self.profile_store.enroll, self.xtts_model, voice_file,
+                                       name or Path(voice_file).stem, speaker_cache=self.speaker_cache)
+            return gr.update(choices=self.profile_choices(), value=name), f"✅ Профиль '{name}' сохранен"
+        except Exception as e:
+            return gr.update(), f"❌ Ошибка сохранения профиля: {str(e)}"
+    
+    def export_profile(self, profile_name):
+        """Экспорт профиля для скачивания"""
+        if not profile_name:
+            return None, "❌ Выберите профиль!"
+        
+        try:
+            export_dir = tempfile.mkdtemp()
+            path = self.profile_store.export_profile(profile_name, os.path.join(export_dir, profile_name))
+            return path, f"✅ Профиль '{profile_name}' готов к скачиванию"
+        except Exception as e:
+            return None, f"❌ Ошибка экспорта профиля: {str(e)}"
+    
+    def import_profile(self, profile_file):
+        """Импорт профиля из загруженного файла"""
+        if not profile_file:
+            return gr.update(), "❌ Загрузите файл профиля!"
+        
+        try:
+            path = profile_file if isinstance(profile_file, str) else profile_file.name
+            name = self.profile_store.import_profile(path)
+            return gr.update(choices=self.profile_choices(), value=name), f"✅ Профиль '{name}' импортирован"
+        except Exception as e:
+            return gr.update(), f"❌ Ошибка импорта профиля: {str(e)}"
     
     def get_voice_info(self, voice_file):
         """Получить информацию о голосовом файле"""
@@ -151,6 +340,12 @@ def create_interface():
                     sources=["upload"]
                 )
                 
+                voice_id = gr.Textbox(
+                    label="ID голоса",
+                    placeholder="Появится после загрузки файла",
+                    info="Сохраненный голос: файл не нужно загружать повторно"
+                )
+                
                 voice_info = gr.Textbox(
                     label="Информация о файле",
                     value="Загрузите файл для анализа",
@@ -158,6 +353,31 @@ def create_interface():
                     max_lines=8
                 )
                 
+                gr.Markdown("### 🗂 Профили голоса")
+                
+                profile_name = gr.Dropdown(
+                    choices=cloner.profile_choices(),
+                    value="",
+                    label="Профиль голоса",
+                    info="Сохраненный профиль используется вместо файла"
+                )
+                
+                new_profile_name = gr.Textbox(
+                    label="Имя нового профиля",
+                    placeholder="Например: мой_голос"
+                )
+                
+                with gr.Row():
+                    enroll_btn = gr.Button("💾 Сохранить профиль")
+                    export_btn = gr.Button("📤 Экспорт")
+                
+                profile_file = gr.File(
+                    label="Файл профиля (экспорт / импорт)",
+                    file_types=[".voice"]
+                )
+                
+                import_btn = gr.Button("📥 Импорт профиля")
+                
                 gr.Markdown("### ⚙️ Настройки")
                 
                 language = gr.Dropdown(
@@ -196,11 +416,16 @@ def create_interface():
                     placeholder="Введите текст на русском языке..."
                 )
                 
-                generate_btn = gr.Button(
-                    "🎯 Генерировать голос",
-                    variant="primary",
-                    size="lg"
-                )
+                with gr.Row():
+                    generate_btn = gr.Button(
+                        "🎯 Генерировать голос",
+                        variant="primary",
+                        size="lg"
+                    )
+                    stream_btn = gr.Button(
+                        "🔊 Слушать по мере генерации",
+                        size="lg"
+                    )
                 
                 status = gr.Textbox(
                     label="Статус",
@@ -208,6 +433,13 @@ def create_interface():
                     interactive=False
                 )
                 
+                stream_audio = gr.Audio(
+                    label="Потоковое воспроизведение",
+                    streaming=True,
+                    autoplay=True,
+                    interactive=False
+                )
+                
                 result_audio = gr.Audio(
                     label="Результат",
                     type="filepath"
@@ -220,10 +452,47 @@ def create_interface():
             outputs=[voice_info]
         )
         
+        # Образец передается и обрабатывается один раз, озвучка идет по ID голоса
+        voice_file.upload(
+            fn=cloner.register_voice,
+            inputs=[voice_file],
+            outputs=[voice_id, status],
+            api_name="register_voice"
+        )
+        
+        # Без лимита Gradio: одновременность и пакеты задает очередь запросов клонировщика
         generate_btn.click(
             fn=cloner.clone_voice,
-            inputs=[text_input, voice_file, language, temperature, speed],
-            outputs=[result_audio, status]
+            inputs=[text_input, voice_id, language, temperature, speed, profile_name],
+            outputs=[result_audio, status],
+            concurrency_limit=None,
+            api_name="synthesize"
+        )
+        
+        stream_btn.click(
+            fn=cloner.clone_voice_stream,
+            inputs=[text_input, voice_id, language, temperature, speed, profile_name],
+            outputs=[stream_audio, result_audio, status],
+            concurrency_limit=None,
+            api_name="synthesize_stream"
+        )
+        
+        enroll_btn.click(
+            fn=cloner.enroll_profile,
+            inputs=[voice_file, new_profile_name],
+            outputs=[profile_name, status]
+        )
+        
+        export_btn.click(
+            fn=cloner.export_profile,
+            inputs=[profile_name],
+            outputs=[profile_file, status]
+        )
+        
+        import_btn.click(
+            fn=cloner.import_profile,
+            inputs=[profile_file],
+            outputs=[profile_name, status]
         )
         
         gr.Markdown("""
@@ -262,6 +531,7 @@ def main():
         print("🔒 Доступ только с этого компьютера")
     
     interface = create_interface()
+    interface.queue()
     
     # Запуск веб-сервера
     interface.launch(
@@ -1,22 +1,21 @@
+import time
+
+_PROCESS_START = time.perf_counter()  # Для отчета о времени запуска
+
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import os
+import random
 import threading
 import tempfile
 from pathlib import Path
-import numpy as np
-import soundfile as sf
-import librosa
-import torch
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import pyaudio
 import wave
-import time
-import pyttsx3
 import platform
 import sys
 
+# Тяжелые модули (torch, TTS, librosa, matplotlib, pyttsx3) импортируются лениво:
+# окно появляется сразу, модель загружается в фоновом потоке
+
 # Проверяем, запущены ли мы в среде без дисплея (Google Colab, сервер и т.д.)
 def setup_display():
     """Настройка дисплея для работы в различных средах"""
@@ -73,56 +72,47 @@ if not display_ready and not os.environ.get('DISPLAY'):
     os.environ['DISPLAY'] = ':99'
     print("🔧 Установлена переменная DISPLAY=:99")
 
-# Исправление для PyTorch 2.6 - добавляем все необходимые классы
-try:
-    from torch.serialization import add_safe_globals
-    
-    # Основные классы для XTTS v2
-    safe_classes = []
-    
-    try:
-        from TTS.tts.configs.xtts_config import XttsConfig
-        safe_classes.append(XttsConfig)
-    except: pass
-    
-    try:
-        from TTS.tts.models.xtts import XttsAudioConfig
-        safe_classes.append(XttsAudioConfig)
-    except: pass
-    
-    try:
-        from TTS.tts.models.xtts import XttsArgs
-        safe_classes.append(XttsArgs)
-    except: pass
-    
-    try:
-        from TTS.config.shared_configs import BaseDatasetConfig
-        safe_classes.append(BaseDatasetConfig)
-    except: pass
-    
-    try:
-        from TTS.tts.configs.shared_configs import CharactersConfig
-        safe_classes.append(CharactersConfig)
-    except: pass
-    
-    try:
-        from TTS.vocoder.configs.hifigan_config import HifiganConfig
-        safe_classes.append(HifiganConfig)
-    except: pass
-    
-    if safe_classes:
-        add_safe_globals(safe_classes)
-        print(f"✅ PyTorch 2.6 safe globals добавлены: {len(safe_classes)} классов")
-    else:
-        print("⚠️ Не удалось найти классы для safe globals")
-        
-except Exception as e:
-    print(f"⚠️ Ошибка добавления safe globals: {e}")
-    pass
 
-from TTS.api import TTS
+from xtts_engine import (
+    PrefixKVCache,
+    SpeakerLatentCache,
+    SynthesisStream,
+    get_inference_profile,
+    get_output_sample_rate,
+    iter_synthesize_batch,
+    latents_hash,
+    load_xtts_model,
+    make_token_counter,
+    model_languages,
+    text_token_budget,
+    warm_up_model,
+)
+from voice_profiles import VoiceProfileStore, PROFILE_SUFFIX
+from streaming_player import StreamingPlayer
+from render_pipeline import RenderPipeline
+from audio_sink import StreamingAudioWriter
+from worker_pool import XTTSWorkerPool
+from render_jobs import RenderJob
+from chunk_cache import SAMPLER_SEEDED, SAMPLER_STREAM, ChunkAudioCache, DEFAULT_SEED
+from text_processing import (
+    process_text_with_stress,
+    split_long_sentence,
+    split_text_by_limit,
+    split_text_by_budget,
+    split_text_for_xtts,
+)
+from runtime_profile import apply_runtime_profile, load_runtime_profile
 
 class VoiceClonerXTTSApp:
+    # Параметры генерации XTTS v2 для всех режимов рендера
+    RENDER_PARAMS = {
+        'temperature': 0.7,
+        'length_penalty': 1.0,
+        'repetition_penalty': 2.0,
+        'top_k': 50,
+        'top_p': 0.85,
+    }
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Клонирование Голоса - XTTS v2 + Windows TTS")
@@ -134,6 +124,19 @@ class VoiceClonerXTTSApp:
         self.standard_output_path = tk.StringVar()
         self.xtts_model = None  # XTTS v2 для клонирования
         self.windows_tts = None  # Системный TTS Windows
+        self.speaker_cache = SpeakerLatentCache()  # Кэш латентов голоса
+        self.prefix_cache = PrefixKVCache()  # Ключи/значения GPT для латентов голоса
+        self.profile_store = VoiceProfileStore()  # Сохраненные профили голоса
+        self.voice_profile_var = tk.StringVar()  # Выбранный профиль ("" - использовать файл)
+        self.worker_pool = None  # Пул процессов для CPU (создается по требованию)
+        self.chunk_cache = None  # Кэш синтезированных частей на диске (открывается при загрузке)
+        self.last_job = None  # Задание последней озвучки (для повторной озвучки после правок)
+        self.token_counter = None  # Подсчет токенов XTTS для разбиения текста
+        self.models_state = "loading"  # Готовность моделей: loading / warming / ready / error
+        self.warmup_report = None  # Время синтеза до и после прогрева
+        self.runtime_profile = load_runtime_profile()  # Профиль CPU из калибровки (check_gpu.py --calibrate)
+        self.startup_phases = []  # Время этапов запуска (этап, сек)
+        self.window_shown_at = None  # Через сколько секунд после старта показано окно
         self.is_processing = False
         self.is_recording = False
         self.recording_thread = None
@@ -154,6 +157,12 @@ class VoiceClonerXTTSApp:
         self.CHUNK = 2048  # Увеличили размер чанка для лучшего качества
         
         # Определяем формат аудио с проверкой доступности
+        phase_start = time.perf_counter()
+        try:
+            import pyaudio
+        except ImportError as e:
+            print(f"⚠️ PyAudio не установлен: {e}")
+            pyaudio = None
         try:
             if hasattr(pyaudio, 'paInt16'):
                 self.FORMAT = pyaudio.paInt16
@@ -174,6 +183,8 @@ class VoiceClonerXTTSApp:
         
         # Инициализация PyAudio с обработкой ошибок
         try:
+            if pyaudio is None:
+                raise ImportError("pyaudio не установлен")
             self.audio = pyaudio.PyAudio()
             print("✅ PyAudio инициализирован успешно")
         except Exception as e:
@@ -181,12 +192,21 @@ class VoiceClonerXTTSApp:
             print("💡 Для записи голоса установите pyaudio: pip install pyaudio")
             print("💡 Или переустановите: pip uninstall pyaudio && pip install pyaudio")
             self.audio = None
+        self.startup_phases.append(("PyAudio", time.perf_counter() - phase_start))
         
         # Создание интерфейса
+        phase_start = time.perf_counter()
         self.create_widgets()
+        self.startup_phases.append(("Интерфейс", time.perf_counter() - phase_start))
         
-        # Инициализация моделей
+        # Инициализация моделей (в фоне, окно не блокируется)
+        self.root.after_idle(self._mark_window_shown)
         self.init_models()
+    
+    def _mark_window_shown(self):
+        """Запомнить время появления окна"""
+        self.window_shown_at = time.perf_counter() - _PROCESS_START
+        print(f"🖥️ Окно готово через {self.window_shown_at:.2f} сек")
         
     def create_widgets(self):
         # Главный фрейм
@@ -279,9 +299,30 @@ class VoiceClonerXTTSApp:
                  font=("Arial", 8), foreground="blue").grid(row=2, column=0, columnspan=2, 
                                                           sticky=tk.W, pady=(2, 0))
         
+        # Профили голоса (сохраненные латенты, не требуют повторного анализа)
+        profile_frame = ttk.LabelFrame(left_frame, text="🗂 Профили голоса", padding="8")
+        profile_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        profile_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(profile_frame, text="Профиль:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.voice_profile_var, 
+                                          state="readonly")
+        self.profile_combo.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=2)
+        self.refresh_profiles()
+        
+        profile_buttons = ttk.Frame(profile_frame)
+        profile_buttons.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        ttk.Button(profile_buttons, text="💾 Сохранить", 
+                   command=self.enroll_voice_profile).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(profile_buttons, text="📤 Экспорт", 
+                   command=self.export_voice_profile).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(profile_buttons, text="📥 Импорт", 
+                   command=self.import_voice_profile).pack(side=tk.LEFT)
+        
         # Настройки (компактные)
         settings_frame = ttk.LabelFrame(left_frame, text="⚙️ Настройки", padding="8")
-        settings_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        settings_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         settings_frame.columnconfigure(1, weight=1)
         
         # Скорость речи
@@ -296,18 +337,46 @@ class VoiceClonerXTTSApp:
         # Привязка обновления лейбла
         speed_scale.configure(command=lambda x: speed_label.configure(text=f"{float(x):.1f}"))
         
+        # Потоковый режим: воспроизведение по мере генерации
+        self.streaming_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="🔊 Воспроизводить во время генерации", 
+                        variable=self.streaming_var).grid(row=1, column=0, columnspan=3, 
+                                                          sticky=tk.W, pady=(5, 0))
+        
+        # Пакетная генерация: несколько частей текста за один проход модели
+        ttk.Label(settings_frame, text="Пакет:").grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        self.batch_size_var = tk.IntVar(value=4)
+        ttk.Spinbox(settings_frame, from_=1, to=16, width=4, 
+                    textvariable=self.batch_size_var).grid(row=2, column=1, sticky=tk.W, 
+                                                           padx=(5, 0), pady=(5, 0))
+        
+        # Пул процессов для CPU: части текста синтезируются параллельно
+        ttk.Label(settings_frame, text="Процессы:").grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        self.workers_var = tk.IntVar(value=self.runtime_profile['workers'] if self.runtime_profile else 1)
+        self.workers_spinbox = ttk.Spinbox(settings_frame, from_=1, to=32, width=4, 
+                                           textvariable=self.workers_var)
+        self.workers_spinbox.grid(row=3, column=1, sticky=tk.W, padx=(5, 0), pady=(5, 0))
+        
+        # Кэш частей: при повторной озвучке синтезируются только измененные части
+        self.cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="💾 Кэш готовых частей", 
+                        variable=self.cache_var).grid(row=4, column=0, columnspan=3, 
+                                                      sticky=tk.W, pady=(5, 0))
+        
         # Кнопки генерации (компактные)
         generate_frame = ttk.LabelFrame(left_frame, text="🎯 Генерация", padding="8")
-        generate_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        generate_frame.grid(row=4, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         generate_frame.columnconfigure(0, weight=1)
         generate_frame.columnconfigure(1, weight=1)
         
         self.process_button = ttk.Button(generate_frame, text="🎯 XTTS v2 Клонировать", 
-                                        command=self.process_text, style="Accent.TButton")
+                                        command=self.process_text, style="Accent.TButton",
+                                        state="disabled")  # Включается после загрузки модели
         self.process_button.grid(row=0, column=0, padx=(0, 5), pady=2, sticky=(tk.W, tk.E))
         
         self.standard_button = ttk.Button(generate_frame, text="🇷🇺 Windows TTS", 
-                                         command=self.generate_windows_voice)
+                                         command=self.generate_windows_voice,
+                                         state="disabled")  # Включается после инициализации
         self.standard_button.grid(row=0, column=1, padx=(5, 0), pady=2, sticky=(tk.W, tk.E))
         
         # Кнопка настроек
@@ -422,96 +491,126 @@ class VoiceClonerXTTSApp:
             row=2, column=0, pady=2)
     
     def init_models(self):
-        """Инициализация моделей TTS"""
+        """Запуск фоновой загрузки моделей (окно остается отзывчивым)"""
+        self.progress_var.set("Загрузка моделей...")
+        self.progress_bar.start()
+        thread = threading.Thread(target=self._load_models_thread, daemon=True)
+        thread.start()
+    
+    def _timed_phase(self, name, func):
+        """Выполнить этап загрузки и запомнить его длительность"""
+        self.root.after(0, lambda: self.progress_var.set(f"Загрузка: {name}..."))
+        start = time.perf_counter()
         try:
-            self.progress_var.set("Загрузка моделей...")
-            self.root.update()
-            
-            # Пробуем загрузить XTTS v2 для клонирования
-            self.progress_var.set("Загрузка XTTS v2 для клонирования...")
-            self.root.update()
+            return func()
+        finally:
+            self.startup_phases.append((name, time.perf_counter() - start))
+    
+    def _load_models_thread(self):
+        """Фоновая загрузка: импорт torch/TTS, XTTS v2, кэш частей, Windows TTS, прогрев"""
+        xtts_status = "❌ XTTS v2 НЕ ЗАГРУЖЕНА - русское клонирование невозможно!"
+        windows_status = "❌ Windows TTS: ошибка инициализации"
+        try:
+            self._timed_phase("импорт torch", lambda: __import__('torch'))
+            # Потоки torch задаются до первых вычислений
+            self.runtime_profile = apply_runtime_profile()
+            self._timed_phase("импорт TTS", lambda: __import__('TTS.api'))
             
-            # Исправление для PyTorch 2.6
-            try:
-                from torch.serialization import add_safe_globals
-                from TTS.tts.configs.xtts_config import XttsConfig
-                from TTS.tts.models.xtts import XttsAudioConfig
-                from TTS.tts.models.xtts import XttsArgs
-                from TTS.config.shared_configs import BaseDatasetConfig
-                add_safe_globals([XttsConfig, XttsAudioConfig, XttsArgs, BaseDatasetConfig])
-                print("✅ PyTorch 2.6 safe globals добавлены в init_models (включая XttsArgs)")
-            except Exception as e:
-                print(f"⚠️ Ошибка добавления safe globals в init_models: {e}")
-                pass
+            # Возвращаемся к XTTS v2 - он поддерживает русский язык!
+            self.xtts_model = self._timed_phase("XTTS v2", load_xtts_model)
+            if self.xtts_model is None:
+                raise Exception("XTTS v2 не загрузился")
             
-            try:
-                # Возвращаемся к XTTS v2 - он поддерживает русский язык!
-                self.xtts_model = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
-                if self.xtts_model is None:
-                    raise Exception("XTTS v2 не загрузился")
-                
-                # Проверяем поддерживаемые языки
-                supported_langs = getattr(self.xtts_model, 'languages', [])
-                print(f"Поддерживаемые языки XTTS v2: {supported_langs}")
-                
-                # XTTS v2 поддерживает русский язык!
-                if 'ru' in supported_langs:
-                    xtts_status = "✅ XTTS v2 загружена - РУССКИЙ ПОДДЕРЖИВАЕТСЯ!"
-                else:
-                    xtts_status = "⚠️ XTTS v2 загружена - проверяем поддержку русского..."
-            except Exception as e:
-                print(f"❌ КРИТИЧЕСКАЯ ОШИБКА: XTTS v2 не загружается: {e}")
-                self.xtts_model = None
-                xtts_status = "❌ XTTS v2 НЕ ЗАГРУЖЕНА - русское клонирование невозможно!"
-                # Показываем критическое сообщение
-                error_msg = str(e)
-                self.root.after(0, lambda: messagebox.showerror(
-                    "Критическая ошибка", 
-                    f"Не удалось загрузить XTTS v2 для русского клонирования!\n\n"
-                    f"Ошибка: {error_msg}\n\n"
-                    f"Без XTTS v2 невозможно качественное клонирование голоса на русском языке.\n"
-                    f"Проверьте интернет-соединение и попробуйте перезапустить программу."
-                ))
+            # Проверяем поддерживаемые языки
+            supported_langs = model_languages(self.xtts_model)
+            print(f"Поддерживаемые языки XTTS v2: {supported_langs}")
             
-            # Инициализируем системный TTS Windows
-            self.progress_var.set("Инициализация Windows TTS...")
-            self.root.update()
+            # XTTS v2 поддерживает русский язык!
+            if 'ru' in supported_langs:
+                xtts_status = "✅ XTTS v2 загружена - РУССКИЙ ПОДДЕРЖИВАЕТСЯ!"
+            else:
+                xtts_status = "⚠️ XTTS v2 загружена - проверяем поддержку русского..."
+        except Exception as e:
+            print(f"❌ КРИТИЧЕСКАЯ ОШИБКА: XTTS v2 не загружается: {e}")
+            self.xtts_model = None
+            # Показываем критическое сообщение
+            error_msg = str(e)
+            self.root.after(0, lambda: messagebox.showerror(
+                "Критическая ошибка", 
+                f"Не удалось загрузить XTTS v2 для русского клонирования!\n\n"
+                f"Ошибка: {error_msg}\n\n"
+                f"Без XTTS v2 невозможно качественное клонирование голоса на русском языке.\n"
+                f"Проверьте интернет-соединение и попробуйте перезапустить программу."
+            ))
+        
+        try:
+            self.chunk_cache = self._timed_phase("кэш частей", ChunkAudioCache)
+        except Exception as e:
+            print(f"⚠️ Кэш частей недоступен: {e}")
+        
+        # Инициализируем системный TTS Windows
+        try:
+            windows_status = self._timed_phase("Windows TTS", self._init_windows_tts)
+            self.root.after(0, lambda: self.standard_button.config(state="normal"))
+        except Exception as e:
+            print(f"Ошибка Windows TTS: {e}")
+        
+        # Прогрев: первая озвучка не платит за разовую инициализацию модели
+        if self.xtts_model is not None:
+            self.models_state = "warming"
+            self.root.after(0, lambda: self.model_status.set(
+                f"Статус: {xtts_status} | 🔥 прогрев модели..."))
             try:
-                self.windows_tts = pyttsx3.init()
-                
-                # Получаем доступные голоса
-                voices = self.windows_tts.getProperty('voices')
-                russian_voice = None
-                
-                # Ищем русский голос
-                for voice in voices:
-                    if 'russian' in voice.name.lower() or 'ru' in voice.id.lower():
-                        russian_voice = voice
-                        break
-                
-                if russian_voice:
-                    self.windows_tts.setProperty('voice', russian_voice.id)
-                    windows_status = f"✅ Windows TTS с русским голосом: {russian_voice.name}"
-                else:
-                    # Используем первый доступный голос
-                    if voices:
-                        self.windows_tts.setProperty('voice', voices[0].id)
-                        windows_status = f"✅ Windows TTS: {voices[0].name}"
-                    else:
-                        windows_status = "⚠️ Windows TTS: голоса не найдены"
-                        
+                self.warmup_report = self._timed_phase("прогрев", lambda: warm_up_model(self.xtts_model))
             except Exception as e:
-                print(f"Ошибка Windows TTS: {e}")
-                windows_status = "❌ Windows TTS: ошибка инициализации"
-            
-            self.model_status.set(f"Статус: {xtts_status} | {windows_status}")
-            self.progress_var.set("Готов к работе")
-            
-        except Exception as e:
-            error_msg = f"Не удалось загрузить модели: {str(e)}"
-            messagebox.showerror("Ошибка", error_msg)
-            self.progress_var.set("Ошибка загрузки моделей")
-            self.model_status.set("Статус моделей: ❌ Ошибка загрузки")
+                print(f"⚠️ Прогрев XTTS v2 не выполнен: {e}")
+        
+        self.root.after(0, lambda: self._on_models_loaded(xtts_status, windows_status))
+    
+    def _init_windows_tts(self):
+        """Инициализация системного TTS с русским голосом, возвращает строку статуса"""
+        import pyttsx3
+        
+        self.windows_tts = pyttsx3.init()
+        
+        # Получаем доступные голоса
+        voices = self.windows_tts.getProperty('voices')
+        
+        # Ищем русский голос
+        for voice in voices:
+            if 'russian' in voice.name.lower() or 'ru' in voice.id.lower():
+                self.windows_tts.setProperty('voice', voice.id)
+                return f"✅ Windows TTS с русским голосом: {voice.name}"
+        
+        # Используем первый доступный голос
+        if voices:
+            self.windows_tts.setProperty('voice', voices[0].id)
+            return f"✅ Windows TTS: {voices[0].name}"
+        return "⚠️ Windows TTS: голоса не найдены"
+    
+    def _on_models_loaded(self, xtts_status, windows_status):
+        """Завершение фоновой загрузки в главном потоке: включение кнопок и отчет"""
+        self.progress_bar.stop()
+        self.models_state = "ready" if self.xtts_model is not None else "error"
+        if self.xtts_model is not None:
+            self.process_button.config(state="normal")
+        
+        self.model_status.set(f"Статус: {xtts_status} | {windows_status}")
+        self.progress_var.set("Готов к работе" if self.models_state == "ready" else "Ошибка загрузки моделей")
+        print(self.startup_report())
+    
+    def startup_report(self):
+        """Время запуска по этапам"""
+        lines = [f"📊 Запуск: модели готовы через {time.perf_counter() - _PROCESS_START:.1f} сек после старта"]
+        for name, seconds in self.startup_phases:
+            lines.append(f"  • {name}: {seconds:.2f} сек")
+        if self.warmup_report and self.warmup_report.get('cold') is not None:
+            warm = self.warmup_report.get('warm')
+            lines.append(f"  🔥 Синтез: холодный {self.warmup_report['cold']:.2f} сек"
+                         + (f", после прогрева {warm:.2f} сек" if warm is not None else ""))
+        if self.window_shown_at is not None:
+            lines.append(f"  🖥️ Окно показано через {self.window_shown_at:.2f} сек")
+        return "\n".join(lines)
     
     def start_recording(self):
         """Начать запись через микрофон"""
@@ -596,6 +695,7 @@ class VoiceClonerXTTSApp:
             
             # Установка пути к записанному файлу
             self.voice_file_path.set(self.recorded_file_path)
+            self.voice_profile_var.set("")
             
             # Проверка длительности
             duration = len(self.frames) * self.CHUNK / self.RATE
@@ -632,9 +732,11 @@ class VoiceClonerXTTSApp:
         )
         if file_path:
             self.voice_file_path.set(file_path)
+            self.voice_profile_var.set("")
             
             # Проверка длительности файла
             try:
+                import librosa
                 y, sr = librosa.load(file_path)
                 duration = len(y) / sr
                 if duration < 10:
@@ -652,31 +754,129 @@ class VoiceClonerXTTSApp:
             except Exception as e:
                 print(f"Ошибка при анализе файла: {e}")
     
-    def split_text_by_limit(self, text, limit=180):
-        """Разбить текст на части по лимиту символов"""
-        words = text.split()
-        parts = []
-        current_part = ""
+    def refresh_profiles(self):
+        """Обновить список профилей голоса"""
+        self.profile_combo['values'] = [""] + self.profile_store.list_profiles()
+    
+    def enroll_voice_profile(self):
+        """Сохранить текущий файл с голосом как профиль"""
+        if self.models_state in ("loading", "warming"):
+            messagebox.showinfo("Подождите", "Модель XTTS v2 еще загружается...")
+            return
+        if not self.xtts_model:
+            messagebox.showerror("Ошибка", "XTTS v2 модель не загружена!")
+            return
         
-        for word in words:
-            if len(current_part + " " + word) <= limit:
-                current_part += (" " + word) if current_part else word
-            else:
-                if current_part:
-                    parts.append(current_part)
-                current_part = word
+        voice_file = self.voice_file_path.get()
+        if not voice_file:
+            messagebox.showwarning("Предупреждение", "Сначала запишите или выберите файл с вашим голосом!")
+            return
+        
+        name = simpledialog.askstring("Профиль голоса", "Имя профиля:", 
+                                      initialvalue=Path(voice_file).stem, parent=self.root)
+        if not name:
+            return
         
-        if current_part:
-            parts.append(current_part)
+        try:
+            name = self.profile_store.enroll(self.xtts_model, voice_file, name, 
+                                             speaker_cache=self.speaker_cache)
+            self.refresh_profiles()
+            self.voice_profile_var.set(name)
+            messagebox.showinfo("Успех", f"Профиль голоса '{name}' сохранен!")
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить профиль: {str(e)}")
+    
+    def export_voice_profile(self):
+        """Экспорт выбранного профиля в файл"""
+        name = self.voice_profile_var.get()
+        if not name:
+            messagebox.showwarning("Предупреждение", "Сначала выберите профиль голоса!")
+            return
         
-        return parts if parts else [text[:limit]]
+        save_path = filedialog.asksaveasfilename(
+            title="Экспорт профиля голоса",
+            initialfile=name + PROFILE_SUFFIX,
+            defaultextension=PROFILE_SUFFIX,
+            filetypes=[("Профили голоса", "*" + PROFILE_SUFFIX), ("Все файлы", "*.*")]
+        )
+        if save_path:
+            try:
+                self.profile_store.export_profile(name, save_path)
+                messagebox.showinfo("Успех", f"Профиль экспортирован в: {save_path}")
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось экспортировать профиль: {str(e)}")
+    
+    def import_voice_profile(self):
+        """Импорт профиля голоса из файла"""
+        file_path = filedialog.askopenfilename(
+            title="Импорт профиля голоса",
+            filetypes=[("Профили голоса", "*" + PROFILE_SUFFIX), ("Все файлы", "*.*")]
+        )
+        if file_path:
+            try:
+                name = self.profile_store.import_profile(file_path)
+                self.refresh_profiles()
+                self.voice_profile_var.set(name)
+                messagebox.showinfo("Успех", f"Профиль голоса '{name}' импортирован!")
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось импортировать профиль: {str(e)}")
+    
+    def _get_speaker_latents(self):
+        """Латенты голоса: из выбранного профиля или из файла (через кэш)"""
+        profile = self.voice_profile_var.get()
+        if profile:
+            return self.profile_store.load(profile)
+        return self.speaker_cache.get_latents(self.xtts_model, self.voice_file_path.get())
+    
+    def _get_batch_size(self):
+        """Размер пакета из настроек (1 - генерация по одной части)"""
+        try:
+            return max(1, int(self.batch_size_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+    
+    def _get_worker_count(self):
+        """Число процессов из настроек (1 - синтез в текущем процессе)"""
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+    
+    def _get_worker_pool(self):
+        """Пул процессов для CPU (создается при первом использовании), None - пул недоступен"""
+        num_workers = self._get_worker_count()
+        if self.worker_pool is not None and self.worker_pool.num_workers != num_workers:
+            self.worker_pool.close()
+            self.worker_pool = None
+        if self.worker_pool is None:
+            try:
+                self.worker_pool = XTTSWorkerPool(self.xtts_model, num_workers=num_workers)
+            except Exception as e:
+                # Пул не запускается на этой системе: дальше синтез в текущем процессе
+                print(f"⚠️ Пул процессов недоступен, синтез в одном процессе: {e}")
+                self.root.after(0, self._disable_worker_pool)
+                return None
+        return self.worker_pool
+    
+    def _disable_worker_pool(self):
+        """Выключить настройку числа процессов (в главном потоке)"""
+        self.workers_var.set(1)
+        self.workers_spinbox.config(state="disabled")
+    
+    def split_text_by_limit(self, text, limit=180):
+        """Разбить текст на части по лимиту символов"""
+        return split_text_by_limit(text, limit)
     
     def process_text(self):
         """Обработка текста и создание аудио с клонированием голоса через XTTS v2"""
         if self.is_processing:
             return
         
-        if not self.voice_file_path.get():
+        if self.models_state in ("loading", "warming"):
+            messagebox.showinfo("Подождите", "Модель XTTS v2 еще загружается...")
+            return
+        
+        if not self.voice_file_path.get() and not self.voice_profile_var.get():
             messagebox.showwarning("Предупреждение", "Сначала запишите или выберите файл с вашим голосом!")
             return
         
@@ -685,22 +885,8 @@ class VoiceClonerXTTSApp:
             messagebox.showwarning("Предупреждение", "Введите текст для озвучки!")
             return
         
-        # Проверяем длину текста
-        if len(text) > 180:
-            result = messagebox.askyesno(
-                "Длинный текст", 
-                f"Текст содержит {len(text)} символов (лимит: 180).\n\n"
-                "XTTS v2 обрежет текст до 180 символов.\n\n"
-                "Хотите разбить текст на части для полной озвучки?"
-            )
-            
-            if result:
-                # Разбиваем текст на части
-                text_parts = self.split_text_by_limit(text, 180)
-                self.process_long_text(text_parts)
-                return
-        
-        # Запуск обработки в отдельном потоке
+        # Запуск обработки в отдельном потоке: длинный текст разбивается там на части
+        # и проходит через задание рендера и кэш частей, поэтому не обрезается
         self.is_processing = True
         self.process_button.config(state="disabled")
         self.progress_bar.start()
@@ -709,486 +895,17 @@ class VoiceClonerXTTSApp:
         thread.daemon = True
         thread.start()
     
-    def process_long_text(self, text_parts):
-        """Обработка длинного текста по частям"""
-        if not self.xtts_model:
-            messagebox.showerror("Ошибка", "XTTS v2 модель не загружена!")
-            return
-        
-        self.is_processing = True
-        self.process_button.config(state="disabled")
-        self.progress_var.set(f"Генерация голоса (0/{len(text_parts)} частей)...")
-        self.progress_bar.start()
-        
-        def generate_parts():
-            try:
-                audio_parts = []
-                
-                for i, part in enumerate(text_parts):
-                    self.root.after(0, lambda p=i+1, t=len(text_parts): 
-                        self.progress_var.set(f"Генерация голоса ({p}/{t} частей)..."))
-                    
-                    # Создаем временный файл для части
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                        part_path = tmp_file.name
-                    
-                    # Генерация части
-                    self.xtts_model.tts_to_file(
-                        text=part,
-                        speaker_wav=self.voice_file_path.get(),
-                        language="ru",
-                        file_path=part_path,
-                        speed=self.speed_var.get()
-                    )
-                    
-                    audio_parts.append(part_path)
-                
-                # Объединяем все части в один файл
-                self.combine_audio_parts(audio_parts)
-                
-                self.root.after(0, lambda: self.progress_var.set("Готово!"))
-                self.root.after(0, lambda: messagebox.showinfo("Успех", 
-                    f"Голос сгенерирован успешно! Обработано {len(text_parts)} частей."))
-                
-            except Exception as e:
-                error_msg = f"Ошибка генерации: {str(e)}"
-                self.root.after(0, lambda: self.progress_var.set("Ошибка!"))
-                self.root.after(0, lambda: messagebox.showerror("Ошибка", error_msg))
-            finally:
-                self.is_processing = False
-                self.root.after(0, lambda: self.progress_bar.stop())
-                self.root.after(0, lambda: self.process_button.config(state="normal"))
-        
-        threading.Thread(target=generate_parts, daemon=True).start()
-    
-    def combine_audio_parts(self, audio_parts):
-        """Объединение аудио частей в один файл"""
-        try:
-            import soundfile as sf
-            import numpy as np
-            
-            combined_audio = []
-            sample_rate = None
-            
-            for part_path in audio_parts:
-                y, sr = sf.read(part_path)
-                if sample_rate is None:
-                    sample_rate = sr
-                
-                combined_audio.append(y)
-                
-                # Удаляем временный файл части
-                try:
-                    os.remove(part_path)
-                except:
-                    pass
-            
-            # Объединяем все части
-            final_audio = np.concatenate(combined_audio)
-            
-            # Сохраняем результат
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                output_path = tmp_file.name
-            
-            sf.write(output_path, final_audio, sample_rate)
-            self.output_path.set(output_path)
-            
-        except Exception as e:
-            print(f"Ошибка объединения аудио: {e}")
-            # Если не удалось объединить, используем первую часть
-            if audio_parts:
-                self.output_path.set(audio_parts[0])
-    
     def process_text_with_stress(self, text):
         """Обработка текста с учетом ударений и специальных символов"""
-        import re
-        
-        # Обработка ударений через символ + (работает в обе стороны: +а и а+)
-        def process_plus_stress(match):
-            word = match.group(0)
-            # Находим позицию + в слове
-            plus_pos = word.find('+')
-            if plus_pos != -1:
-                # Убираем + и определяем ударную букву
-                clean_word = word.replace('+', '')
-                
-                # Определяем ударную букву (перед или после +)
-                if plus_pos > 0 and plus_pos < len(clean_word):
-                    # + между буквами - берем букву после +
-                    stressed_letter = clean_word[plus_pos]
-                    stressed_pos = plus_pos
-                elif plus_pos > 0:
-                    # + в конце - берем букву перед +
-                    stressed_letter = clean_word[plus_pos-1]
-                    stressed_pos = plus_pos-1
-                else:
-                    # + в начале - берем букву после +
-                    stressed_letter = clean_word[0]
-                    stressed_pos = 0
-                
-                # Проверяем, что это гласная, если нет - ищем ближайшую гласную
-                vowels = 'аеёиоуыэюя'
-                if stressed_letter.lower() not in vowels:
-                    # Ищем ближайшую гласную к позиции + (не перескакиваем через согласные)
-                    # Сначала ищем слева от + (включая позицию +)
-                    left_search = range(stressed_pos, -1, -1)
-                    # Потом справа от + (если слева не нашли)
-                    right_search = range(stressed_pos + 1, len(clean_word))
-                    
-                    # Объединяем поиски
-                    for pos in list(left_search) + list(right_search):
-                        if pos < len(clean_word) and clean_word[pos].lower() in vowels:
-                            stressed_letter = clean_word[pos]
-                            stressed_pos = pos
-                            break
-                    else:
-                        # Если гласную не нашли, возвращаем слово без изменений
-                        print(f"Не найдена гласная в слове '{word}'")
-                        return clean_word
-                
-                # Заменяем на готовые буквы с ударениями (один символ)
-                stressed_vowels = {
-                    'а': 'á',  # а с острым ударением (один символ)
-                    'о': 'ó',  # о с острым ударением (один символ)
-                    'е': 'é',  # е с острым ударением (один символ)
-                    'и': 'í',  # и с острым ударением (один символ)
-                    'у': 'ú',  # у с острым ударением (один символ)
-                    'ы': 'ы́',  # ы с острым ударением (два символа, но это стандарт)
-                    'э': 'э́',  # э с острым ударением (два символа, но это стандарт)
-                    'ю': 'ю́',  # ю с острым ударением (два символа, но это стандарт)
-                    'я': 'я́',  # я с острым ударением (два символа, но это стандарт)
-                    'ё': 'ё́',  # ё с острым ударением (два символа, но это стандарт)
-                }
-                
-                # Заменяем гласную на версию с ударением
-                stressed_letter_new = stressed_vowels.get(stressed_letter.lower(), stressed_letter)
-                # Сохраняем регистр
-                if stressed_letter.isupper():
-                    stressed_letter_new = stressed_letter_new.upper()
-                
-                stressed_word = clean_word[:stressed_pos] + stressed_letter_new + clean_word[stressed_pos+1:]
-                print(f"Обработка ударения: '{word}' -> '{stressed_word}' (ударение на букву '{stressed_letter}' -> '{stressed_letter_new}')")
-                return stressed_word
-            return word
-        
-        # Обрабатываем слова с + ударениями (обрабатываем каждый + отдельно)
-        def process_word_with_pluses(word):
-            try:
-                # Обрабатываем каждый + в слове отдельно
-                while '+' in word:
-                    # Находим позицию первого +
-                    plus_pos = word.find('+')
-                    if plus_pos == -1:
-                        break
-                    
-                    # Проверяем границы строки перед обращением к индексам
-                    if len(word) <= 1:
-                        print(f"Слово слишком короткое для обработки ударения: '{word}'")
-                        break
-                    
-                    # Определяем ударную букву (перед или после +)
-                    if plus_pos > 0 and plus_pos < len(word) - 1:
-                        # + между буквами - берем букву после +
-                        stressed_letter = word[plus_pos + 1]
-                        stressed_pos = plus_pos + 1
-                    elif plus_pos > 0:
-                        # + в конце - берем букву перед +
-                        stressed_letter = word[plus_pos - 1]
-                        stressed_pos = plus_pos - 1
-                    else:
-                        # + в начале - берем букву после +
-                        if len(word) > 1:
-                            stressed_letter = word[1]
-                            stressed_pos = 1
-                        else:
-                            print(f"Слово слишком короткое для обработки ударения: '{word}'")
-                            word = word.replace('+', '', 1)
-                            continue
-                    
-                    # Проверяем, что это гласная, если нет - ищем ближайшую гласную
-                    vowels = 'аеёиоуыэюя'
-                    if stressed_letter.lower() not in vowels:
-                        # Ищем ближайшую гласную к позиции + (не перескакиваем через согласные)
-                        # Сначала ищем слева от + (включая позицию +)
-                        left_search = range(stressed_pos, -1, -1)
-                        # Потом справа от + (если слева не нашли)
-                        right_search = range(stressed_pos + 1, len(word))
-                        
-                        # Объединяем поиски
-                        for pos in list(left_search) + list(right_search):
-                            if pos < len(word) and word[pos].lower() in vowels:
-                                stressed_letter = word[pos]
-                                stressed_pos = pos
-                                break
-                        else:
-                            # Если гласную не нашли, просто убираем +
-                            word = word.replace('+', '', 1)
-                            continue
-                    
-                    # Проверяем, что гласная еще не ударена
-                    stressed_vowels = 'áóéíúы́э́ю́я́ё́'
-                    if stressed_letter in stressed_vowels:
-                        # Гласная уже ударена, просто убираем +
-                        word = word.replace('+', '', 1)
-                        print(f"Гласная '{stressed_letter}' уже ударена, + игнорируется")
-                        continue
-                    
-                    # Заменяем на готовые буквы с ударениями (один символ)
-                    stressed_vowels_dict = {
-                        'а': 'á',  # а с острым ударением (один символ)
-                        'о': 'ó',  # о с острым ударением (один символ)
-                        'е': 'é',  # е с острым ударением (один символ)
-                        'и': 'í',  # и с острым ударением (один символ)
-                        'у': 'ú',  # у с острым ударением (один символ)
-                        'ы': 'ы́',  # ы с острым ударением (два символа, но это стандарт)
-                        'э': 'э́',  # э с острым ударением (два символа, но это стандарт)
-                        'ю': 'ю́',  # ю с острым ударением (два символа, но это стандарт)
-                        'я': 'я́',  # я с острым ударением (два символа, но это стандарт)
-                        'ё': 'ё́',  # ё с острым ударением (два символа, но это стандарт)
-                    }
-                    
-                    # Заменяем гласную на версию с ударением
-                    stressed_letter_new = stressed_vowels_dict.get(stressed_letter.lower(), stressed_letter)
-                    # Сохраняем регистр
-                    if stressed_letter.isupper():
-                        stressed_letter_new = stressed_letter_new.upper()
-                    
-                    # Заменяем букву и убираем +
-                    word = word[:stressed_pos] + stressed_letter_new + word[stressed_pos + 1:]
-                    word = word.replace('+', '', 1)  # Убираем только первый +
-                    
-                    print(f"Обработка ударения: ударение на букву '{stressed_letter}' -> '{stressed_letter_new}'")
-                
-                return word
-            except Exception as e:
-                print(f"Ошибка при обработке ударений в слове '{word}': {e}")
-                # В случае ошибки просто убираем все + из слова
-                return word.replace('+', '')
-        
-        # Обрабатываем каждое слово с + отдельно
-        def process_plus_stress_in_word(match):
-            word = match.group(0)
-            return process_word_with_pluses(word)
-        
-        text = re.sub(r'\b[а-яёА-ЯЁ]*\+[а-яёА-ЯЁ]*\b', process_plus_stress_in_word, text)
-        
-        # Метод ослабления ударения (используем символ -) - работает в обе стороны: -а и а-
-        def process_weak_stress(match):
-            word = match.group(0)
-            try:
-                if '-' in word:
-                    # Находим позицию - в слове
-                    minus_pos = word.find('-')
-                    # Убираем - и определяем ослабляемую букву
-                    clean_word = word.replace('-', '')
-                    
-                    # Проверяем границы строки перед обращением к индексам
-                    if len(clean_word) == 0:
-                        print(f"Слово пустое после удаления -: '{word}'")
-                        return word
-                    
-                    # Определяем ослабляемую букву (перед или после -)
-                    if minus_pos > 0 and minus_pos < len(clean_word):
-                        # - между буквами - берем букву после -
-                        weak_letter = clean_word[minus_pos]
-                        weak_pos = minus_pos
-                    elif minus_pos > 0:
-                        # - в конце - берем букву перед -
-                        weak_letter = clean_word[minus_pos-1]
-                        weak_pos = minus_pos-1
-                    else:
-                        # - в начале - берем букву после -
-                        weak_letter = clean_word[0]
-                        weak_pos = 0
-                    
-                    # Проверяем, что это гласная, если нет - ищем ближайшую гласную
-                    vowels = 'аеёиоуыэюя'
-                    if weak_letter.lower() not in vowels:
-                        # Ищем ближайшую гласную к позиции - (не перескакиваем через согласные)
-                        # Сначала ищем слева от - (включая позицию -)
-                        left_search = range(weak_pos, -1, -1)
-                        # Потом справа от - (если слева не нашли)
-                        right_search = range(weak_pos + 1, len(clean_word))
-                        
-                        # Объединяем поиски
-                        for pos in list(left_search) + list(right_search):
-                            if pos < len(clean_word) and clean_word[pos].lower() in vowels:
-                                weak_letter = clean_word[pos]
-                                weak_pos = pos
-                                break
-                        else:
-                            # Если гласную не нашли, возвращаем слово без изменений
-                            print(f"Не найдена гласная в слове '{word}'")
-                            return clean_word
-                    
-                    # Заменяем на более слабую гласную
-                    weak_vowels = {
-                        'а': 'ə',  # schwa - нейтральная гласная
-                        'о': 'ə',  # schwa
-                        'е': 'ɪ',  # короткая i
-                        'и': 'ɪ',  # короткая i
-                        'у': 'ʊ',  # короткая u
-                        'ы': 'ə',  # schwa
-                        'э': 'ɛ',  # короткая e
-                        'ю': 'ʊ',  # короткая u
-                        'я': 'ə',  # schwa
-                        'ё': 'ɪ',  # короткая i
-                    }
-                    
-                    # Заменяем гласную на более слабую
-                    weak_letter_new = weak_vowels.get(weak_letter.lower(), weak_letter)
-                    # Сохраняем регистр
-                    if weak_letter.isupper():
-                        weak_letter_new = weak_letter_new.upper()
-                    
-                    weak_word = clean_word[:weak_pos] + weak_letter_new + clean_word[weak_pos+1:]
-                    print(f"Ослабление ударения: '{word}' -> '{weak_word}' (ослаблена буква '{weak_letter}' -> '{weak_letter_new}')")
-                    return weak_word
-                return word
-            except Exception as e:
-                print(f"Ошибка при обработке ослабления ударений в слове '{word}': {e}")
-                # В случае ошибки просто убираем все - из слова
-                return word.replace('-', '')
-        
-        # Применяем метод ослабления ударения (слова с символом -)
-        text = re.sub(r'\b[а-яёА-ЯЁ]*-[а-яёА-ЯЁ]*\b', process_weak_stress, text)
-        
-        # Словарь правильных ударений для сложных случаев
-        stress_dict = {
-            "компьютер": "компьютер",
-            "интернет": "интернет", 
-            "телефон": "телефон",
-            "одновременно": "одновременно",
-            "одновременно": "одновременно",
-            "замок": "замок",  # крепость (з+амок)
-            "замок": "замок",  # дверной механизм (зам+ок)
-            "мука": "мука",    # страдание (м+ука)
-            "мука": "мука",    # продукт (мук+а)
-            "Федотов": "Федотов",  # Фед+отов
-            "века": "века",    # в+ека
-        }
-        
-        # Обработка SSML тегов
-        text = re.sub(r'<emphasis>(.*?)</emphasis>', r'*\1*', text)
-        text = re.sub(r'<break time="(\d+)ms"/>', r'...', text)
-        
-        # Обработка эмфатических ударений
-        text = re.sub(r'\*\*(.*?)\*\*', r'*\1*', text)  # Двойные звездочки
-        text = re.sub(r'__(.*?)__', r'*\1*', text)      # Подчеркивание
-        
-        # Обработка пауз
-        text = re.sub(r'\.{3,}', '...', text)  # Множественные точки
-        
-        # Замена сложных слов с правильными ударениями
-        for word, stressed_word in stress_dict.items():
-            text = re.sub(r'\b' + re.escape(word) + r'\b', stressed_word, text, flags=re.IGNORECASE)
-        
-        return text
+        return process_text_with_stress(text)
 
     def split_text_for_xtts(self, text, max_length=150):
         """Разбивает текст на части подходящие для XTTS v2"""
-        import re
-        
-        # Разбиваем на предложения (по точкам, восклицательным, вопросительным знакам и переносам строк)
-        sentences = re.split(r'[.!?\n]+', text)
-        chunks = []
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-            
-            # Если предложение короткое, добавляем как есть
-            if len(sentence) <= max_length:
-                chunks.append(sentence)
-                continue
-            
-            # Если предложение длинное, разбиваем по приоритету разделителей
-            chunks.extend(self._split_long_sentence(sentence, max_length))
-        
-        return chunks
+        return split_text_for_xtts(text, max_length)
     
     def _split_long_sentence(self, sentence, max_length):
         """Разбивает длинное предложение по приоритету разделителей"""
-        import re
-        
-        # Приоритет разделителей: запятые и точки с запятой -> тире -> двоеточие -> пробелы
-        separators = [
-            r'[,;]',      # Запятые и точки с запятой
-            r'\s+-\s+',   # Тире с пробелами
-            r':',         # Двоеточие
-            r'\s+'        # Любые пробелы (последний случай)
-        ]
-        
-        for i, separator in enumerate(separators):
-            parts = re.split(separator, sentence)
-            
-            # Если разбиение дало больше одной части
-            if len(parts) > 1:
-                result_chunks = []
-                current_part = ""
-                
-                for part in parts:
-                    part = part.strip()
-                    if not part:
-                        continue
-                    
-                    # Если часть сама по себе слишком длинная
-                    if len(part) > max_length:
-                        # Сначала добавляем накопленную часть
-                        if current_part:
-                            result_chunks.append(current_part.strip())
-                            current_part = ""
-                        
-                        # Если это последний разделитель (пробелы), разбиваем на слова
-                        if i == len(separators) - 1:
-                            words = part.split()
-                            temp_chunk = ""
-                            
-                            for word in words:
-                                if len(temp_chunk + " " + word) <= max_length:
-                                    temp_chunk += (" " + word) if temp_chunk else word
-                                else:
-                                    if temp_chunk:
-                                        result_chunks.append(temp_chunk.strip())
-                                    temp_chunk = word
-                            
-                            if temp_chunk:
-                                current_part = temp_chunk
-                        else:
-                            # Пробуем следующий разделитель для этой части
-                            sub_chunks = self._split_long_sentence(part, max_length)
-                            if len(sub_chunks) > 1:
-                                # Если подразбиение удалось, добавляем все части
-                                if current_part:
-                                    result_chunks.append(current_part.strip())
-                                    current_part = ""
-                                result_chunks.extend(sub_chunks)
-                            else:
-                                # Если подразбиение не удалось, добавляем как есть
-                                if current_part:
-                                    result_chunks.append(current_part.strip())
-                                    current_part = ""
-                                result_chunks.append(part)
-                    else:
-                        # Проверяем, поместится ли часть в текущий чанк
-                        if len(current_part + " " + part) <= max_length:
-                            current_part += (" " + part) if current_part else part
-                        else:
-                            if current_part:
-                                result_chunks.append(current_part.strip())
-                            current_part = part
-                
-                # Добавляем последнюю часть
-                if current_part:
-                    result_chunks.append(current_part.strip())
-                
-                # Если получилось разбиение, возвращаем результат
-                if len(result_chunks) > 1:
-                    return result_chunks
-        
-        # Если ни один разделитель не помог, возвращаем предложение как есть
-        return [sentence]
+        return split_long_sentence(sentence, max_length)
 
     def _process_text_thread(self, text):
         """Поток для обработки текста с клонированием через XTTS v2"""
@@ -1199,111 +916,98 @@ class VoiceClonerXTTSApp:
             
             self.root.after(0, lambda: self.progress_var.set("Анализ вашего голоса..."))
             
-            # Обработка ударений в тексте
-            processed_text = self.process_text_with_stress(text)
-            print(f"📝 Текст обработан с учетом ударений")
-            print(f"📝 Исходный текст: {text[:100]}...")
-            print(f"📝 Обработанный текст: {processed_text[:100]}...")
+            # Латенты голоса берутся из кэша или вычисляются один раз для всех частей
+            latents = self._get_speaker_latents()
+            sample_rate = get_output_sample_rate(self.xtts_model)
+            text_chunks = self._prepare_text_chunks(text)
+            if not text_chunks:
+                raise Exception("Нет текста для озвучки после обработки")
+            
+            # С кэшем генерация детерминирована: одинаковая часть дает одинаковое аудио
+            use_cache = self.cache_var.get() and self.chunk_cache is not None
+            seed = DEFAULT_SEED if use_cache else None
+            
+            # Задание с сохранением каждой готовой части: после сбоя генерация
+            # продолжится с первой недостающей части
+            job = RenderJob.open(text_chunks, latents, sample_rate, language="ru", speed=1.0,
+                                 seed=seed, **self.RENDER_PARAMS)
+            resumed = job.completed_count
+            repeated = (self.last_job is not None and self.last_job.chunks == text_chunks
+                        and self.last_job.manifest.get('voice_hash') == latents_hash(latents)
+                        and not self.last_job.missing_indices())
+            if resumed == len(text_chunks) or repeated:
+                # Тот же текст уже озвучен полностью - это новый дубль, а не продолжение.
+                # С постоянным зерном дубль совпал бы с прошлым, поэтому у дубля свое
+                # зерно (входит в ключ задания), а кэш частей не используется
+                if self.last_job is not None and self.last_job.job_dir == job.job_dir:
+                    self.last_job = None
+                job.remove()
+                if seed is not None:
+                    seed = random.randrange(2 ** 31)
+                use_cache = False
+                job = RenderJob.open(text_chunks, latents, sample_rate, language="ru", speed=1.0,
+                                     seed=seed, **self.RENDER_PARAMS)
+            elif resumed:
+                print(f"♻️ Продолжение задания {job.job_id}: готово {resumed} из {len(text_chunks)} частей")
+            
+            # После правки текста переиспользуем неизмененные части предыдущей озвучки
+            reused = job.reuse_from(self.last_job)
+            if reused:
+                print(f"♻️ Переиспользовано частей из предыдущей озвучки: {reused} из {len(text_chunks)}")
+            missing = job.missing_indices()
+            
+            cache_keys = None
+            if use_cache:
+                voice_hash = latents_hash(latents)
+                profile = get_inference_profile(self.xtts_model)
+                sampler = SAMPLER_STREAM if self.streaming_var.get() else SAMPLER_SEEDED
+                cache_keys = [
+                    self.chunk_cache.make_key(chunk, voice_hash, seed, profile=profile, sampler=sampler,
+                                              language="ru", speed=1.0, **self.RENDER_PARAMS)
+                    for chunk in text_chunks
+                ]
+                for index in missing:
+                    wav = self.chunk_cache.get(cache_keys[index])
+                    if wav is not None:
+                        job.save_chunk(index, wav)
+                missing = job.missing_indices()
             
-            # Разбиваем текст на части если он слишком длинный
-            text_chunks = self.split_text_for_xtts(processed_text)
-            print(f"📝 Текст разбит на {len(text_chunks)} частей для обработки")
+            if len(missing) < len(text_chunks):
+                ready = len(text_chunks) - len(missing)
+                print(f"♻️ Готово без генерации: {ready} из {len(text_chunks)} частей")
+                self.root.after(0, lambda: self.progress_var.set(
+                    f"Готово {ready} из {len(text_chunks)} частей, осталось сгенерировать {len(missing)}..."))
             
-            if len(text_chunks) > 1:
-                self.root.after(0, lambda: self.progress_var.set(f"Обработка длинного текста ({len(text_chunks)} частей)..."))
+            def save_chunk(index, wav):
+                job.save_chunk(index, wav)
+                if cache_keys is not None:
+                    self.chunk_cache.put(cache_keys[index], wav, sample_rate)
             
-            # Создание одного WAV файла для последовательной записи
+            try:
+                if missing:
+                    self._render_chunks(job, missing, latents, save_chunk, seed)
+            except Exception:
+                print(f"💾 Готовые части сохранены в {job.job_dir}, повторный запуск продолжит генерацию")
+                raise
+            
+            # Создание одного WAV файла из сохраненных частей (по одной части в памяти)
             with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as final_file:
                 output_path = final_file.name
             
-            import soundfile as sf
-            import numpy as np
+            with StreamingAudioWriter(output_path, sample_rate) as writer:
+                for wav in job.iter_audio():
+                    writer.write(wav)
             
-            # Список для хранения всех аудио данных
-            all_audio_data = []
-            sample_rate = None
+            # Части последней озвучки сохраняются до следующей: из них берутся неизмененные части
+            if self.last_job is not None and self.last_job.job_dir != job.job_dir:
+                self.last_job.remove()
+            self.last_job = job
             
-            # Генерируем каждую часть и добавляем в общий массив
-            for i, chunk in enumerate(text_chunks):
-                if len(text_chunks) > 1:
-                    self.root.after(0, lambda i=i, total=len(text_chunks): 
-                        self.progress_var.set(f"Генерация части {i+1} из {total}..."))
-                
-                # Создание временного файла для части
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                    chunk_output_path = tmp_file.name
-                
-                # XTTS v2 с исправленными параметрами
-                try:
-                    self.xtts_model.tts_to_file(
-                        text=chunk,
-                        speaker_wav=self.voice_file_path.get(),
-                        file_path=chunk_output_path,
-                        language="ru",
-                        # Только поддерживаемые параметры
-                        speed=1.0,
-                        temperature=0.7,
-                        length_penalty=1.0,
-                        repetition_penalty=2.0,
-                        top_k=50,
-                        top_p=0.85
-                    )
-                    
-                    # Читаем сгенерированную часть и добавляем в общий массив
-                    audio_data, sr = sf.read(chunk_output_path)
-                    if sample_rate is None:
-                        sample_rate = sr
-                    all_audio_data.append(audio_data)
-                    
-                    # Удаляем временный файл части
-                    try:
-                        os.unlink(chunk_output_path)
-                    except:
-                        pass
-                    
-                    print(f"✅ Часть {i+1} сгенерирована и добавлена в общий файл")
-                    
-                except Exception as e:
-                    print(f"Ошибка с частью {i+1}: {e}")
-                    # Пробуем с минимальными параметрами
-                    try:
-                        self.xtts_model.tts_to_file(
-                            text=chunk,
-                            speaker_wav=self.voice_file_path.get(),
-                            file_path=chunk_output_path,
-                            language="ru"
-                        )
-                        
-                        # Читаем сгенерированную часть и добавляем в общий массив
-                        audio_data, sr = sf.read(chunk_output_path)
-                        if sample_rate is None:
-                            sample_rate = sr
-                        all_audio_data.append(audio_data)
-                        
-                        # Удаляем временный файл части
-                        try:
-                            os.unlink(chunk_output_path)
-                        except:
-                            pass
-                        
-                        print(f"✅ Часть {i+1} сгенерирована с базовыми параметрами")
-                    except Exception as e2:
-                        raise Exception(f"Не удалось сгенерировать часть {i+1}: {e2}")
-            
-            # Объединяем все части в один файл
-            if len(all_audio_data) > 1:
-                self.root.after(0, lambda: self.progress_var.set("Сохранение объединенного аудио..."))
-                
-                # Объединяем все аудио данные
-                final_audio = np.concatenate(all_audio_data)
-                sf.write(output_path, final_audio, sample_rate)
-                
-                print(f"✅ Объединено {len(all_audio_data)} частей в один файл")
-                
-            else:
-                # Если только одна часть, сохраняем её как есть
-                sf.write(output_path, all_audio_data[0], sample_rate)
-                print("✅ Аудио сохранено в один файл")
+            if cache_keys is not None:
+                stats = self.chunk_cache.stats()
+                print(f"💾 Кэш частей: попаданий {stats['hits']}, промахов {stats['misses']}, "
+                      f"{stats['entries']} записей, {stats['bytes'] / 1024 ** 2:.0f} МБ")
+            print(f"✅ Аудио сохранено в один файл ({writer.duration:.1f} сек)")
             
             # Сохранение пути к результату
             self.output_path.set(output_path)
@@ -1318,6 +1022,124 @@ class VoiceClonerXTTSApp:
         finally:
             self.root.after(0, lambda: self._finish_processing())
     
+    def _render_chunks(self, job, indices, latents, save_chunk, seed=None):
+        """Генерация недостающих частей задания выбранным способом"""
+        text_chunks = [job.chunks[i] for i in indices]
+        report_progress = lambda done, total: self.root.after(0, lambda: 
+            self.progress_var.set(f"Сгенерировано частей: {done} из {total}..."))
+        
+        pool = None
+        if not self.streaming_var.get() and self._get_worker_count() > 1:
+            pool = self._get_worker_pool()
+        
+        if self.streaming_var.get():
+            # Потоковый режим: звук воспроизводится по мере генерации
+            self._stream_text_chunks(job, indices, latents, save_chunk, seed)
+        elif pool is not None:
+            # Пул процессов: части синтезируются параллельно, веса модели общие
+            wavs = pool.imap(text_chunks, latents, language="ru", speed=1.0,
+                             progress_callback=report_progress, seed=seed, **self.RENDER_PARAMS)
+            for index, wav in zip(indices, wavs):
+                save_chunk(index, wav)
+        elif self._get_batch_size() > 1:
+            # Пакетный режим: GPT и вокодер обрабатывают несколько частей за проход
+            wavs = iter_synthesize_batch(self.xtts_model, text_chunks, latents, language="ru", speed=1.0,
+                                         batch_size=self._get_batch_size(),
+                                         progress_callback=report_progress, seed=seed,
+                                         prefix_cache=self.prefix_cache, **self.RENDER_PARAMS)
+            for index, wav in zip(indices, wavs):
+                save_chunk(index, wav)
+        else:
+            # Конвейер: GPT, вокодер и запись работают параллельно
+            self._render_pipelined(job, indices, latents, save_chunk, seed)
+    
+    def _prepare_text_chunks(self, text):
+        """Обработка ударений и разбиение текста на части для XTTS v2"""
+        # Обработка ударений в тексте
+        processed_text = self.process_text_with_stress(text)
+        print(f"📝 Текст обработан с учетом ударений")
+        print(f"📝 Исходный текст: {text[:100]}...")
+        print(f"📝 Обработанный текст: {processed_text[:100]}...")
+        
+        # Разбиваем текст на минимум частей в пределах бюджета токенов модели
+        if self.token_counter is None:
+            self.token_counter = make_token_counter(self.xtts_model, "ru")
+        budget = text_token_budget(self.xtts_model, "ru")
+        text_chunks = split_text_by_budget(processed_text, budget, self.token_counter)
+        print(f"📝 Текст разбит на {len(text_chunks)} частей для обработки")
+        
+        if len(text_chunks) > 1:
+            self.root.after(0, lambda: self.progress_var.set(f"Обработка длинного текста ({len(text_chunks)} частей)..."))
+        
+        return text_chunks
+    
+    def _render_pipelined(self, job, indices, latents, save_chunk, seed=None):
+        """Рендер через конвейер с ограниченными очередями между стадиями"""
+        def report_progress(done, total):
+            self.root.after(0, lambda: self.progress_var.set(f"Сгенерировано частей: {done} из {total}..."))
+        
+        pipeline = RenderPipeline(
+            self.xtts_model,
+            latents,
+            language="ru",
+            speed=1.0,
+            sink=save_chunk,
+            progress_callback=report_progress,
+            seed=seed,
+            prefix_cache=self.prefix_cache,
+            **self.RENDER_PARAMS
+        )
+        pipeline.run_chunks(job.chunks, indices)
+    
+    def _stream_text_chunks(self, job, indices, latents, save_chunk, seed=None):
+        """Потоковая генерация частей с воспроизведением первых фрагментов сразу"""
+        import numpy as np
+        
+        stream = SynthesisStream(
+            self.xtts_model,
+            [job.chunks[i] for i in indices],
+            latents,
+            language="ru",
+            speed=1.0,
+            seed=seed,
+            **self.RENDER_PARAMS
+        )
+        
+        player = None
+        if self.audio is not None:
+            try:
+                player = StreamingPlayer(self.audio, stream.sample_rate)
+            except Exception as e:
+                print(f"⚠️ Потоковое воспроизведение недоступно: {e}")
+        
+        # Фрагменты приходят по порядку частей; часть сохраняется, когда пришел ее последний фрагмент
+        current, fragments = None, []
+        
+        def save_current():
+            if current is not None:
+                save_chunk(indices[current], np.concatenate(fragments))
+        
+        try:
+            for position, frames in stream:
+                if player is not None:
+                    player.play(frames)
+                if position != current:
+                    save_current()
+                    current, fragments = position, []
+                fragments.append(frames)
+                
+                self.root.after(0, lambda i=indices[position], total=len(job.chunks), ttfa=stream.time_to_first_audio: 
+                    self.progress_var.set(f"Потоковая генерация части {i+1} из {total} "
+                                          f"(первый звук через {ttfa:.2f} сек)..."))
+            save_current()
+        finally:
+            if player is not None:
+                player.close(wait=False)
+        
+        if stream.time_to_first_audio is not None:
+            print(f"⚡ Потоковый синтез: первый звук через {stream.time_to_first_audio:.2f} сек, "
+                  f"всего {stream.elapsed:.1f} сек на {stream.audio_duration:.1f} сек аудио")
+    
     def _finish_processing(self):
         """Завершение обработки в главном потоке"""
         self.is_processing = False
@@ -1947,6 +1769,12 @@ class VoiceClonerXTTSApp:
     def _show_spectrogram(self, audio_path, title):
         """Показать спектрограмму аудио"""
         try:
+            import librosa
+            import librosa.display
+            import numpy as np
+            import matplotlib.pyplot as plt
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            
             # Загрузка аудио
             y, sr = librosa.load(audio_path)
             
@@ -1982,6 +1810,11 @@ class VoiceClonerXTTSApp:
     
     def __del__(self):
         """Очистка ресурсов"""
+        if getattr(self, 'worker_pool', None) is not None:
+            try:
+                self.worker_pool.close()
+            except Exception as e:
+                print(f"⚠️ Ошибка при остановке пула процессов: {e}")
         if hasattr(self, 'audio') and self.audio is not None:
             try:
                 self.audio.terminate()
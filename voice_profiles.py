@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Хранилище профилей голоса XTTS v2
+Профиль - это латенты голоса (fp16) + метаданные, сохраненные на диск,
+чтобы не обрабатывать образец заново при каждом запуске
+
+Реестр голосов (VoiceRegistry) хранит загруженные образцы под постоянным
+ID (хэш содержимого): образец передается один раз, дальше синтез
+запрашивается по ID
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from xtts_engine import (
+    XTTS_MODEL_NAME,
+    default_conditioning_params,
+    file_content_hash,
+    get_xtts_core,
+)
+
+PROFILE_FORMAT_VERSION = 1
+PROFILE_SUFFIX = ".voice"
+DEFAULT_PROFILES_DIR = os.environ.get(
+    'VOICE_PROFILES_DIR', str(Path(__file__).resolve().parent / "voice_profiles")
+)
+DEFAULT_VOICES_DIR = os.environ.get(
+    'VOICE_REGISTRY_DIR', str(Path(__file__).resolve().parent / "voices")
+)
+VOICE_ID_LENGTH = 16
+REFERENCE_SAMPLE_RATE = 22050  # Частота, с которой XTTS читает образец для латентов GPT
+
+
+def safe_profile_name(name):
+    """Имя профиля, пригодное для имени файла"""
+    name = re.sub(r'[^\w\-. ]+', '_', name.strip()).strip(' .')
+    if not name:
+        raise ValueError("Пустое имя профиля")
+    return name
+
+
+def write_profile(profile, path):
+    """Атомарная запись профиля голоса (через временный файл)"""
+    import torch
+
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    torch.save(profile, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_profile(path):
+    """Прочитать и проверить файл профиля голоса"""
+    import torch
+
+    profile = torch.load(path, map_location="cpu", weights_only=True)
+    if not isinstance(profile, dict) or 'gpt_cond_latent' not in profile or 'speaker_embedding' not in profile:
+        raise ValueError(f"Файл не является профилем голоса: {path}")
+    if profile.get('format_version', 0) > PROFILE_FORMAT_VERSION:
+        raise ValueError(f"Профиль создан более новой версией программы: {path}")
+    if profile.get('model') != XTTS_MODEL_NAME:
+        print(f"⚠️ Профиль создан для другой модели: {profile.get('model')}")
+    return profile
+
+
+class VoiceProfileStore:
+    """Профили голоса в каталоге на диске (один файл на профиль)"""
+
+    def __init__(self, profiles_dir=None):
+        self.profiles_dir = Path(profiles_dir or DEFAULT_PROFILES_DIR)
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        self._loaded = {}
+
+    def profile_path(self, name):
+        """Путь к файлу профиля"""
+        return self.profiles_dir / (safe_profile_name(name) + PROFILE_SUFFIX)
+
+    def list_profiles(self):
+        """Список имен сохраненных профилей"""
+        return sorted(p.stem for p in self.profiles_dir.glob("*" + PROFILE_SUFFIX))
+
+    def enroll(self, model, audio_path, name, speaker_cache=None):
+        """Создать профиль из образца голоса (WAV/MP3 и т.д.)"""
+        params = default_conditioning_params(model)
+        if speaker_cache is not None:
+            gpt_cond_latent, speaker_embedding = speaker_cache.get_latents(model, audio_path, **params)
+        else:
+            core = get_xtts_core(model)
+            gpt_cond_latent, speaker_embedding = core.get_conditioning_latents(audio_path=audio_path, **params)
+
+        name = safe_profile_name(name)
+        profile = {
+            'format_version': PROFILE_FORMAT_VERSION,
+            'name': name,
+            'model': XTTS_MODEL_NAME,
+            'source_file': os.path.basename(audio_path),
+            'source_hash': file_content_hash(audio_path),
+            'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'conditioning': params,
+            'gpt_cond_latent': gpt_cond_latent.detach().cpu().half(),
+            'speaker_embedding': speaker_embedding.detach().cpu().half(),
+        }
+        path = self.profile_path(name)
+        write_profile(profile, path)
+        self._loaded.pop(str(path), None)
+        print(f"✅ Профиль голоса '{name}' сохранен: {self.profile_path(name)}")
+        return name
+
+    def load(self, name):
+        """Загрузить латенты профиля (gpt_cond_latent, speaker_embedding) в float32"""
+        path = self.profile_path(name)
+        mtime = path.stat().st_mtime_ns
+        cached = self._loaded.get(str(path))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        profile = read_profile(path)
+        latents = (profile['gpt_cond_latent'].float(), profile['speaker_embedding'].float())
+        self._loaded[str(path)] = (mtime, latents)
+        return latents
+
+    def info(self, name):
+        """Метаданные профиля без латентов"""
+        profile = read_profile(self.profile_path(name))
+        return {k: v for k, v in profile.items() if k not in ('gpt_cond_latent', 'speaker_embedding')}
+
+    def delete(self, name):
+        """Удалить профиль"""
+        path = self.profile_path(name)
+        self._loaded.pop(str(path), None)
+        path.unlink()
+
+    def export_profile(self, name, dest_path):
+        """Экспорт профиля в файл (исходное аудио для переноса не нужно)"""
+        dest_path = Path(dest_path)
+        if dest_path.suffix != PROFILE_SUFFIX:
+            dest_path = dest_path.with_suffix(PROFILE_SUFFIX)
+        shutil.copy2(self.profile_path(name), dest_path)
+        return str(dest_path)
+
+    def import_profile(self, src_path, name=None):
+        """Импорт профиля из файла, возвращает имя профиля в хранилище"""
+        profile = read_profile(src_path)
+        name = safe_profile_name(name or profile.get('name') or Path(src_path).stem)
+        profile['name'] = name
+        path = self.profile_path(name)
+        write_profile(profile, path)
+        self._loaded.pop(str(path), None)
+        print(f"✅ Профиль голоса '{name}' импортирован")
+        return name
+
+
+def _call_directly(func, *args, **kwargs):
+    """Вызов модели в текущем потоке"""
+    return func(*args, **kwargs)
+
+
+class VoiceRegistry:
+    """Загруженные голоса по ID: перекодированный образец и его латенты на диске
+
+    ID - начало SHA-256 исходного файла, поэтому повторная загрузка того же
+    файла возвращает тот же ID без перекодирования и обработки образца.
+    """
+
+    def __init__(self, voices_dir=None):
+        self.voices_dir = Path(voices_dir or DEFAULT_VOICES_DIR)
+        self.voices_dir.mkdir(parents=True, exist_ok=True)
+        self._loaded = {}
+        self._voice_locks = {}  # Блокировки голосов, латенты которых сейчас вычисляются
+        self._lock = threading.Lock()
+
+    def voice_dir(self, voice_id):
+        """Каталог голоса (ID проверяется, чтобы не выйти за пределы реестра)"""
+        voice_id = (voice_id or "").strip().lower()
+        if not re.fullmatch(r'[0-9a-f]{%d}' % VOICE_ID_LENGTH, voice_id):
+            raise ValueError(f"Неверный ID голоса: {voice_id!r}")
+        return self.voices_dir / voice_id
+
+    def reference_path(self, voice_id):
+        """Перекодированный образец голоса (моно WAV)"""
+        return self.voice_dir(voice_id) / "reference.wav"
+
+    def latents_path(self, voice_id):
+        """Латенты голоса в формате профиля"""
+        return self.voice_dir(voice_id) / ("latents" + PROFILE_SUFFIX)
+
+    def exists(self, voice_id):
+        """Зарегистрирован ли голос"""
+        try:
+            return self.reference_path(voice_id).exists()
+        except ValueError:
+            return False
+
+    def register(self, audio_path, model=None, model_call=None):
+        """Сохранить образец голоса, возвращает ID
+
+        Образец перекодируется в моно WAV. Если модель передана, латенты
+        вычисляются сразу, иначе - при первом синтезе с этим ID.
+        """
+        import librosa
+        import soundfile as sf
+
+        voice_id = file_content_hash(audio_path)[:VOICE_ID_LENGTH]
+        reference_path = self.reference_path(voice_id)
+        if not reference_path.exists():
+            y, _ = librosa.load(audio_path, sr=REFERENCE_SAMPLE_RATE, mono=True)
+            if len(y) == 0:
+                raise ValueError("Файл с голосом не содержит звука")
+            reference_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = reference_path.with_name("reference.tmp.wav")
+            sf.write(str(tmp_path), y, REFERENCE_SAMPLE_RATE, subtype='PCM_16')
+            os.replace(tmp_path, reference_path)
+            print(f"🎙️ Голос {voice_id} сохранен: {len(y) / REFERENCE_SAMPLE_RATE:.1f} сек")
+
+        if model is not None:
+            self.load(model, voice_id, source_file=os.path.basename(audio_path), model_call=model_call)
+        return voice_id
+
+    def load(self, model, voice_id, source_file=None, model_call=None):
+        """Латенты голоса (gpt_cond_latent, speaker_embedding) в float32
+
+        Вычисляются из образца один раз и сохраняются рядом с ним. Пока
+        вычисляются латенты одного голоса, запросы других голосов не ждут.
+        model_call(func, **kwargs) выполняет вызов модели там, где модель
+        можно использовать (например, SynthesisScheduler.call в потоке
+        планировщика); по умолчанию - в текущем потоке.
+        """
+        voice_id = self.voice_dir(voice_id).name
+        with self._lock:
+            cached = self._loaded.get(voice_id)
+            if cached is not None:
+                return cached
+            voice_lock = self._voice_locks.setdefault(voice_id, threading.Lock())
+
+        # Один голос вычисляется одним потоком, остальные запросы этого голоса ждут результат
+        with voice_lock:
+            with self._lock:
+                cached = self._loaded.get(voice_id)
+            if cached is not None:
+                return cached
+            latents = self._load_latents(model, voice_id, source_file, model_call or _call_directly)
+            with self._lock:
+                self._loaded[voice_id] = latents
+                self._voice_locks.pop(voice_id, None)
+            return latents
+
+    def _load_latents(self, model, voice_id, source_file=None, model_call=_call_directly):
+        """Латенты голоса из файла или из образца (с сохранением в файл)"""
+        latents_path = self.latents_path(voice_id)
+        reference_path = self.reference_path(voice_id)
+        if not reference_path.exists():
+            raise KeyError(f"Голос {voice_id} не найден, загрузите образец заново")
+
+        if latents_path.exists():
+            profile = read_profile(latents_path)
+        else:
+            if model is None:
+                raise RuntimeError(f"Латенты голоса {voice_id} еще не вычислены, а модель не загружена")
+            params = default_conditioning_params(model)
+            core = get_xtts_core(model)
+            gpt_cond_latent, speaker_embedding = model_call(
+                core.get_conditioning_latents, audio_path=str(reference_path), **params
+            )
+            profile = {
+                'format_version': PROFILE_FORMAT_VERSION,
+                'name': voice_id,
+                'model': XTTS_MODEL_NAME,
+                'source_file': source_file or reference_path.name,
+                'source_hash': file_content_hash(reference_path),
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'conditioning': params,
+                'gpt_cond_latent': gpt_cond_latent.detach().cpu().half(),
+                'speaker_embedding': speaker_embedding.detach().cpu().half(),
+            }
+            write_profile(profile, latents_path)
+            print(f"🎙️ Латенты голоса {voice_id} вычислены и сохранены")
+
+        return (profile['gpt_cond_latent'].float(), profile['speaker_embedding'].float())
+
+    def list_voices(self):
+        """ID зарегистрированных голосов"""
+        return sorted(p.parent.name for p in self.voices_dir.glob("*/reference.wav"))
+
+    def delete(self, voice_id):
+        """Удалить голос из реестра"""
+        voice_dir = self.voice_dir(voice_id)
+        with self._lock:
+            self._loaded.pop(voice_dir.name, None)
+        shutil.rmtree(voice_dir, ignore_errors=True)
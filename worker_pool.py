@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Пул процессов для синтеза XTTS v2 на CPU
+Рабочие процессы запускаются через spawn и открывают снимок весов через mmap
+(см. model_snapshot.py): страницы весов общие через страничный кэш, поэтому
+память растет примерно как 1x размер весов, а не N x. Fork не используется:
+к моменту создания пула в родителе уже работают потоки torch и Tk, а fork
+такого процесса может зависнуть в libgomp
+"""
+
+import os
+import queue
+import threading
+
+from runtime_profile import apply_thread_settings, load_runtime_profile, worker_affinity
+from xtts_engine import PrefixKVCache, get_inference_profile, get_xtts_core, synthesize
+
+WORKER_POLL_INTERVAL = 1.0  # Как часто проверять, что рабочие процессы живы (сек)
+
+
+def default_worker_count():
+    """Число процессов по умолчанию: из профиля CPU, иначе по одному на 4 ядра"""
+    profile = load_runtime_profile()
+    if profile is not None:
+        return profile['workers']
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+def ensure_snapshot():
+    """Каталог снимка весов для рабочих процессов (создается, если его еще нет)"""
+    from model_snapshot import ModelSnapshot, build_snapshot
+
+    snapshot = ModelSnapshot.find()
+    if snapshot is not None:
+        return str(snapshot.snapshot_dir)
+    print("🔄 Для пула процессов нужен снимок весов XTTS v2, создаем его (один раз)...")
+    return str(build_snapshot())
+
+
+def _worker_loop(tasks, results, num_threads, cpus, snapshot_dir, profile):
+    """Цикл рабочего процесса: загрузка модели из снимка и синтез частей из очереди"""
+    # Новый процесс: потоки torch задаются до первых вычислений
+    apply_thread_settings(num_threads, 1, cpus)
+
+    from inference_profiles import apply_inference_profile
+    from model_snapshot import ModelSnapshot
+
+    model = ModelSnapshot(snapshot_dir).load()
+    apply_inference_profile(model, profile)
+    # Свой кэш префикса GPT в каждом процессе: голос обрабатывается один раз на процесс
+    prefix_cache = PrefixKVCache()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, index, text, latents, language, speed, params = task
+        try:
+            wav = synthesize(model, text, latents, language=language, speed=speed,
+                             prefix_cache=prefix_cache, **params)
+            results.put((job_id, index, wav, None))
+        except Exception as e:
+            results.put((job_id, index, None, str(e)))
+
+
+class XTTSWorkerPool:
+    """Пул процессов, каждый со своим контекстом инференса и общими весами модели"""
+
+    def __init__(self, model, num_workers=None, threads_per_worker=None, affinity=None, snapshot_dir=None):
+        import torch.multiprocessing as mp
+
+        self.num_workers = num_workers or default_worker_count()
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+
+        # Потоки и привязка к ядрам из калибровки, если она была для этого числа процессов
+        profile = load_runtime_profile()
+        if profile is not None and profile['workers'] == self.num_workers:
+            if threads_per_worker is None:
+                self.threads_per_worker = profile['threads_per_worker']
+            if affinity is None:
+                affinity = profile.get('affinity', 'none')
+        self.affinity = worker_affinity(self.num_workers, self.threads_per_worker, affinity or 'none')
+
+        # Рабочие процессы загружают тот же снимок и применяют тот же профиль ускорения
+        core = get_xtts_core(model)
+        self.profile = get_inference_profile(model)
+        self.snapshot_dir = snapshot_dir or getattr(core, 'snapshot_path', None) or ensure_snapshot()
+
+        ctx = mp.get_context('spawn')
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._lock = threading.Lock()
+        self._jobs = {}  # Номер задания -> очередь его результатов
+        self._job_id = 0
+        self._error = None
+        self._closed = False
+        self._workers = []
+        for i in range(self.num_workers):
+            cpus = self.affinity[i] if self.affinity else None
+            worker = ctx.Process(target=_worker_loop, daemon=True,
+                                 args=(self._tasks, self._results, self.threads_per_worker, cpus,
+                                       self.snapshot_dir, self.profile))
+            worker.start()
+            self._workers.append(worker)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+        print(f"✅ Пул процессов XTTS: {self.num_workers} процессов по {self.threads_per_worker} потоков"
+              + (" (с привязкой к ядрам)" if self.affinity else ""))
+
+    def _collect(self):
+        """Поток-сборщик: раздает результаты заданиям и следит, что рабочие процессы живы"""
+        while not self._closed:
+            dead = [worker for worker in self._workers if not worker.is_alive()]
+            if dead and not self._closed:
+                self._fail(f"рабочий процесс {dead[0].pid} завершился (код {dead[0].exitcode})")
+                return
+            try:
+                job_id, index, wav, error = self._results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError) as e:
+                if not self._closed:
+                    self._fail(f"очередь результатов закрыта: {e}")
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+            # Результаты отмененных заданий отбрасываются
+            if job is not None:
+                job.put((index, wav, error))
+
+    def _fail(self, message):
+        """Пул неработоспособен: сообщить всем текущим заданиям"""
+        print(f"❌ Пул процессов XTTS остановлен: {message}")
+        with self._lock:
+            self._error = message
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.put((None, None, message))
+
+    def _cancel(self, job_id):
+        """Убрать из очереди задачи задания, которые еще не взяты процессами"""
+        kept = []
+        with self._lock:
+            while True:
+                try:
+                    task = self._tasks.get_nowait()
+                except (queue.Empty, OSError):
+                    break
+                if task is None or task[0] != job_id:
+                    kept.append(task)
+            for task in kept:
+                self._tasks.put(task)
+
+    def imap(self, chunks, latents, language="ru", speed=1.0, progress_callback=None, **params):
+        """Синтез частей на всех процессах; аудио выдается в исходном порядке"""
+        chunks = list(chunks)
+        gpt_cond_latent, speaker_embedding = latents
+        latents = (gpt_cond_latent.detach().cpu(), speaker_embedding.detach().cpu())
+
+        results = queue.Queue()
+        with self._lock:
+            if self._error is not None:
+                raise RuntimeError(f"Пул процессов XTTS остановлен: {self._error}")
+            self._job_id += 1
+            job_id = self._job_id
+            self._jobs[job_id] = results
+            for index, chunk in enumerate(chunks):
+                self._tasks.put((job_id, index, chunk, latents, language, speed, params))
+
+        # Блокировка не удерживается между выдачами: задание может ждать сколько угодно
+        pending = {}
+        next_index = 0
+        received = 0
+        try:
+            while received < len(chunks):
+                try:
+                    index, wav, error = results.get(timeout=WORKER_POLL_INTERVAL)
+                except queue.Empty:
+                    if not self._collector.is_alive():
+                        raise RuntimeError(f"Пул процессов XTTS остановлен: {self._error or 'пул закрыт'}")
+                    continue
+                if index is None:
+                    raise RuntimeError(f"Пул процессов XTTS остановлен: {error}")
+                if error is not None:
+                    raise RuntimeError(f"Не удалось сгенерировать часть {index+1}: {error}")
+                received += 1
+                pending[index] = wav
+                if progress_callback is not None:
+                    progress_callback(received, len(chunks))
+
+                # Отдаем готовые части по порядку, остальные ждут в буфере
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            if received < len(chunks):
+                self._cancel(job_id)
+
+    def map(self, chunks, latents, **kwargs):
+        """Синтез частей на всех процессах, возвращает список аудио"""
+        return list(self.imap(chunks, latents, **kwargs))
+
+    def close(self):
+        """Остановить рабочие процессы"""
+        self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
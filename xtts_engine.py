@@ -0,0 +1,913 @@
+#!/usr/bin/env python3
+"""
+Общие функции синтеза XTTS v2 для десктопной и веб-версии
+Кэширует латенты голоса, чтобы образец не обрабатывался заново для каждой части текста
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+XTTS_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+# Прогрев после загрузки: XTTS_WARMUP_RUNS=0 отключает, XTTS_WARMUP_VOICE - свой образец голоса
+WARMUP_RUNS = int(os.environ.get('XTTS_WARMUP_RUNS', '2'))
+WARMUP_VOICE = os.environ.get('XTTS_WARMUP_VOICE', '')
+WARMUP_TEXT = "Проверка готовности модели."
+
+
+def load_xtts_model(device=None, use_snapshot=True, profile=None):
+    """Загрузка XTTS v2 и применение профиля ускорения (см. inference_profiles.py)"""
+    from inference_profiles import apply_inference_profile
+
+    model = _load_xtts_weights(device, use_snapshot)
+    apply_inference_profile(model, profile)
+    return model
+
+
+def _load_xtts_weights(device=None, use_snapshot=True):
+    """Загрузка XTTS v2: из снимка весов (быстро, без сети) или через TTS.api"""
+    if use_snapshot:
+        from model_snapshot import ModelSnapshot
+
+        try:
+            snapshot = ModelSnapshot.find()
+            if snapshot is not None:
+                return snapshot.load(device)
+        except Exception as e:
+            print(f"⚠️ Снимок XTTS v2 не загружен, обычная загрузка: {e}")
+
+    from TTS.api import TTS
+
+    try:
+        from torch.serialization import add_safe_globals
+        from TTS.tts.configs.xtts_config import XttsConfig
+        from TTS.tts.models.xtts import XttsAudioConfig
+        from TTS.tts.models.xtts import XttsArgs
+        from TTS.config.shared_configs import BaseDatasetConfig
+        from TTS.tts.configs.shared_configs import CharactersConfig
+        from TTS.vocoder.configs.hifigan_config import HifiganConfig
+
+        add_safe_globals([
+            XttsConfig, XttsAudioConfig, XttsArgs,
+            BaseDatasetConfig, CharactersConfig, HifiganConfig
+        ])
+    except Exception as e:
+        print(f"⚠️ Предупреждение safe globals: {e}")
+
+    model = TTS(XTTS_MODEL_NAME)
+    if device is not None:
+        model = model.to(device)
+    return model
+
+
+def get_xtts_core(model):
+    """Получить внутреннюю модель Xtts из обертки TTS.api"""
+    synthesizer = getattr(model, 'synthesizer', None)
+    if synthesizer is not None:
+        return synthesizer.tts_model
+    return model
+
+
+def get_inference_profile(model):
+    """Профиль ускорения, фактически примененный к модели (см. inference_profiles.py)"""
+    return getattr(get_xtts_core(model), 'inference_profile', "fp32")
+
+
+def inference_context(model):
+    """Контекст синтеза: torch.inference_mode и автоприведение к bf16 по профилю модели
+
+    Автоприведение действует только в текущем потоке, поэтому контекст
+    открывается в том потоке, где идет синтез.
+    """
+    import contextlib
+
+    import torch
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if "bf16" in get_inference_profile(model):
+        stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+    return stack
+
+
+def model_languages(model):
+    """Список поддерживаемых языков модели"""
+    languages = getattr(model, 'languages', None)
+    if languages:
+        return list(languages)
+    return list(getattr(get_xtts_core(model).config, 'languages', None) or [])
+
+
+def get_output_sample_rate(model):
+    """Частота дискретизации выходного аудио модели"""
+    core = get_xtts_core(model)
+    try:
+        return core.config.audio.output_sample_rate
+    except AttributeError:
+        return 24000
+
+
+def default_conditioning_params(model):
+    """Параметры извлечения латентов голоса из конфига модели"""
+    config = get_xtts_core(model).config
+    return {
+        'gpt_cond_len': getattr(config, 'gpt_cond_len', 30),
+        'gpt_cond_chunk_len': getattr(config, 'gpt_cond_chunk_len', 4),
+        'max_ref_length': getattr(config, 'max_ref_len', 30),
+        'sound_norm_refs': getattr(config, 'sound_norm_refs', False),
+    }
+
+
+def default_inference_params(model):
+    """Параметры генерации по умолчанию (те же, что использует tts_to_file)"""
+    config = get_xtts_core(model).config
+    return {
+        'temperature': getattr(config, 'temperature', 0.75),
+        'length_penalty': getattr(config, 'length_penalty', 1.0),
+        'repetition_penalty': getattr(config, 'repetition_penalty', 5.0),
+        'top_k': getattr(config, 'top_k', 50),
+        'top_p': getattr(config, 'top_p', 0.85),
+    }
+
+
+def file_content_hash(path, block_size=1024 * 1024):
+    """SHA-256 содержимого файла (читается блоками)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def latents_hash(latents):
+    """Хэш латентов голоса (одинаковый голос -> одинаковый хэш)"""
+    digest = hashlib.sha256()
+    for tensor in latents:
+        digest.update(tensor.detach().float().cpu().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def set_seed(seed):
+    """Зафиксировать генератор случайных чисел для воспроизводимой генерации (None - не менять)"""
+    if seed is None:
+        return
+    import random
+
+    import torch
+
+    random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def chunk_seed(seed, text):
+    """Зерно части: зависит только от общего зерна и текста части (None - без зерна)
+
+    Сэмплирование части не зависит от того, с какими частями и в каком
+    порядке она попала в пакет.
+    """
+    if seed is None:
+        return None
+    digest = hashlib.sha256(f"{seed}\n{text}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'little')
+
+
+class SeededSampler:
+    """Сэмплирование GPT со своим генератором для каждой строки пакета
+
+    Передается в generate как logits_processor при do_sample=False: применяет
+    temperature/top_k/top_p как в transformers, выбирает токен своим
+    генератором строки и оставляет только его, поэтому жадный выбор generate
+    берет выбранный токен.
+    """
+
+    def __init__(self, seeds, temperature=1.0, top_k=0, top_p=1.0):
+        self.seeds = list(seeds)
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self._generators = None
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        if self._generators is None:
+            self._generators = [torch.Generator(device=scores.device).manual_seed(seed) for seed in self.seeds]
+
+        scores = scores.float()
+        if self.temperature is not None and self.temperature != 1.0:
+            scores = scores / self.temperature
+        if self.top_k:
+            top_k = min(max(int(self.top_k), 1), scores.shape[-1])
+            threshold = torch.topk(scores, top_k)[0][..., -1, None]
+            scores = scores.masked_fill(scores < threshold, -float('inf'))
+        if self.top_p is not None and self.top_p < 1.0:
+            sorted_scores, sorted_indices = torch.sort(scores, descending=False)
+            cumulative = sorted_scores.softmax(dim=-1).cumsum(dim=-1)
+            sorted_remove = cumulative <= (1 - self.top_p)
+            sorted_remove[..., -1:] = False
+            remove = sorted_remove.scatter(1, sorted_indices, sorted_remove)
+            scores = scores.masked_fill(remove, -float('inf'))
+
+        probs = torch.softmax(scores, dim=-1)
+        chosen = torch.full_like(scores, -float('inf'))
+        for row, generator in enumerate(self._generators):
+            token = torch.multinomial(probs[row:row + 1], num_samples=1, generator=generator)
+            chosen[row, token[0, 0]] = 0.0
+        return chosen
+
+
+class SpeakerLatentCache:
+    """LRU-кэш латентов голоса (gpt_cond_latent + speaker_embedding)
+
+    Ключ - хэш содержимого файла-образца и параметры извлечения латентов,
+    поэтому переименованный или перезаписанный файл обрабатывается корректно.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+
+    def _source_hash(self, path):
+        """Хэш файла с запоминанием по (путь, размер, время изменения)"""
+        stat = os.stat(path)
+        stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._file_hashes.get(stamp)
+        if cached is None:
+            cached = file_content_hash(path)
+            with self._lock:
+                self._file_hashes[stamp] = cached
+        return cached
+
+    def make_key(self, speaker_wav, cond_params):
+        """Ключ кэша: хэш содержимого образца + параметры извлечения"""
+        return (self._source_hash(speaker_wav), tuple(sorted(cond_params.items())))
+
+    def get_latents(self, model, speaker_wav, **cond_params):
+        """Получить латенты голоса из кэша или вычислить их"""
+        params = default_conditioning_params(model)
+        params.update(cond_params)
+        key = self.make_key(speaker_wav, params)
+
+        with self._lock:
+            latents = self._entries.get(key)
+            if latents is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return latents
+
+        core = get_xtts_core(model)
+        latents = core.get_conditioning_latents(audio_path=speaker_wav, **params)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = latents
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+
+        print(f"🎙️ Латенты голоса вычислены и закэшированы ({size}/{self.max_entries})")
+        return latents
+
+    def stats(self):
+        """Статистика попаданий в кэш"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._entries.clear()
+            self._file_hashes.clear()
+
+
+def synthesize(model, text, latents, language="ru", speed=1.0, enable_text_splitting=False, seed=None,
+               prefix_cache=None, **params):
+    """Синтез речи по готовым латентам голоса, возвращает массив float32
+
+    seed фиксирует сэмплирование GPT: одинаковый текст, голос и параметры
+    дают одинаковое аудио (зерно части - chunk_seed от seed и текста). С зерном
+    коды GPT всегда генерируются через SeededSampler, как в synthesize_batch,
+    поэтому часть звучит одинаково во всех режимах. С prefix_cache (PrefixKVCache)
+    состояние внимания для латентов голоса не пересчитывается для каждой части.
+    """
+    import numpy as np
+
+    core = get_xtts_core(model)
+    gpt_cond_latent, speaker_embedding = latents
+
+    settings = default_inference_params(model)
+    settings.update(params)
+
+    seed = chunk_seed(seed, text)
+    if (prefix_cache is not None or seed is not None) and not enable_text_splitting:
+        gpt_cond_latent = gpt_cond_latent.to(core.device)
+        with inference_context(model):
+            text_tokens = encode_text(model, text, language)
+            codes = generate_codes_batch(core, [text_tokens], gpt_cond_latent, settings, prefix_cache,
+                                         seeds=None if seed is None else [seed])[0]
+            gpt_latents = codes_to_latents(core, text_tokens, codes, gpt_cond_latent, speed)
+            return decode_latents_batch(core, [gpt_latents], speaker_embedding.to(core.device))[0]
+
+    set_seed(seed)
+    with inference_context(model):
+        out = core.inference(
+            text=text,
+            language=language,
+            gpt_cond_latent=gpt_cond_latent,
+            speaker_embedding=speaker_embedding,
+            speed=speed,
+            enable_text_splitting=enable_text_splitting,
+            **settings
+        )
+
+    wav = out['wav']
+    if hasattr(wav, 'cpu'):
+        wav = wav.float().cpu().numpy()
+    return np.asarray(wav, dtype=np.float32).reshape(-1)
+
+
+def synthesize_to_file(model, text, latents, file_path, language="ru", **kwargs):
+    """Синтез речи по латентам с записью в WAV (замена tts_to_file)"""
+    import soundfile as sf
+
+    wav = synthesize(model, text, latents, language=language, **kwargs)
+    sf.write(file_path, wav, get_output_sample_rate(model))
+    return file_path
+
+
+def make_warmup_reference(path, sample_rate=24000, seconds=3.0):
+    """Встроенный образец для прогрева: синтетический гласный звук (основной тон + гармоники)"""
+    import numpy as np
+    import soundfile as sf
+
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    pitch = 140.0 * (1.0 + 0.02 * np.sin(2 * np.pi * 5.0 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    wav = sum(np.sin(k * phase) / k for k in range(1, 12))
+    wav *= 0.5 * (1.0 - np.cos(2 * np.pi * 2.0 * t)) / 2 + 0.25
+    wav = 0.3 * wav / np.max(np.abs(wav))
+    sf.write(path, wav.astype(np.float32), sample_rate)
+    return path
+
+
+def warm_up_model(model, runs=None, voice_path=None, text=WARMUP_TEXT, language="ru"):
+    """Прогрев модели коротким синтезом сразу после загрузки
+
+    Первый вызов оплачивает разовые затраты (рост аллокатора, выбор ядер,
+    ленивая инициализация подмодулей), поэтому выполняется заранее.
+    Возвращает отчет: время первого (холодного) и последующих (теплых) вызовов.
+    """
+    import tempfile
+
+    runs = WARMUP_RUNS if runs is None else runs
+    report = {'runs': runs, 'cold': None, 'warm': None}
+    if runs <= 0:
+        return report
+
+    voice_path = voice_path or WARMUP_VOICE
+    tmp_path = None
+    try:
+        if not voice_path:
+            fd, tmp_path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            voice_path = make_warmup_reference(tmp_path)
+
+        start = time.perf_counter()
+        core = get_xtts_core(model)
+        latents = core.get_conditioning_latents(audio_path=voice_path, **default_conditioning_params(model))
+        report['latents'] = time.perf_counter() - start
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            synthesize(model, text, latents, language=language, seed=0)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    report['cold'] = timings[0]
+    if len(timings) > 1:
+        report['warm'] = sum(timings[1:]) / (len(timings) - 1)
+        print(f"🔥 Прогрев XTTS v2: первый синтез {report['cold']:.2f} сек, "
+              f"после прогрева {report['warm']:.2f} сек")
+    else:
+        print(f"🔥 Прогрев XTTS v2: первый синтез {report['cold']:.2f} сек")
+    return report
+
+
+def _iter_in_context(model, generator):
+    """Выполнять каждый шаг генератора в контексте синтеза (без утечки контекста к вызывающему)"""
+    while True:
+        with inference_context(model):
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+        yield item
+
+
+class SynthesisStream:
+    """Потоковый синтез: выдает (номер части, фрагмент float32) по мере декодирования
+
+    Использует inference_stream XTTS, поэтому первый звук появляется после
+    нескольких десятков токенов GPT, а не после синтеза всего текста.
+    Первая часть генерируется меньшими фрагментами, чтобы сократить
+    время до первого звука.
+    """
+
+    def __init__(self, model, chunks, latents, language="ru", speed=1.0,
+                 stream_chunk_size=20, first_stream_chunk_size=8, latency_target=1.0, seed=None, **params):
+        self.model = model
+        self.chunks = list(chunks)
+        self.latents = latents
+        self.language = language
+        self.speed = speed
+        self.stream_chunk_size = stream_chunk_size
+        self.first_stream_chunk_size = first_stream_chunk_size
+        self.latency_target = latency_target
+        self.seed = seed
+        self.params = params
+        self.sample_rate = get_output_sample_rate(model)
+        self.time_to_first_audio = None
+        self.elapsed = None
+        self.samples = 0
+
+    def __iter__(self):
+        import numpy as np
+
+        core = get_xtts_core(self.model)
+        gpt_cond_latent, speaker_embedding = self.latents
+        settings = default_inference_params(self.model)
+        settings.update(self.params)
+
+        start = time.perf_counter()
+        for index, chunk in enumerate(self.chunks):
+            chunk_size = self.first_stream_chunk_size if index == 0 else self.stream_chunk_size
+            set_seed(chunk_seed(self.seed, chunk))
+            stream = core.inference_stream(
+                chunk,
+                self.language,
+                gpt_cond_latent,
+                speaker_embedding,
+                stream_chunk_size=chunk_size,
+                speed=self.speed,
+                **settings
+            )
+            for frames in _iter_in_context(self.model, stream):
+                if hasattr(frames, 'cpu'):
+                    frames = frames.float().cpu().numpy()
+                frames = np.asarray(frames, dtype=np.float32).reshape(-1)
+
+                if self.time_to_first_audio is None:
+                    self.time_to_first_audio = time.perf_counter() - start
+                    mark = "✅" if self.time_to_first_audio <= self.latency_target else "⚠️"
+                    print(f"{mark} Первое аудио через {self.time_to_first_audio:.2f} сек "
+                          f"(цель: {self.latency_target:.1f} сек)")
+
+                self.samples += len(frames)
+                yield index, frames
+
+        self.elapsed = time.perf_counter() - start
+
+    @property
+    def audio_duration(self):
+        """Длительность выданного аудио в секундах"""
+        return self.samples / self.sample_rate
+
+
+def encode_text(model, text, language="ru"):
+    """Токены текста в том же виде, что и в Xtts.inference"""
+    import torch
+
+    core = get_xtts_core(model)
+    language = language.split("-")[0]
+    tokens = core.tokenizer.encode(text.strip().lower(), lang=language)
+    text_tokens = torch.IntTensor(tokens).unsqueeze(0).to(core.device)
+    if text_tokens.shape[-1] >= core.args.gpt_max_text_tokens:
+        raise ValueError(f"Слишком длинная часть текста: {text_tokens.shape[-1]} токенов "
+                         f"(максимум {core.args.gpt_max_text_tokens})")
+    return text_tokens
+
+
+# Бюджет части текста в токенах XTTS выводится из лимита символов токенизатора
+# для языка (char_limits, для русского 182 символа): XTTS заметно теряет качество
+# на частях длиннее лимита. Русский текст дает в среднем около 2.3 символа на
+# токен, поэтому для русского бюджет около 80 токенов. XTTS_TOKEN_BUDGET задает
+# бюджет явно для всех языков
+XTTS_TOKEN_BUDGET = int(os.environ.get('XTTS_TOKEN_BUDGET', '0')) or None
+XTTS_CHARS_PER_TOKEN = 2.3
+DEFAULT_CHAR_LIMIT = 250  # Лимит токенизатора XTTS для языков без своего лимита
+
+
+def text_token_budget(model, language="ru"):
+    """Бюджет части текста в токенах XTTS для языка (не больше gpt_max_text_tokens)"""
+    core = get_xtts_core(model)
+    max_tokens = core.args.gpt_max_text_tokens - 1
+    if XTTS_TOKEN_BUDGET:
+        return min(XTTS_TOKEN_BUDGET, max_tokens)
+    char_limits = getattr(core.tokenizer, 'char_limits', None) or {}
+    char_limit = char_limits.get(language.split("-")[0], DEFAULT_CHAR_LIMIT)
+    return max(1, min(int(char_limit / XTTS_CHARS_PER_TOKEN), max_tokens))
+
+
+def make_token_counter(model, language="ru", cache_size=100000):
+    """Функция подсчета токенов XTTS для строки (с кэшем, для разбиения текста по бюджету)"""
+    core = get_xtts_core(model)
+    language = language.split("-")[0]
+    cache = {}
+
+    def count_tokens(text):
+        count = cache.get(text)
+        if count is None:
+            count = len(core.tokenizer.encode(text.strip().lower(), lang=language))
+            if len(cache) >= cache_size:
+                cache.clear()
+            cache[text] = count
+        return count
+
+    return count_tokens
+
+
+class PrefixKVCache:
+    """LRU-кэш ключей/значений внимания GPT для латентов голоса
+
+    Каждая часть начинает генерацию с одинакового префикса - латентов голоса.
+    Внимание в GPT причинное, а позиционные эмбеддинги внутри GPT в XTTS
+    нулевые, поэтому ключи/значения префикса зависят только от латентов:
+    они вычисляются один раз на голос, а для части через все слои проходит
+    только текст.
+    """
+
+    # Ошибки несовместимости (формат кэша transformers, другая версия XTTS):
+    # после них кэш отключается сразу
+    INCOMPATIBLE_ERRORS = (TypeError, AttributeError, KeyError, IndexError, NotImplementedError)
+    MAX_FAILURES = 3  # Прочие ошибки подряд, после которых кэш отключается
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        self.failures = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, core, gpt_cond_latent):
+        """Ключи/значения префикса (кортеж по слоям) для латентов голоса"""
+        digest = hashlib.sha256(gpt_cond_latent.detach().float().cpu().numpy().tobytes()).hexdigest()
+        key = (id(core), digest)
+        with self._lock:
+            past = self._entries.get(key)
+            if past is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return past
+
+        past = core.gpt.gpt(inputs_embeds=gpt_cond_latent, use_cache=True, return_dict=True).past_key_values
+        if hasattr(past, 'to_legacy_cache'):
+            past = past.to_legacy_cache()
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = past
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return past
+
+    def record_failure(self, error):
+        """Учесть ошибку синтеза с кэшем, возвращает True, если кэш отключен
+
+        Разовые ошибки (нехватка памяти, неверный параметр в одном запросе)
+        не отключают кэш: вызов просто повторяется без него.
+        """
+        with self._lock:
+            self.failures += 1
+            if isinstance(error, self.INCOMPATIBLE_ERRORS) or self.failures >= self.MAX_FAILURES:
+                self.enabled = False
+            return not self.enabled
+
+    def record_success(self):
+        """Синтез с кэшем прошел - счетчик ошибок подряд сбрасывается"""
+        if self.failures:
+            with self._lock:
+                self.failures = 0
+
+    def stats(self):
+        """Статистика попаданий в кэш"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _prefill_with_prefix_cache(core, prefix_cache, gpt_cond_latent, text_embs, attention_mask):
+    """Ключи/значения всего префикса: латенты голоса из кэша + прогон текста через GPT
+
+    Раскладка строки пакета: [латенты | выравнивание | текст], выравнивание
+    закрыто маской внимания.
+    """
+    batch = len(text_embs)
+    cond_past = prefix_cache.get(core, gpt_cond_latent)
+    cond_past = tuple(
+        tuple(tensor.expand(batch, *tensor.shape[1:]) for tensor in layer)
+        for layer in cond_past
+    )
+
+    cond_len = gpt_cond_latent.shape[1]
+    max_text = max(emb.shape[1] for emb in text_embs)
+    text_block = text_embs[0].new_zeros((batch, max_text, text_embs[0].shape[2]))
+    for i, emb in enumerate(text_embs):
+        text_block[i, max_text - emb.shape[1]:] = emb[0]
+
+    past = core.gpt.gpt(
+        inputs_embeds=text_block,
+        past_key_values=cond_past,
+        attention_mask=attention_mask[:, :cond_len + max_text],
+        use_cache=True,
+        return_dict=True,
+    ).past_key_values
+    if hasattr(past, 'to_legacy_cache'):
+        past = past.to_legacy_cache()
+    return text_block, past
+
+
+def generate_codes_batch(core, text_tokens, gpt_cond_latent, settings, prefix_cache=None, seeds=None):
+    """Авторегрессионная генерация GPT для пакета частей
+
+    Префиксы [латенты голоса + текст] выравниваются по правому краю, слева
+    добавляются нули с нулевой маской внимания. Позиционные эмбеддинги GPT в
+    XTTS нулевые, поэтому такое выравнивание не меняет результат для части.
+    С prefix_cache латенты голоса берутся из кэша ключей/значений, а
+    выравнивание ставится между латентами и текстом.
+    seeds - зерно для каждой части (SeededSampler): коды части не зависят
+    от остальных частей пакета.
+    """
+    import torch
+    import torch.nn.functional as F
+
+    gpt = core.gpt
+    text_embs = []
+    for tokens in text_tokens:
+        tokens = F.pad(tokens, (0, 1), value=gpt.stop_text_token)
+        tokens = F.pad(tokens, (1, 0), value=gpt.start_text_token)
+        text_embs.append(gpt.text_embedding(tokens) + gpt.text_pos_embedding(tokens))
+
+    if prefix_cache is not None and prefix_cache.enabled:
+        # На CUDA сэмплирование идет генератором устройства, сохраняются оба
+        cuda_rng = gpt_cond_latent.is_cuda
+        rng_state = torch.get_rng_state()
+        cuda_rng_state = torch.cuda.get_rng_state(gpt_cond_latent.device) if cuda_rng else None
+        try:
+            codes = _generate_codes_cached(core, text_embs, gpt_cond_latent, settings, prefix_cache, seeds)
+            prefix_cache.record_success()
+            return codes
+        except Exception as e:
+            # Этот вызов повторяется обычным путем с тем же состоянием генератора
+            if prefix_cache.record_failure(e):
+                print(f"⚠️ Кэш префикса GPT отключен: {e}")
+            else:
+                print(f"⚠️ Синтез с кэшем префикса GPT не удался, повтор без кэша: {e}")
+            torch.set_rng_state(rng_state)
+            if cuda_rng:
+                torch.cuda.set_rng_state(cuda_rng_state, gpt_cond_latent.device)
+
+    embs = [torch.cat([gpt_cond_latent, emb], dim=1) for emb in text_embs]
+    batch = len(embs)
+    max_len = max(emb.shape[1] for emb in embs)
+    prefix = embs[0].new_zeros((batch, max_len, embs[0].shape[2]))
+    attention_mask = torch.zeros((batch, max_len + 1), dtype=torch.long, device=prefix.device)
+    for i, emb in enumerate(embs):
+        prefix[i, max_len - emb.shape[1]:] = emb[0]
+        attention_mask[i, max_len - emb.shape[1]:] = 1
+
+    return _generate_from_prefix(gpt, prefix, attention_mask, settings, seeds=seeds)
+
+
+def _generate_codes_cached(core, text_embs, gpt_cond_latent, settings, prefix_cache, seeds=None):
+    """Генерация кодов с ключами/значениями латентов голоса из кэша"""
+    import torch
+
+    gpt = core.gpt
+    batch = len(text_embs)
+    cond_len = gpt_cond_latent.shape[1]
+    max_len = cond_len + max(emb.shape[1] for emb in text_embs)
+    attention_mask = torch.zeros((batch, max_len + 1), dtype=torch.long, device=gpt_cond_latent.device)
+    attention_mask[:, :cond_len] = 1
+    attention_mask[:, -1] = 1
+    for i, emb in enumerate(text_embs):
+        attention_mask[i, max_len - emb.shape[1]:max_len] = 1
+
+    text_block, past = _prefill_with_prefix_cache(core, prefix_cache, gpt_cond_latent, text_embs, attention_mask)
+    prefix = torch.cat([gpt_cond_latent.expand(batch, -1, -1), text_block], dim=1)
+    return _generate_from_prefix(gpt, prefix, attention_mask, settings, past, seeds)
+
+
+_PREFIX_LOCKS_GUARD = threading.Lock()
+
+
+def _prefix_lock(gpt_inference):
+    """Блокировка префикса модели: store_prefix_emb меняет общее состояние GPT"""
+    with _PREFIX_LOCKS_GUARD:
+        lock = getattr(gpt_inference, '_prefix_lock', None)
+        if lock is None:
+            lock = gpt_inference._prefix_lock = threading.Lock()
+        return lock
+
+
+def _generate_from_prefix(gpt, prefix, attention_mask, settings, past_key_values=None, seeds=None):
+    """Сэмплирование кодов GPT после префикса, коды каждой части до stop-токена
+
+    С past_key_values префикс уже прогнан через GPT: generate начинает
+    с последнего входа (start-токен аудио). С seeds каждая строка пакета
+    сэмплируется своим генератором.
+
+    Префикс хранится в самой модели (store_prefix_emb), поэтому генерация
+    на одной модели идет под ее блокировкой, а прежний префикс после нее
+    восстанавливается. Xtts.inference этой блокировкой не пользуется: его
+    нельзя вызывать на той же модели одновременно с этой функцией.
+    """
+    with _prefix_lock(gpt.gpt_inference):
+        previous = getattr(gpt.gpt_inference, 'cached_prefix_emb', None)
+        try:
+            return _generate_locked(gpt, prefix, attention_mask, settings, past_key_values, seeds)
+        finally:
+            if previous is not None:
+                gpt.gpt_inference.store_prefix_emb(previous)
+
+
+def _generate_locked(gpt, prefix, attention_mask, settings, past_key_values=None, seeds=None):
+    """Тело _generate_from_prefix (вызывается под блокировкой префикса)"""
+    import torch
+
+    batch, max_len = prefix.shape[0], prefix.shape[1]
+    gpt.gpt_inference.store_prefix_emb(prefix)
+    gpt_inputs = torch.full((batch, max_len + 1), fill_value=1, dtype=torch.long, device=prefix.device)
+    gpt_inputs[:, -1] = gpt.start_audio_token
+
+    extra = {} if past_key_values is None else {'past_key_values': past_key_values}
+    if seeds is not None:
+        settings = dict(settings)
+        sampler = SeededSampler(seeds, settings.pop('temperature', 1.0), settings.pop('top_k', 0),
+                                settings.pop('top_p', 1.0))
+        extra['logits_processor'] = [sampler]
+    codes = gpt.gpt_inference.generate(
+        gpt_inputs,
+        attention_mask=attention_mask,
+        bos_token_id=gpt.start_audio_token,
+        pad_token_id=gpt.stop_audio_token,
+        eos_token_id=gpt.stop_audio_token,
+        max_length=gpt.max_gen_mel_tokens + gpt_inputs.shape[-1],
+        do_sample=seeds is None,
+        num_beams=1,
+        num_return_sequences=1,
+        output_attentions=False,
+        **extra,
+        **settings
+    )[:, gpt_inputs.shape[1]:]
+
+    # Каждая часть заканчивается на первом stop-токене, дальше идет выравнивание
+    result = []
+    for row in codes:
+        stops = (row == gpt.stop_audio_token).nonzero()
+        length = int(stops[0]) + 1 if len(stops) else row.shape[0]
+        result.append(row[:length].unsqueeze(0))
+    return result
+
+
+def codes_to_latents(core, text_tokens, codes, gpt_cond_latent, speed=1.0):
+    """Латенты GPT для вокодера по сгенерированным кодам (как в Xtts.inference)"""
+    import torch
+    import torch.nn.functional as F
+
+    expected_output_len = torch.tensor([codes.shape[-1] * core.gpt.code_stride_len], device=core.device)
+    text_len = torch.tensor([text_tokens.shape[-1]], device=core.device)
+    gpt_latents = core.gpt(
+        text_tokens,
+        text_len,
+        codes,
+        expected_output_len,
+        cond_latents=gpt_cond_latent,
+        return_attentions=False,
+        return_latent=True,
+    )
+    length_scale = 1.0 / max(speed, 0.05)
+    if length_scale != 1.0:
+        gpt_latents = F.interpolate(gpt_latents.transpose(1, 2), scale_factor=length_scale,
+                                    mode="linear").transpose(1, 2)
+    return gpt_latents
+
+
+def decode_latents_batch(core, latents_list, speaker_embedding):
+    """Вокодер HiFiGAN для пакета латентов, возвращает массивы float32"""
+    import numpy as np
+    import torch
+    import torch.nn.functional as F
+
+    # Латенты дополняются нулями справа, лишние сэмплы после декодирования отрезаются
+    lengths = [latents.shape[1] for latents in latents_list]
+    max_len = max(lengths)
+    batch = torch.cat([F.pad(latents, (0, 0, 0, max_len - latents.shape[1])) for latents in latents_list], dim=0)
+
+    wavs = core.hifigan_decoder(batch, g=speaker_embedding).float().cpu().reshape(len(latents_list), -1)
+    samples_per_frame = wavs.shape[1] / max_len
+    return [
+        np.asarray(wavs[i, :int(round(length * samples_per_frame))].numpy(), dtype=np.float32)
+        for i, length in enumerate(lengths)
+    ]
+
+
+def make_length_buckets(lengths, batch_size, bucket_tolerance=16):
+    """Группы индексов частей близкой длины (разброс не больше bucket_tolerance токенов)"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets = []
+    current = []
+    for index in order:
+        if current and (len(current) >= batch_size or lengths[index] - lengths[current[0]] > bucket_tolerance):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def iter_synthesize_batch(model, chunks, latents, language="ru", speed=1.0, batch_size=4,
+                          bucket_tolerance=16, reorder_window=None, progress_callback=None, seed=None,
+                          prefix_cache=None, **params):
+    """Пакетный синтез частей текста одним голосом, аудио выдается в исходном порядке
+
+    Части группируются по длине в токенах, GPT и HiFiGAN запускаются на пакетах.
+    Группировка идет внутри окна из reorder_window соседних частей, поэтому
+    в памяти одновременно находится аудио не больше чем одного окна.
+    Если пакет не удался, его части синтезируются по одной с теми же параметрами.
+    С seed каждая часть сэмплируется своим зерном (chunk_seed), поэтому ее
+    аудио не зависит от состава пакета и совпадает при повторной озвучке.
+    """
+    core = get_xtts_core(model)
+    gpt_cond_latent, speaker_embedding = latents
+    gpt_cond_latent = gpt_cond_latent.to(core.device)
+    speaker_embedding = speaker_embedding.to(core.device)
+
+    settings = default_inference_params(model)
+    settings.update(params)
+
+    chunks = list(chunks)
+    window = reorder_window or batch_size * 4
+    done = 0
+
+    for window_start in range(0, len(chunks), window):
+        window_chunks = chunks[window_start:window_start + window]
+        tokens = [encode_text(model, chunk, language) for chunk in window_chunks]
+        buckets = make_length_buckets([t.shape[-1] for t in tokens], batch_size, bucket_tolerance)
+        results = [None] * len(window_chunks)
+
+        for bucket in buckets:
+            seeds = None if seed is None else [chunk_seed(seed, window_chunks[i]) for i in bucket]
+            try:
+                with inference_context(model):
+                    codes = generate_codes_batch(core, [tokens[i] for i in bucket], gpt_cond_latent, settings,
+                                                 prefix_cache, seeds)
+                    gpt_latents = [
+                        codes_to_latents(core, tokens[i], item_codes, gpt_cond_latent, speed)
+                        for i, item_codes in zip(bucket, codes)
+                    ]
+                    wavs = decode_latents_batch(core, gpt_latents, speaker_embedding)
+                for i, wav in zip(bucket, wavs):
+                    results[i] = wav
+            except Exception as e:
+                print(f"⚠️ Ошибка пакета из {len(bucket)} частей, синтез по одной: {e}")
+                for i in bucket:
+                    results[i] = synthesize(model, window_chunks[i], latents, language=language,
+                                            speed=speed, seed=seed, prefix_cache=prefix_cache, **params)
+
+            done += len(bucket)
+            if progress_callback is not None:
+                progress_callback(done, len(chunks))
+
+        for wav in results:
+            yield wav
+
+
+def synthesize_batch(model, chunks, latents, **kwargs):
+    """Пакетный синтез частей текста, возвращает список аудио в исходном порядке"""
+    return list(iter_synthesize_batch(model, chunks, latents, **kwargs))